@@ -11,10 +11,13 @@ import {
     Check,
 } from 'lucide-react';
 import Plot from 'react-plotly.js';
-import { sendChatMessage } from './services/api';
+import { streamChatMessage } from './services/api';
 import type { PlotlyData } from './services/api';
 import { useNavigate } from 'react-router-dom';
 
+// Longest line series requested from the backend; longer ones are downsampled
+const CHART_MAX_POINTS = 2000;
+
 interface Message {
     id: string;
     role: 'user' | 'ai';
@@ -222,37 +225,44 @@ export default function App() {
         setIsLoading(true);
 
         try {
-            // Call chat API
-            const response = await sendChatMessage(content);
-
-            // Check for error response
-            if (!response.success || response.error) {
-                const errorMsg = response.error || 'Sorry, I couldn\'t process your request. Please try asking about the database tables: customers, products, orders, departments, payroll, expenses, or daily_revenue. \nOnly simple line or bar charts are supported.';
-                setErrorMessage(errorMsg);
-                return;
-            }
-
-            if (response.success && response.queries && response.queries.length > 0) {
-                // Process all queries (handle multiple charts)
-                const updatedCharts: ChartData[] = [...charts];
-                const aiMessages: Message[] = [];
-                let hasQueryError = false;
-                let queryErrorMsg = '';
-
-                for (const query of response.queries) {
+            // Stream the chat response: each chart is added as soon as its query has run
+            const updatedCharts: ChartData[] = [...charts];
+            let aiError: string | null = null;
+            let queryErrorMsg: string | null = null;
+
+            const count = await streamChatMessage(content, {
+                onError: (error) => {
+                    aiError = error;
+                    setErrorMessage(error || 'Sorry, I couldn\'t process your request. Please try asking about the database tables: customers, products, orders, departments, payroll, expenses, or daily_revenue. \nOnly simple line or bar charts are supported.');
+                },
+                onQuery: (query) => {
                     // Add AI message with SQL query
+                    const trace = Array.isArray(query.plotly_data) ? null : query.plotly_data;
+                    const originalPoints = trace?.original_points;
+                    const bucketInfo = query.aggregation
+                        ? ` (${query.aggregation.aggregate} of ${query.aggregation.y} per ${query.aggregation.bucket}, from ${query.aggregation.original_rows} rows)`
+                        : '';
+                    const repairInfo = query.repaired
+                        ? `\n\n(The generated SQL failed to bind and was repaired automatically: ${query.repaired.error.split('\n')[0]})`
+                        : '';
+                    const sampleInfo = query.cost?.sample
+                        ? ` (from a ${(query.cost.sample.fraction * 100).toFixed(1)}% sample of ${query.cost.sample.table})`
+                        : '';
+                    const truncatedInfo = query.truncated
+                        ? ` (truncated to the first ${query.truncated.rows} rows)`
+                        : '';
                     const dataInfo = query.data && query.data.length > 0
-                        ? `\n\nData: ${query.data.length} rows returned`
+                        ? `\n\nData: ${query.data.length} rows returned${sampleInfo}${truncatedInfo}${bucketInfo}${originalPoints ? ` (chart downsampled to ${trace!.x.length} of ${originalPoints} points)` : ''}`
                         : query.error
                             ? `\n\nError: ${query.error}`
                             : '\n\nNo data returned';
 
-                    aiMessages.push({
+                    const aiMessages: Message[] = [{
                         id: `msg-${Date.now()}-${query.name}`,
                         role: 'ai',
-                        content: `I've generated a SQL query for your request:\n\n\`\`\`sql\n${query.sql}\n\`\`\`\n\nChart Type: ${query.suggested_chart.type}\nTitle: ${query.suggested_chart.title}${dataInfo}`,
+                        content: `I've generated a SQL query for your request:\n\n\`\`\`sql\n${query.sql}\n\`\`\`${repairInfo}\n\nChart Type: ${query.suggested_chart.type}\nTitle: ${query.suggested_chart.title}${dataInfo}`,
                         timestamp: new Date(),
-                    });
+                    }];
 
                     // Use Plotly data from backend
                     if (query.plotly_data) {
@@ -264,7 +274,6 @@ export default function App() {
                         });
                     } else if (query.error) {
                         // Query had an error
-                        hasQueryError = true;
                         queryErrorMsg = query.error;
                         aiMessages.push({
                             id: `msg-${Date.now()}-error-${query.name}`,
@@ -273,32 +282,34 @@ export default function App() {
                             timestamp: new Date(),
                         });
                     }
-                }
-
-                // Show error popup if any query failed, otherwise clear error
-                if (hasQueryError) {
-                    setErrorMessage(`Error executing query: ${queryErrorMsg}`);
-                } else {
-                    setErrorMessage(null); // Clear error on success
-                }
-
-                // Update conversations with messages and charts
-                setConversations(prev =>
-                    prev.map(conv =>
-                        conv.id === currentConvId
-                            ? {
-                                ...conv,
-                                messages: [...conv.messages, ...aiMessages],
-                                charts: updatedCharts
-                            }
-                            : conv
-                    )
-                );
-
-                setCharts(updatedCharts);
+
+                    const chartsSoFar = [...updatedCharts];
+                    setConversations(prev =>
+                        prev.map(conv =>
+                            conv.id === currentConvId
+                                ? {
+                                    ...conv,
+                                    messages: [...conv.messages, ...aiMessages],
+                                    charts: chartsSoFar
+                                }
+                                : conv
+                        )
+                    );
+                    setCharts(chartsSoFar);
+                },
+            }, CHART_MAX_POINTS);
+
+            if (aiError !== null) {
+                return;
+            }
+
+            // Show error popup if any query failed, otherwise clear error
+            if (queryErrorMsg) {
+                setErrorMessage(`Error executing query: ${queryErrorMsg}`);
+            } else if (count === 0) {
+                setErrorMessage('Sorry, I encountered an error: Unknown error');
             } else {
-                // Error response
-                setErrorMessage(`Sorry, I encountered an error: ${response.error || 'Unknown error'}`);
+                setErrorMessage(null); // Clear error on success
             }
         } catch (error) {
             console.error('Error fetching chart data:', error);
@@ -6,6 +6,8 @@ export interface PlotlyData {
   type: 'scatter' | 'bar' | 'line' | 'pie';
   mode?: string;
   name?: string;
+  // Length of the full series when the backend downsampled it to max_points
+  original_points?: number;
 }
 
 export interface QueryResponse {
@@ -17,7 +19,8 @@ export interface QueryResponse {
 
 export const fetchChartData = async (
   queryType: string,
-  filters: Record<string, any> = {}
+  filters: Record<string, any> = {},
+  maxPoints?: number
 ): Promise<PlotlyData | PlotlyData[]> => {
   const response = await fetch(`${API_BASE_URL}/query-data`, {
     method: 'POST',
@@ -27,6 +30,7 @@ export const fetchChartData = async (
     body: JSON.stringify({
       query_type: queryType,
       filters: filters,
+      max_points: maxPoints,
     }),
   });
 
@@ -39,6 +43,46 @@ export const fetchChartData = async (
   return result.data;
 };
 
+export interface ChartDataRequest {
+  queryType: string;
+  filters?: Record<string, any>;
+  maxPoints?: number;
+}
+
+export interface BatchQueryResult {
+  query_type: string;
+  success: boolean;
+  data?: PlotlyData | PlotlyData[];
+  error?: string;
+}
+
+// Loads several charts in one round trip; the backend runs them concurrently
+export const fetchChartDataBatch = async (
+  requests: ChartDataRequest[]
+): Promise<BatchQueryResult[]> => {
+  const response = await fetch(`${API_BASE_URL}/query-data/batch`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      queries: requests.map((r) => ({
+        query_type: r.queryType,
+        filters: r.filters || {},
+        max_points: r.maxPoints,
+      })),
+    }),
+  });
+
+  const result = await response.json();
+
+  if (!result.success) {
+    throw new Error(result.error || 'Failed to fetch chart data');
+  }
+
+  return result.results;
+};
+
 export const getAvailableQueries = async (): Promise<string[]> => {
   const response = await fetch(`${API_BASE_URL}/available-queries`);
   const result = await response.json();
@@ -49,8 +93,49 @@ export interface ChatQuery {
   name: string;
   sql: string;
   data: any[];
-  plotly_data: PlotlyData | null;  // Plotly-ready data from backend
+  plotly_data: PlotlyData | PlotlyData[] | null;  // Plotly-ready data from backend
   error?: string;
+  // Set when the result hit the backend's row/byte cap; data holds the first rows
+  truncated?: {
+    reason: 'rows' | 'bytes';
+    rows: number;
+    max_rows: number;
+    max_bytes: number;
+  };
+  // Set (with error) when the query ran past the backend's time limit
+  timed_out?: boolean;
+  // Set when the question was answered by a canned query instead of Gemini
+  routed?: {
+    query_type: string;
+    filters: Record<string, any>;
+    confidence: number;
+  };
+  // Set when the generated SQL didn't bind and the backend ran a repaired query (sql) instead
+  repaired?: {
+    error: string;
+    original_sql: string;
+    source: 'llm' | 'cache';
+  };
+  // The backend's EXPLAIN-based screening of the query before it ran
+  cost?: {
+    decision: 'run' | 'aggregate' | 'sample' | 'reject';
+    estimated_rows: number;
+    estimated_work: number;
+    max_work: number;
+    max_rows: number;
+    estimate_ms: number;
+    sample?: { table: string; fraction: number };
+    reason?: string;
+  };
+  // Set when a long date/timestamp x axis was aggregated into time buckets
+  aggregation?: {
+    bucket: string;
+    aggregate: 'sum' | 'avg';
+    x: string;
+    y: string;
+    original_rows: number;
+    rows: number;
+  };
   suggested_chart: {
     type: string;
     x: string;
@@ -65,7 +150,10 @@ export interface ChatResponse {
   error?: string;
 }
 
-export const sendChatMessage = async (userInput: string): Promise<ChatResponse> => {
+export const sendChatMessage = async (
+  userInput: string,
+  maxPoints?: number
+): Promise<ChatResponse> => {
   const response = await fetch(`${API_BASE_URL}/chat`, {
     method: 'POST',
     headers: {
@@ -73,6 +161,7 @@ export const sendChatMessage = async (userInput: string): Promise<ChatResponse>
     },
     body: JSON.stringify({
       user_input: userInput,
+      max_points: maxPoints,
     }),
   });
 
@@ -80,6 +169,70 @@ export const sendChatMessage = async (userInput: string): Promise<ChatResponse>
   return result;
 };
 
+export interface ChatStreamHandlers {
+  // Called once per generated query, as soon as it has run (possibly out of order)
+  onQuery: (query: ChatQuery & { index: number }) => void;
+  // Out-of-scope request or generation failure
+  onError?: (error: string) => void;
+}
+
+// Streams /chat/stream (Server-Sent Events) so the first chart renders while
+// later queries are still being generated. Resolves with the query count.
+export const streamChatMessage = async (
+  userInput: string,
+  handlers: ChatStreamHandlers,
+  maxPoints?: number
+): Promise<number> => {
+  const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({
+      user_input: userInput,
+      max_points: maxPoints,
+    }),
+  });
+
+  if (!response.ok || !response.body) {
+    const result = await response.json().catch(() => ({}));
+    throw new Error(result.error || 'Failed to start chat stream');
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let count = 0;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Messages are separated by a blank line: "event: <name>\ndata: <json>\n\n"
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of message.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'query') handlers.onQuery(payload);
+      else if (event === 'error') handlers.onError?.(payload.error);
+      else if (event === 'done') count = payload.count;
+    }
+  }
+
+  return count;
+};
+
 
 export interface KeyInsightsData {
   overview: {
@@ -87,7 +240,9 @@ export interface KeyInsightsData {
     column_count: number;
     memory_usage: number;
     duplicate_rows: number;
+    approximate?: Record<string, import("../types/data").ErrorBound>;
   };
+  approximate?: boolean;
   columns: Array<{
     name: string;
     type: string;
@@ -109,6 +264,7 @@ export interface KeyInsightsData {
       counts: number[];
       bins: number[];
     };
+    approximate?: Record<string, import("../types/data").ErrorBound>;
   }>;
   correlations?: Array<{
     col1: string;
@@ -133,8 +289,12 @@ export interface KeyInsightsResponse {
   error?: string;
 }
 
-export const getKeyInsights = async (query: string): Promise<KeyInsightsData> => {
-  const url = `${API_BASE_URL}/key-insights?query=${encodeURIComponent(query)}`;
+// approximate: true/false forces sketches on or off; omitted lets the backend decide by row count
+export const getKeyInsights = async (query: string, approximate?: boolean): Promise<KeyInsightsData> => {
+  let url = `${API_BASE_URL}/key-insights?query=${encodeURIComponent(query)}`;
+  if (approximate !== undefined) {
+    url += `&approximate=${approximate}`;
+  }
   console.log("API: Fetching from", url);
   
   const response = await fetch(url, {
@@ -4,8 +4,10 @@ export interface KeyInsightsData {
     column_count: number;
     memory_usage: number;
     duplicate_rows: number;
+    approximate?: Record<string, ErrorBound>;
   };
   columns: ColumnInfo[];
+  approximate?: boolean;
   correlations?: CorrelationPair[];
   correlation_matrix?: CorrelationMatrix;
   interactions?: Interaction[];
@@ -32,6 +34,16 @@ export interface ColumnInfo {
     counts: number[];
     bins: number[];
   };
+  approximate?: Record<string, ErrorBound>;
+}
+
+// How an estimated figure was computed and how far off it may be
+export interface ErrorBound {
+  method: string;
+  relative_error?: number;
+  rank_error?: number;
+  absolute_error?: number;
+  bin_width?: number;
 }
 
 export interface CorrelationPair {
@@ -0,0 +1,157 @@
+"""
+Time-bucket aggregation for generated chart queries.
+
+A chat query such as SELECT order_date, total_amount FROM orders returns one
+row per order, and the browser would draw every one of them. When the chart's
+x column is a date or timestamp with more distinct values than the point
+budget, plan_buckets wraps the query in a date_trunc GROUP BY at the finest
+bucket (hour/day/week/month/quarter/year) whose count over the x range fits
+the budget, so DuckDB does the aggregation and only one row per bucket is
+returned. The rewritten statement counts x's distinct values and picks the
+bucket itself, so planning doesn't run the query a second time; when x
+already fits the budget it returns the query's rows unchanged.
+
+The y aggregate is inferred from the column name: rates, ratios, prices and
+other per-unit measures are averaged, everything else (amounts, counts,
+quantities) is summed. Queries whose EXPLAIN estimate fits the budget, and
+queries whose columns aren't a temporal x and numeric y, run unchanged.
+"""
+import os
+import re
+from typing import Optional, Tuple
+
+import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from charts import resolve_column
+
+# Default point budget for a bucketed x axis (a request's max_points overrides it); 0 disables bucketing
+TIME_BUCKET_TARGET_POINTS = int(os.getenv("TIME_BUCKET_TARGET_POINTS", "500"))
+
+# Candidate buckets, finest first, with their approximate length in seconds
+BUCKETS = [
+    ("hour", 3600),
+    ("day", 86400),
+    ("week", 7 * 86400),
+    ("month", 30.44 * 86400),
+    ("quarter", 91.31 * 86400),
+    ("year", 365.25 * 86400),
+]
+
+# Name tokens of y columns that are averaged rather than summed
+_AVERAGED = {
+    "rate", "ratio", "pct", "percent", "percentage", "avg", "average", "mean", "median",
+    "margin", "price", "score", "discount", "share", "ctr", "roi", "age", "temperature",
+    "utilization", "occupancy", "level", "balance", "satisfaction", "rating",
+}
+
+_NUMERIC_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+                  "UINTEGER", "UBIGINT", "UHUGEINT", "FLOAT", "DOUBLE", "DECIMAL")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def infer_aggregate(column: str) -> str:
+    """avg for rates and per-unit measures (by name), sum for everything else"""
+    tokens = set(re.findall(r"[a-z]+", column.lower()))
+    return "avg" if tokens & _AVERAGED else "sum"
+
+
+def _bucket_case(x: str, target_points: int, dates_only: bool) -> str:
+    """
+    SQL choosing the bucket over _source: NULL when x has at most
+    target_points distinct values, else the finest bucket whose count over
+    the x range fits the budget
+    """
+    span = f"epoch(max({x})) - epoch(min({x}))"
+    whens = [f"WHEN count(DISTINCT {x}) <= {target_points} THEN NULL"]
+    for name, seconds in BUCKETS[:-1]:
+        if dates_only and seconds < 86400:
+            continue
+        whens.append(f"WHEN floor(({span}) / {seconds}) + 1 <= {target_points} THEN '{name}'")
+    return f"CASE {' '.join(whens)} ELSE '{BUCKETS[-1][0]}' END"
+
+
+# Columns the rewritten statement adds: the bucketed x and y, the bucket and rows per bucket
+_HELPERS = ["__x", "__y", "__bucket", "__rows"]
+
+
+def plan_buckets(
+    sql: str,
+    x: str,
+    y: str,
+    con: duckdb.DuckDBPyConnection,
+    target_points: Optional[int] = None,
+    estimated_rows: Optional[int] = None,
+) -> Tuple[str, Optional[dict]]:
+    """
+    Rewrite a chart query into a time-bucket aggregate if its x axis may need
+    one. Returns (sql to run, plan), or the SQL unchanged and None. The
+    rewritten statement picks the bucket itself, from the x values it reads,
+    so the query still runs once: it returns either the source rows as they
+    are (x fits the budget) or one row per bucket, and finish_buckets tells
+    which. A query whose estimated rows (EXPLAIN, from cost_estimator) fit
+    the budget is left alone. x/y resolve like the chart's keys (exact,
+    case-insensitive, then the first/second column) and keep their names in
+    the bucketed result.
+    """
+    if TIME_BUCKET_TARGET_POINTS <= 0:
+        return sql, None
+    target_points = target_points or TIME_BUCKET_TARGET_POINTS
+    if estimated_rows is not None and estimated_rows <= target_points:
+        return sql, None
+    source = sql.strip().rstrip(";")
+    try:
+        schema = con.execute(f"DESCRIBE {source}").fetchall()
+    except duckdb.InterruptException:
+        raise
+    except duckdb.Error as e:
+        print(f"Time bucketing skipped: {e}")
+        return sql, None
+    names = [row[0] for row in schema]
+    if len(set(names)) != len(names) or set(names) & set(_HELPERS):
+        # Unchanged rows must come back under the same names
+        return sql, None
+    types = {row[0]: row[1] for row in schema}
+    x_name, y_name = resolve_column(names, x, 0), resolve_column(names, y, 1)
+    if x_name is None or y_name is None or x_name == y_name:
+        return sql, None
+    x_type, y_type = types[x_name], types[y_name]
+    if not (x_type == "DATE" or x_type.startswith("TIMESTAMP")) or not y_type.startswith(_NUMERIC_TYPES):
+        return sql, None
+
+    aggregate = infer_aggregate(y_name)
+    x_col, y_col = _quote(x_name), _quote(y_name)
+    bucket = _bucket_case(x_col, target_points, dates_only=x_type == "DATE")
+    # Only one branch returns rows; the aggregate's x and y get their own columns
+    # so the unchanged rows keep their types
+    rewritten = f"""
+        WITH _source AS MATERIALIZED ({source}),
+        _bucket AS (SELECT {bucket} AS __bucket FROM _source WHERE {x_col} IS NOT NULL)
+        SELECT * FROM _source WHERE (SELECT __bucket FROM _bucket) IS NULL
+        UNION ALL BY NAME
+        SELECT CAST(date_trunc(__bucket, {x_col}) AS {x_type}) AS __x, {aggregate}({y_col}) AS __y,
+               __bucket, count(*) AS __rows
+        FROM _source, _bucket WHERE __bucket IS NOT NULL AND {x_col} IS NOT NULL GROUP BY ALL
+    """
+    return rewritten, {"aggregate": aggregate, "x": x_name, "y": y_name}
+
+
+def finish_buckets(table: pa.Table, plan: dict) -> Tuple[pa.Table, Optional[dict]]:
+    """
+    The result of a rewritten query as the chart reads it: the source rows
+    without the helper columns (plan None), or the buckets as x and y in x
+    order with the plan completed by the bucket and the row count before
+    aggregation
+    """
+    if not table.num_rows or table["__rows"][0].as_py() is None:
+        return table.drop_columns(_HELPERS), None
+    buckets = pa.table({plan["x"]: table["__x"], plan["y"]: table["__y"]}).sort_by(plan["x"])
+    return buckets, {
+        "bucket": table["__bucket"][0].as_py(),
+        **plan,
+        "original_rows": pc.sum(table["__rows"]).as_py(),
+    }
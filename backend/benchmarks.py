@@ -0,0 +1,560 @@
+"""
+Micro-benchmarks for the backend hot paths.
+
+Run from the backend directory:
+    python benchmarks.py                 # list benchmarks
+    python benchmarks.py connections     # run one benchmark
+    python benchmarks.py schema live     # benchmarks that call Gemini take "live"
+"""
+import json
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+import db_pool
+from profiler import INTERACTION_SAMPLE, correlation_pairs, interaction_points, profile_dataframe
+from streaming_profiler import profile_stream
+from db import DB_PATH, column_to_list, execute_query_arrow, execute_query_df
+from db_utils import get_database_schema_with_descriptions
+from schema_retriever import SchemaRetriever
+
+DASHBOARD_QUERY = """
+SELECT DATE_TRUNC('month', date) AS month, SUM(total_revenue) AS amount
+FROM daily_revenue
+GROUP BY DATE_TRUNC('month', date)
+ORDER BY month
+"""
+
+
+def timed(fn, repeat):
+    """Call fn repeat times and return per-call latencies in milliseconds"""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"  {label:<32} mean {statistics.mean(latencies):8.3f} ms   "
+          f"p50 {statistics.median(latencies):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def bench_connections(repeat=200, threads=8):
+    """Per-request latency: connect/close per query vs pooled cursors"""
+
+    def connect_per_call():
+        con = duckdb.connect(DB_PATH, read_only=False)
+        try:
+            con.execute(DASHBOARD_QUERY).fetchall()
+        finally:
+            con.close()
+
+    def pooled():
+        with db_pool.cursor(DB_PATH) as con:
+            con.execute(DASHBOARD_QUERY).fetchall()
+
+    def concurrent(fn):
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [pool.submit(timed, fn, repeat // threads) for _ in range(threads)]
+            return [ms for f in futures for ms in f.result()]
+
+    # The "before" numbers must run while no shared handle is open, otherwise
+    # duckdb.connect reuses the cached database instance.
+    print(f"Connection benchmark ({repeat} requests, {threads} threads for concurrent runs)")
+    report("connect/close, sequential", timed(connect_per_call, repeat))
+    report("connect/close, concurrent", concurrent(connect_per_call))
+    report("pooled cursor, sequential", timed(pooled, repeat))
+    report("pooled cursor, concurrent", concurrent(pooled))
+    print(f"  pool: {db_pool.get_manager(DB_PATH).stats()}")
+
+
+def measure(fn):
+    """Return (elapsed ms of an untraced run, peak traced MB of a second run)"""
+    start = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - start) * 1000
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024**2
+
+
+def bench_serialization(sizes=(10_000, 100_000, 1_000_000)):
+    """Chart series: DataFrame + tolist vs Arrow columns"""
+    series = {
+        "date x": "DATE '2000-01-01' + i::INTEGER",
+        "timestamp x": "TIMESTAMP '2024-01-01' + INTERVAL (i) MINUTE",
+    }
+    for kind, x_expr in series.items():
+        print(f"Chart series serialization ({kind}, y = double)")
+        for n in sizes:
+            query = f"SELECT {x_expr} AS x, random() AS y FROM range({n}) t(i)"
+
+            def dataframe_path():
+                df = execute_query_df(query)
+                return {'x': df['x'].astype(str).tolist(), 'y': df['y'].tolist()}
+
+            def arrow_path():
+                table = execute_query_arrow(query)
+                return {'x': column_to_list(table['x']), 'y': column_to_list(table['y'])}
+
+            for label, fn in (("DataFrame", dataframe_path), ("Arrow", arrow_path)):
+                elapsed, peak = measure(fn)
+                print(f"  {n:>9,} rows  {label:<10} {elapsed:9.1f} ms   peak {peak:8.1f} MB")
+
+
+def profiling_query(n):
+    """Synthetic result set: mixed numeric, categorical and date columns"""
+    return f"""
+        SELECT
+            i AS id,
+            random() * 1000 AS amount,
+            (random() * 50)::INTEGER AS quantity,
+            CASE WHEN random() < 0.05 THEN NULL ELSE random() * 100 END AS discount,
+            ['North', 'South', 'East', 'West'][1 + (i % 4)::INTEGER] AS region,
+            'customer_' || (i % 5000)::VARCHAR AS customer,
+            DATE '2024-01-01' + (i % 365)::INTEGER AS order_date
+        FROM range({n}) t(i)
+    """
+
+
+def profiling_frame(n):
+    with db_pool.cursor(DB_PATH) as con:
+        return con.execute(profiling_query(n)).fetchdf()
+
+
+def bench_profiling(sizes=(10_000, 1_000_000, 10_000_000), legacy_max_rows=1_000_000):
+    """Key insights: ydata-profiling path vs profiler.profile_dataframe"""
+    try:
+        from ydata_profiling import ProfileReport
+    except ImportError:
+        ProfileReport = None
+        print("  ydata-profiling not installed; timing the new profiler only")
+
+    def legacy(df):
+        # The old path built an explorative report and then ran the same stats pass
+        ProfileReport(df, title="Dataset Insights", explorative=True, minimal=False,
+                      progress_bar=False).get_description()
+        profile_dataframe(df)
+
+    print("Profiling benchmark (7 columns)")
+    for n in sizes:
+        df = profiling_frame(n)
+        elapsed, peak = measure(lambda: profile_dataframe(df))
+        print(f"  {n:>11,} rows  profiler        {elapsed:10.1f} ms   peak {peak:8.1f} MB")
+        if ProfileReport is not None and n <= legacy_max_rows:
+            elapsed, peak = measure(lambda: legacy(df))
+            print(f"  {n:>11,} rows  ydata-profiling {elapsed:10.1f} ms   peak {peak:8.1f} MB")
+        del df
+
+
+def bench_streaming(sizes=(100_000, 1_000_000, 5_000_000), batch_sizes=(16_384, 65_536)):
+    """Key insights peak memory: fetchdf + profile_dataframe vs record-batch streaming"""
+
+    def pandas_path(n):
+        profile_dataframe(profiling_frame(n))
+
+    print("Streaming profiler benchmark (7 columns, peak traced memory)")
+    for n in sizes:
+        elapsed, peak = measure(lambda: pandas_path(n))
+        print(f"  {n:>11,} rows  pandas               {elapsed:10.1f} ms   peak {peak:8.1f} MB")
+        for batch_size in batch_sizes:
+            elapsed, peak = measure(lambda: profile_stream(profiling_query(n), batch_size=batch_size))
+            print(f"  {n:>11,} rows  streaming ({batch_size:>6,})  {elapsed:10.1f} ms   peak {peak:8.1f} MB")
+
+
+def bench_correlations(widths=(50, 200), rows=100_000, repeat=5):
+    """Correlation pairs + interaction sampling: label loops and iterrows vs numpy"""
+
+    def legacy(df, corr_matrix):
+        cols = corr_matrix.columns
+        correlations = [
+            {"col1": col1, "col2": col2, "correlation": float(corr_matrix.loc[col1, col2])}
+            for col1 in cols
+            for col2 in cols
+            if col1 < col2
+        ]
+        top_pairs = sorted(correlations, key=lambda x: abs(x["correlation"]), reverse=True)[:3]
+        for pair in top_pairs:
+            clean_df = df[[pair["col1"], pair["col2"]]].dropna()
+            sample_df = clean_df.sample(n=min(INTERACTION_SAMPLE, len(clean_df)))
+            [{"x": float(row[pair["col1"]]), "y": float(row[pair["col2"]])} for _, row in sample_df.iterrows()]
+
+    def vectorized(df, corr_matrix):
+        correlations = correlation_pairs(corr_matrix.columns, corr_matrix.values)
+        for pair in correlations[:3]:
+            interaction_points(df[pair["col1"]].to_numpy(dtype=np.float64), df[pair["col2"]].to_numpy(dtype=np.float64))
+
+    rng = np.random.default_rng(0)
+    print(f"Correlation pairs + interactions ({rows:,} rows, correlation matrix precomputed)")
+    for k in widths:
+        df = pd.DataFrame(rng.normal(size=(rows, k)), columns=[f"c{i:03d}" for i in range(k)])
+        corr_matrix = df.corr()
+        pairs = k * (k - 1) // 2
+        report(f"{k} cols ({pairs:,} pairs), legacy", timed(lambda: legacy(df, corr_matrix), repeat))
+        report(f"{k} cols ({pairs:,} pairs), numpy", timed(lambda: vectorized(df, corr_matrix), repeat))
+
+
+# Fixed question set for schema pruning: question -> tables a correct query needs
+SCHEMA_QUESTIONS = [
+    ("Show daily revenue for the last 30 days", {"daily_revenue"}),
+    ("Compare monthly revenue and monthly tax collected for 2024", {"orders"}),
+    ("Revenue by product category", {"order_items", "products"}),
+    ("Top 10 customers by total order amount", {"customers", "orders"}),
+    ("Total payroll by department", {"payroll"}),
+    ("Expenses over time by category", {"expenses"}),
+    ("Marketing spend vs conversions by channel", {"marketing"}),
+    ("Profit forecast vs budget profit by month", {"profit_forecast"}),
+    ("Average order value by region", {"orders"}),
+    ("Which products sell the most units", {"order_items", "products"}),
+    ("Average base salary by role", {"payroll"}),
+    ("Number of customers by country", {"customers"}),
+    ("Order count per customer segment", {"orders"}),
+    ("Top campaigns by clicks", {"marketing"}),
+    ("Monthly revenue vs monthly expenses", {"daily_revenue", "expenses"}),
+    ("Profit margin by product subcategory", {"order_items", "products"}),
+]
+
+
+def bench_schema(live=None):
+    """Gemini prompt size with and without schema pruning ("live" also times Gemini and checks SQL)"""
+    schema = get_database_schema_with_descriptions(DB_PATH)
+    retriever = SchemaRetriever(schema)
+    from chat import format_schema
+
+    full_tokens = len(format_schema(schema)) // 4
+    recalled, tables, tokens = 0, [], []
+    start = time.perf_counter()
+    for question, expected in SCHEMA_QUESTIONS:
+        kept = retriever.prune(question)
+        names = {table["table"] for table in kept}
+        recalled += expected <= names
+        tables.append(len(names))
+        tokens.append(len(format_schema(kept)) // 4)
+        if not expected <= names:
+            print(f"  missed {sorted(expected - names)} for: {question}")
+    retrieval_ms = (time.perf_counter() - start) * 1000 / len(SCHEMA_QUESTIONS)
+
+    print(f"Schema pruning ({len(SCHEMA_QUESTIONS)} questions, {len(schema)} tables, top_k={retriever.top_k}, ~4 chars/token)")
+    print(f"  full schema         {len(schema):5.1f} tables   ~{full_tokens:6,} tokens")
+    print(f"  pruned schema       {statistics.mean(tables):5.1f} tables   ~{statistics.mean(tokens):6,.0f} tokens   "
+          f"recall {recalled}/{len(SCHEMA_QUESTIONS)}   retrieval {retrieval_ms:.3f} ms")
+
+    if live != "live":
+        return
+
+    # Live run: same questions through Gemini with pruning off and on
+    from chat import GeminiSQLWrapper
+    wrapper = GeminiSQLWrapper()
+    wrapper.load_schema_from_db(DB_PATH)
+    for label, top_k in (("full schema", 0), ("pruned schema", retriever.top_k)):
+        wrapper.retriever.top_k = top_k
+        wrapper._llm_stats.update(calls=0, prompt_tokens=0, prompt_tables=0, latency=0.0)
+        correct = 0
+        for question, expected in SCHEMA_QUESTIONS:
+            try:
+                result = wrapper.query(question, use_cache=False)
+                for q in result.queries:
+                    with db_pool.cursor(DB_PATH) as con:
+                        con.execute(q.sql).fetchall()
+                # Correct: every query runs and together they read the expected tables
+                sql = " ".join(q.sql.lower() for q in result.queries)
+                correct += bool(result.queries) and all(re.search(rf"\b{t}\b", sql) for t in expected)
+            except Exception as e:
+                print(f"  {label}: failed on {question!r}: {e}")
+        stats = wrapper.llm_stats()
+        print(f"  {label:<18} prompt {stats['avg_prompt_tokens']:7,.0f} tokens   "
+              f"latency {stats['avg_latency'] * 1000:7.0f} ms   accuracy {correct}/{len(SCHEMA_QUESTIONS)}")
+
+
+def bench_projection(repeat=5):
+    """Chat query payloads: SELECT * as generated vs projection pruned to the chart columns"""
+    import aggregation_planner
+    import query_executor
+    from chat import Query
+
+    # Measure pruning alone; time bucketing would shrink these results too
+    aggregation_planner.TIME_BUCKET_TARGET_POINTS = 0
+
+    charts = [
+        ("SELECT * FROM orders ORDER BY order_date;", "order_date", "total_amount"),
+        ("SELECT * FROM order_items WHERE quantity > 1;", "order_item_id", "line_total"),
+        ("SELECT * FROM orders o JOIN customers c ON o.customer_id = c.customer_id ORDER BY o.order_date;", "order_date", "country"),
+        ("SELECT * FROM expenses ORDER BY date;", "date", "amount"),
+    ]
+    queries = [
+        Query(name=f"q{i}", sql=sql, suggested_chart={"type": "line", "x": x, "y": y, "title": sql})
+        for i, (sql, x, y) in enumerate(charts)
+    ]
+
+    def run():
+        entries = query_executor.execute_all(queries)
+        return len(json.dumps(entries, default=str))
+
+    print(f"Projection pruning ({len(queries)} generated SELECT * queries per response)")
+    for label, enabled in (("SELECT *", False), ("pruned", True)):
+        query_executor.PROJECTION_PRUNING = enabled
+        size = run()
+        report(f"{label:<8} ({size / 1024**2:6.2f} MB JSON)", timed(run, repeat))
+    print(f"  {query_executor.pruning_stats()}")
+
+
+def bench_charts(sizes=(10_000, 100_000, 1_000_000), repeat=3):
+    """Chat chart shaping: per-row dict lookups vs columnwise Arrow (charts.plotly_trace)"""
+    from charts import plotly_trace
+
+    def legacy(data, x_key, y_key):
+        # The per-row transform_to_plotly that lived in routes.chat
+        x_values, y_values = [], []
+        for row in data:
+            x_value = y_value = None
+            if x_key in row:
+                x_value = row[x_key]
+            elif x_key.lower() in {k.lower(): k for k in row.keys()}:
+                x_value = row[{k.lower(): k for k in row.keys()}[x_key.lower()]]
+            if y_key in row:
+                y_value = row[y_key]
+            elif y_key.lower() in {k.lower(): k for k in row.keys()}:
+                y_value = row[{k.lower(): k for k in row.keys()}[y_key.lower()]]
+            if x_value is None and len(row) > 0:
+                x_value = list(row.values())[0]
+            if y_value is None and len(row) > 1:
+                y_value = list(row.values())[1]
+            if x_value is not None and y_value is not None:
+                x_values.append(x_value)
+                try:
+                    y_values.append(float(y_value))
+                except (ValueError, TypeError):
+                    y_values.append(0)
+        return {'x': x_values, 'y': y_values}
+
+    print("Chart shaping (date x, decimal y, 5 columns, keys given in another case)")
+    for n in sizes:
+        table = execute_query_arrow(f"""
+            SELECT DATE '2020-01-01' + (i % 3650)::INTEGER AS Order_Date, (random() * 1000)::DECIMAL(12, 2) AS Amount,
+                   i AS id, 'r' || (i % 7)::VARCHAR AS region, random() AS score
+            FROM range({n}) t(i)
+        """)
+        rows = table.to_pylist()
+        report(f"{n:>9,} rows  per-row dicts", timed(lambda: legacy(rows, "order_date", "amount"), repeat))
+        report(f"{n:>9,} rows  columnwise", timed(lambda: plotly_trace(table, "order_date", "amount", "line", "t"), repeat))
+
+
+def bench_downsample(max_points=1000, sizes=(10_000, 100_000, 1_000_000), repeat=3):
+    """Line chart payloads: full series vs LTTB-downsampled to max_points"""
+    from charts import plotly_trace
+
+    max_points = int(max_points)
+    print(f"Line chart (timestamp x, noisy daily-cycle y), max_points={max_points}")
+    for n in sizes:
+        table = execute_query_arrow(f"""
+            SELECT TIMESTAMP '2020-01-01' + to_minutes(i) AS ts, sin(i / 1440.0 * 2 * pi()) * 100 + random() * 10 AS value
+            FROM range({n}) t(i)
+        """)
+        for label, points in (("full", None), ("lttb", max_points)):
+            trace = plotly_trace(table, "ts", "value", "line", "t", points)
+            size = len(json.dumps(trace, default=str)) / 1024**2
+            latencies = timed(lambda: json.dumps(plotly_trace(table, "ts", "value", "line", "t", points), default=str), repeat)
+            report(f"{n:>9,} rows  {label} ({len(trace['x'])} pts, {size:.2f} MB)", latencies)
+
+
+def bench_bucketing(repeat=5):
+    """Chat queries with a raw date x axis: every row vs date_trunc buckets in DuckDB"""
+    import aggregation_planner
+    import query_executor
+    from chat import Query
+
+    charts = [
+        ("SELECT order_date, total_amount FROM orders ORDER BY order_date;", "order_date", "total_amount"),
+        ("SELECT o.order_date, i.unit_price FROM orders o JOIN order_items i USING (order_id);", "order_date", "unit_price"),
+        ("SELECT TIMESTAMP '2024-01-01' + to_seconds(i * 30) AS ts, random() AS conversion_rate FROM range(500000) t(i);",
+         "ts", "conversion_rate"),
+    ]
+    queries = [
+        Query(name=f"q{i}", sql=sql, suggested_chart={"type": "line", "x": x, "y": y, "title": sql})
+        for i, (sql, x, y) in enumerate(charts)
+    ]
+
+    def run():
+        entries = query_executor.execute_all(queries)
+        return len(json.dumps(entries, default=str)), [len(entry["data"]) for entry in entries]
+
+    target = aggregation_planner.TIME_BUCKET_TARGET_POINTS or 500
+    print(f"Time bucketing ({len(queries)} chat queries, target {target} points)")
+    for label, points in (("raw rows", 0), ("bucketed", target)):
+        aggregation_planner.TIME_BUCKET_TARGET_POINTS = points
+        size, rows = run()
+        report(f"{label:<8} ({size / 1024**2:6.2f} MB JSON, rows {rows})", timed(run, repeat))
+    print(f"  {query_executor.bucketing_stats()}")
+
+
+def bench_registry(repeat=300):
+    """Canned queries re-planned from SQL text on every call vs executed as prepared statements"""
+    from queries import STATEMENTS, registry
+
+    calls = [
+        ("daily_revenue", ("2024-03-01", None)),
+        ("revenue_by_customer", (10,)),
+        ("payroll_by_department", ()),
+        ("monthly_expenses", ()),
+    ]
+    registry.validate()
+    print(f"Canned queries, {repeat} runs each")
+    for name, args in calls:
+        # The same statement, parsed and planned with its parameters on each call
+        sql = STATEMENTS[name]["sql"]
+
+        def plain():
+            with db_pool.cursor(DB_PATH) as con:
+                return con.execute(sql, [*args] if args else None).fetch_arrow_table()
+
+        report(f"{name} re-planned", timed(plain, repeat))
+        report(f"{name} prepared", timed(lambda: registry.execute(name, *args), repeat))
+    print(f"  {registry.stats()}")
+
+
+def bench_cost(repeat=5, timeout=5):
+    """Generated queries with and without EXPLAIN screening: runaway queries, and the overhead on normal ones"""
+    import cost_estimator
+    import query_executor
+    import query_guard
+    from chat import Query
+
+    charts = [
+        ("normal", "SELECT region AS x, sum(total_amount) AS y FROM orders GROUP BY 1;", "bar"),
+        ("normal", "SELECT o.region AS x, sum(i.line_total) AS y FROM orders o JOIN order_items i USING (order_id) GROUP BY 1;", "bar"),
+        ("runaway", "SELECT count(*) AS y, 'all' AS x FROM orders o, order_items i;", "bar"),
+        ("runaway", "SELECT o.region AS x, sum(i.line_total) AS y FROM orders o, order_items i GROUP BY 1;", "bar"),
+        ("runaway", "SELECT o.order_id AS x, i.line_total AS y FROM orders o, order_items i ORDER BY y;", "line"),
+    ]
+    query_guard.QUERY_TIMEOUT = timeout
+    print(f"Cost screening (limit {cost_estimator.COST_MAX_WORK:,.0f} rows of work, watchdog {timeout}s)")
+    for kind in ("normal", "runaway"):
+        queries = [
+            Query(name=f"q{i}", sql=sql, suggested_chart={"type": chart, "x": "x", "y": "y", "title": sql})
+            for i, (k, sql, chart) in enumerate(charts) if k == kind
+        ]
+        for label, max_work in (("unscreened", 0), ("screened", 5e7)):
+            cost_estimator.COST_MAX_WORK = max_work
+            outcomes = [
+                entry.get("cost", {}).get("decision") or ("timed out" if entry.get("timed_out") else "run")
+                for entry in (query_executor.execute_generated_query(q) for q in queries)
+            ]
+            latencies = timed(lambda: [query_executor.execute_generated_query(q) for q in queries],
+                              repeat if kind == "normal" else 1)
+            report(f"{kind} {label:<10} {outcomes}", latencies)
+    print(f"  {cost_estimator.stats()}")
+
+
+# Chat questions and the canned query that answers each (None: needs Gemini)
+ROUTER_QUESTIONS = [
+    ("Show me daily revenue", "daily_revenue"),
+    ("Daily revenue in March 2024", "daily_revenue"),
+    ("Revenue trend since 2024-06-01", "daily_revenue"),
+    ("What are the top 5 products?", "top_products"),
+    ("Top ten best selling products", "top_products"),
+    ("Revenue by product", "revenue_by_product"),
+    ("Top 10 customers by revenue", "revenue_by_customer"),
+    ("Total payroll by department", "payroll_by_department"),
+    ("Expenses over time", "expenses_over_time"),
+    ("Monthly revenue vs monthly expenses", "revenue_vs_expenses"),
+    ("Average base salary by department", None),
+    ("Revenue by region over time", None),
+    ("Top 5 products in 2024", None),
+    ("Expenses over time by category", None),
+    ("Marketing spend vs conversions by channel", None),
+    ("Show daily revenue for the last 30 days", None),
+]
+
+
+def bench_router(repeat=200):
+    """Intent routing: accuracy on ROUTER_QUESTIONS and time to match a question"""
+    from intent_router import IntentRouter
+
+    router = IntentRouter()
+    correct = routed = 0
+    for question, expected in ROUTER_QUESTIONS:
+        match = router.route(question)
+        got = match["query_type"] if match else None
+        routed += got is not None
+        correct += got == expected
+        print(f"  {'ok ' if got == expected else 'BAD'} {question:<45} -> {got} {match['filters'] if match else ''}")
+    print(f"Routed {routed}/{len(ROUTER_QUESTIONS)}, correct {correct}/{len(ROUTER_QUESTIONS)}")
+    report(f"match all {len(ROUTER_QUESTIONS)} questions", timed(lambda: [router.route(q) for q, _ in ROUTER_QUESTIONS], int(repeat)))
+
+
+def bench_scheduler(profiles=4, charts=20):
+    """Dashboard chart latency while heavy key-insights profiles run, and how many profiles are shed"""
+    import threading
+    from key_insights import get_key_insights
+    from queries import _result_cache, run_query
+    from scheduler import Overloaded, scheduler
+
+    heavy = ("SELECT o.order_id, o.total_amount * i.line_total AS v, o.region "
+             "FROM orders o, order_items i WHERE (o.order_id + i.order_item_id) % {} = 0")
+
+    def chart():
+        _result_cache.clear()
+        with scheduler.slot("dashboard"):
+            run_query("daily_revenue")
+
+    outcomes = []
+
+    def profile(k):
+        try:
+            scheduler.run("insights", get_key_insights, heavy.format(50 + k), mode="pushdown")
+            outcomes.append("done")
+        except Overloaded:
+            outcomes.append("shed")
+
+    print(f"daily_revenue chart (uncached), alone and while {profiles} profiles are submitted")
+    report("alone", timed(chart, int(charts)))
+    threads = [threading.Thread(target=profile, args=(k,)) for k in range(int(profiles))]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    report("during profiling", timed(chart, int(charts)))
+    for t in threads:
+        t.join()
+    print(f"  profiles: {outcomes.count('done')} done, {outcomes.count('shed')} shed (429)")
+    print(f"  {scheduler.stats()['insights']}")
+
+
+BENCHMARKS = {
+    "connections": bench_connections,
+    "serialization": bench_serialization,
+    "profiling": bench_profiling,
+    "streaming": bench_streaming,
+    "correlations": bench_correlations,
+    "schema": bench_schema,
+    "projection": bench_projection,
+    "charts": bench_charts,
+    "downsample": bench_downsample,
+    "bucketing": bench_bucketing,
+    "cost": bench_cost,
+    "registry": bench_registry,
+    "router": bench_router,
+    "scheduler": bench_scheduler,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print("Available benchmarks:")
+        for name, fn in BENCHMARKS.items():
+            print(f"  {name:<16} {fn.__doc__}")
+        sys.exit(0 if len(sys.argv) < 2 else 1)
+    BENCHMARKS[sys.argv[1]](*sys.argv[2:])
+    db_pool.close_all()
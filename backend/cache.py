@@ -0,0 +1,129 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+_MISSING = object()
+
+
+def approx_size(obj: Any) -> int:
+    """Rough deep size in bytes of JSON-like data (dicts, lists, scalars)"""
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(approx_size(k) + approx_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(approx_size(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at", "version", "tags")
+
+    def __init__(self, value, size, expires_at, version, tags):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.version = version
+        self.tags = tags
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by an approximate memory budget.
+
+    Entries carry a TTL, an optional version token (a lookup with a different
+    version is a miss and drops the entry) and optional tags for bulk
+    invalidation.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: Optional[float] = None,
+        sizeof: Callable[[Any], int] = approx_size,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key: Hashable, version: Any = None, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stale = entry.version != version
+                expired = entry.expires_at is not None and entry.expires_at <= time.monotonic()
+                if stale or expired:
+                    self._drop(key)
+                    self.invalidations += stale
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        version: Any = None,
+        tags: Iterable[str] = (),
+        ttl: Optional[float] = _MISSING,
+    ):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(value, size, expires_at, version, frozenset(tags))
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, tags: Optional[Iterable[str]] = None) -> int:
+        """Drop entries carrying any of the given tags (all entries if tags is None)"""
+        with self._lock:
+            if tags is None:
+                keys = list(self._entries)
+            else:
+                tags = set(tags)
+                keys = [k for k, e in self._entries.items() if e.tags & tags]
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
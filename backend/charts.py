@@ -0,0 +1,206 @@
+"""
+Shaping query results into Plotly traces.
+
+The x/y columns are resolved once against the result's schema (exact name,
+then case-insensitive, then a positional fallback) and the arrays are built
+columnwise with Arrow compute, so the cost no longer grows with per-row
+Python work. Used for chat charts (query_executor) and the dashboard
+queries (queries.py).
+
+Long line series can be downsampled to max_points with Largest-Triangle-
+Three-Buckets, which keeps the peaks and troughs that give a line its shape.
+"""
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from db import column_to_list
+
+
+def resolve_column(names: List[str], key: Optional[str], fallback: int) -> Optional[str]:
+    """
+    The result column a chart key refers to: an exact match, else a
+    case-insensitive one, else the column at position fallback (None if the
+    result has too few columns)
+    """
+    if key in names:
+        return key
+    if isinstance(key, str):
+        lowered = {name.lower(): name for name in reversed(names)}
+        if key.lower() in lowered:
+            return lowered[key.lower()]
+    return names[fallback] if len(names) > fallback else None
+
+
+def to_numeric(column) -> pa.Array:
+    """
+    A column as float64: numbers and booleans are cast, numeric strings are
+    parsed, other values become 0. NULLs stay NULL.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    col_type = column.type
+    if (pa.types.is_integer(col_type) or pa.types.is_floating(col_type)
+            or pa.types.is_decimal(col_type) or pa.types.is_boolean(col_type)):
+        return pc.cast(column, pa.float64())
+
+    valid = column.is_valid().to_numpy(zero_copy_only=False)
+    if pa.types.is_string(col_type) or pa.types.is_large_string(col_type):
+        values = pd.to_numeric(column.to_pandas(), errors="coerce").to_numpy(dtype=np.float64)
+    else:
+        values = np.full(len(column), np.nan)
+    values = np.where(np.isnan(values) & valid, 0.0, values)
+    return pa.array(values, mask=~valid, type=pa.float64())
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps: the first and
+    last point, plus from each of max_points - 2 equal buckets the point
+    forming the largest triangle with the previous pick and the next
+    bucket's average. NaN y values are never picked unless a bucket has
+    nothing else.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+
+    # Average point of every bucket (and of the last point, the final "next
+    # bucket"), computed up front; only the pick depends on the previous one
+    starts = np.append(edges[:-1], n - 1)
+    valid = ~np.isnan(y)
+    counts = np.maximum(np.add.reduceat(valid.astype(np.float64), starts), 1)
+    avg_x = np.add.reduceat(np.where(valid, x, 0.0), starts) / counts
+    avg_y = np.add.reduceat(np.where(valid, y, 0.0), starts) / counts
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    # Triangles are anchored on the last non-NaN pick (a NaN anchor makes every area NaN)
+    a = int(np.argmax(valid))
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a]))
+        pick = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[i + 1] = pick
+        if valid[pick]:
+            a = pick
+    return selected
+
+
+def parse_max_points(value) -> Optional[int]:
+    """A max_points request parameter: None when absent, else an integer of at least 3"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or not str(value).isdigit() or int(value) < 3:
+        raise ValueError(f'max_points must be an integer of at least 3, got {value!r}')
+    return int(value)
+
+
+def _positions(x) -> np.ndarray:
+    """x as numbers for LTTB areas: numbers and dates by value, anything else by position"""
+    if isinstance(x, (pa.Array, pa.ChunkedArray)):
+        if pa.types.is_temporal(x.type):
+            x = pc.cast(pc.cast(x, pa.timestamp("us")) if pa.types.is_date(x.type) else x, pa.int64())
+        if pa.types.is_integer(x.type) or pa.types.is_floating(x.type) or pa.types.is_decimal(x.type):
+            return to_numeric(x).to_numpy(zero_copy_only=False)
+        return np.arange(len(x), dtype=np.float64)
+    try:
+        values = np.asarray(x)
+        if values.dtype.kind in "US":
+            # JSON-ready dates ("YYYY-MM-DD" / "YYYY-MM-DD HH:MM:SS")
+            values = values.astype("datetime64[s]")
+        return values.astype(np.float64)
+    except (ValueError, TypeError):
+        return np.arange(len(x), dtype=np.float64)
+
+
+def downsample_trace(trace: dict, max_points: Optional[int]) -> dict:
+    """
+    A line trace reduced to max_points with LTTB, as a new dict carrying
+    'original_points'. Bar traces and short series are returned as they are;
+    the input is never modified, so cached results can be passed in.
+    """
+    points = len(trace.get('x') or [])
+    if not max_points or points <= max_points or trace.get('type') == 'bar':
+        return trace
+    y = np.array([np.nan if v is None else v for v in trace['y']], dtype=np.float64)
+    keep = lttb_indices(_positions(trace['x']), y, max_points)
+    return {
+        **trace,
+        'x': [trace['x'][i] for i in keep],
+        'y': [trace['y'][i] for i in keep],
+        'original_points': points,
+    }
+
+
+def downsample_result(result, max_points: Optional[int]):
+    """downsample_trace over a QUERY_FUNCTIONS result (one trace or a list of them)"""
+    if isinstance(result, list):
+        return [downsample_trace(trace, max_points) for trace in result]
+    return downsample_trace(result, max_points)
+
+
+def series(table: pa.Table, x: str = "x", y: str = "y") -> dict:
+    """JSON-ready x/y lists of two result columns (y as numbers); NULLs become None"""
+    return {
+        "x": column_to_list(table[x]),
+        "y": column_to_list(to_numeric(table[y])),
+    }
+
+
+def plotly_trace(
+    table: pa.Table,
+    x_key: str,
+    y_key: str,
+    chart_type: str,
+    title: str,
+    max_points: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Plotly trace for a generated chart: x/y resolved against the result
+    (falling back to the first and second columns), rows with a NULL x or y
+    dropped. None if nothing is left to draw. Line charts longer than
+    max_points are downsampled with LTTB and report 'original_points'.
+    """
+    if table.num_rows == 0:
+        return None
+    x_name = resolve_column(table.column_names, x_key, 0)
+    y_name = resolve_column(table.column_names, y_key, 1)
+    if x_name is None or y_name is None:
+        return None
+
+    x = table[x_name].combine_chunks()
+    y = to_numeric(table[y_name])
+    present = pc.and_(x.is_valid(), y.is_valid())
+    if pc.all(present).as_py() is False:
+        x, y = x.filter(present), y.filter(present)
+    if len(x) == 0:
+        return None
+
+    original_points = None
+    if chart_type == 'line' and max_points and len(x) > max_points:
+        keep = pa.array(lttb_indices(_positions(x), y.to_numpy(zero_copy_only=False), max_points))
+        original_points = len(x)
+        x, y = x.take(keep), y.take(keep)
+
+    plotly_obj = {
+        'x': column_to_list(x),
+        'y': column_to_list(y),
+        'type': 'scatter' if chart_type == 'line' else 'bar',
+        'name': title
+    }
+
+    # Only add mode for line charts
+    if chart_type == 'line':
+        plotly_obj['mode'] = 'lines'
+    if original_points is not None:
+        plotly_obj['original_points'] = original_points
+
+    return plotly_obj
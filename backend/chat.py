@@ -1,12 +1,18 @@
 import os
 import re
 import json
+import threading
+import time
+from collections import Counter
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from typing import List, Union, Optional
+from typing import Iterator, List, Union, Optional
 
 from google import genai  # from google-genai package
+from chat_cache import ResponseCache, cache_key
 from db_utils import get_database_schema_with_descriptions
+from schema_retriever import SchemaRetriever
+from sql_validator import SQLValidator
 
 load_dotenv()
 
@@ -27,6 +33,8 @@ class Query(BaseModel):
     name: str
     sql: str
     suggested_chart: SuggestedChart
+    # Set when the generated SQL didn't bind, or was too expensive, and was replaced by a repair
+    repaired: Optional[dict] = None
 
 class QueryResponse(BaseModel):
     queries: List[Query]
@@ -51,11 +59,91 @@ def clean_json_block(text: str) -> str:
     return text
 
 
+class QueryStreamParser:
+    """
+    Pulls each complete object out of the "queries" array of a JSON reply
+    while it is still streaming in. Tracks string/escape state and nesting
+    depth, so braces inside SQL strings don't confuse it.
+    """
+    
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, text: str) -> List[dict]:
+        """Add the next chunk of text; returns the objects it completed"""
+        self.buffer += text
+        objects = []
+        if self._done:
+            return objects
+        if not self._in_array:
+            match = re.search(r'"queries"\s*:\s*\[', self.buffer)
+            if not match:
+                return objects
+            self._in_array = True
+            self._pos = match.end()
+        
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the queries array
+                    self._done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    try:
+                        objects.append(json.loads(buf[self._start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._start = None
+            i += 1
+        self._pos = i
+        return objects
+
+
+def format_schema(schema: List[dict]) -> str:
+    """Render schema entries (as from db_utils) as the prompt's schema section"""
+    schema_str = "DATABASE SCHEMA:\n\n"
+    for table in schema:
+        schema_str += f"Table: {table['table']}\n"
+        if table.get('description'):
+            schema_str += f"Description: {table['description']}\n"
+        schema_str += "Columns:\n"
+        for col in table['columns']:
+            schema_str += f"  - {col['name']} ({col['type']})"
+            if col.get('description'):
+                schema_str += f": {col['description']}"
+            schema_str += "\n"
+        schema_str += "\n"
+    return schema_str
+
 
 class GeminiSQLWrapper:
     """Wrapper for Gemini to generate SQL queries with chart metadata"""
     
-    def __init__(self, api_key: str = None, model: str = "gemini-2.5-flash"):
+    def __init__(self, api_key: str = None, model: str = "gemini-2.5-flash", cache: ResponseCache = None):
         self.api_key = api_key or os.getenv("API_KEY")
         if not self.api_key:
             raise ValueError("API key required")
@@ -63,23 +151,40 @@ class GeminiSQLWrapper:
         self.client = genai.Client(api_key=self.api_key)
         self.model = model
         self.input_schema = None
+        self.retriever = None
+        # Prompt size and latency of the Gemini calls made by query()
+        self._llm_stats = {"calls": 0, "prompt_tokens": 0, "prompt_tables": 0, "latency": 0.0}
+        self._stats_lock = threading.Lock()
+        # Validated responses, keyed on question + schema hash + model
+        self.cache = cache if cache is not None else ResponseCache()
+        # Binds generated SQL before it runs; repairs go through _ask_json
+        self.validator = SQLValidator(self._ask_json)
     
     def set_input_schema(self, schema: List[dict]):
         """Set the database schema for context"""
-        schema_str = "DATABASE SCHEMA:\n\n"
-        for table in schema:
-            schema_str += f"Table: {table['table']}\n"
-            if table.get('description'):
-                schema_str += f"Description: {table['description']}\n"
-            schema_str += "Columns:\n"
-            for col in table['columns']:
-                schema_str += f"  - {col['name']} ({col['type']})"
-                if col.get('description'):
-                    schema_str += f": {col['description']}"
-                schema_str += "\n"
-            schema_str += "\n"
-        
-        self.input_schema = schema_str
+        self.input_schema = format_schema(schema)
+        self.validator.set_schema(self.input_schema)
+        # Picks the tables relevant to each question for its prompt
+        self.retriever = SchemaRetriever(schema)
+    
+    def schema_prompt(self, user_input: str) -> str:
+        """Schema section for one question: only the tables relevant to it"""
+        if self.retriever is None:
+            return self.input_schema
+        return format_schema(self.retriever.prune(user_input))
+    
+    def llm_stats(self) -> dict:
+        """Call count, average prompt tokens, tables and latency of query() LLM calls"""
+        with self._stats_lock:
+            stats = dict(self._llm_stats)
+        calls = stats["calls"] or 1
+        return {
+            "calls": stats["calls"],
+            "avg_prompt_tokens": stats["prompt_tokens"] / calls,
+            "avg_prompt_tables": stats["prompt_tables"] / calls,
+            "avg_latency": stats["latency"] / calls,
+            "schema_top_k": self.retriever.top_k if self.retriever else None,
+        }
     
     def load_schema_from_db(self, db_path: str = "codejam_15.db"):
         """Load schema directly from database"""
@@ -97,15 +202,12 @@ class GeminiSQLWrapper:
             "full_schema": self.raw_schema
         }
     
-    def query(self, user_input: str) -> QueryResponse:
-        """Generate SQL query and chart metadata from natural language"""
+    def build_prompt(self, user_input: str, schema: str) -> str:
+        """Prompt asking for queries + chart metadata, given the schema section to show"""
         
-        if not self.input_schema:
-            raise ValueError("Schema must be set before querying. Call set_schema() first.")
-        
-        prompt = f"""You are a SQL query generator and data visualization assistant.
+        return f"""You are a SQL query generator and data visualization assistant.
 
-        {self.input_schema}
+        {schema}
 
         USER REQUEST: "{user_input}"
 
@@ -159,13 +261,18 @@ class GeminiSQLWrapper:
 
         CRITICAL: Return ONLY the JSON object, nothing else.
         """
-
-        response = self.client.models.generate_content(
-            model=self.model,
-            contents=prompt,
-        )
+    
+    def _prepare(self, user_input: str):
+        """Schema section and response-cache key for one question"""
+        if not self.input_schema:
+            raise ValueError("Schema must be set before querying. Call set_schema() first.")
         
-        raw = clean_json_block(response.text.strip())
+        schema = self.schema_prompt(user_input)
+        return schema, cache_key(user_input, schema, self.model)
+    
+    def _parse_reply(self, text: str) -> QueryResponse:
+        """Validate the model's full reply; an {"error": ...} reply becomes QueryResponse.error"""
+        raw = clean_json_block(text.strip())
         
         try:
             parsed = json.loads(raw)
@@ -173,13 +280,115 @@ class GeminiSQLWrapper:
             # Check if it's an error response
             if 'error' in parsed and parsed.get('error'):
                 return QueryResponse(queries=[], error=parsed['error'])
-            
             return QueryResponse.model_validate_json(raw)
         except Exception as e:
             print(f"Failed to parse response: {raw}")
             raise ValueError(f"Failed to parse Gemini response: {e}")
     
-
+    def query(self, user_input: str, use_cache: bool = True) -> QueryResponse:
+        """
+        Generate SQL query and chart metadata from natural language.
+        Queries that don't bind against the database, or that the cost
+        screen would reject, are repaired (sql_validator) before the
+        response is returned and cached.
+        Repeated questions against the same schema and model are answered
+        from the response cache without calling Gemini.
+        """
+        
+        schema, key = self._prepare(user_input)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return QueryResponse.model_validate(cached)
+        
+        prompt = self.build_prompt(user_input, schema)
+        start = time.perf_counter()
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+        )
+        self._record_call(prompt, schema, response, time.perf_counter() - start)
+        
+        result = self._parse_reply(response.text)
+        result.queries = self.validator.validate(result.queries, schema)
+        
+        # Only responses that parsed and validated are cached
+        self.cache.set(key, result.model_dump())
+        return result
+    
+    def query_stream(self, user_input: str, use_cache: bool = True) -> Iterator[Union[Query, QueryResponse]]:
+        """
+        Streaming variant of query(): yields each Query as soon as its object
+        in the reply's "queries" array is complete, then the full validated
+        QueryResponse (whose error is set for out-of-scope requests). Every
+        query of that response is yielded once before it; those the stream
+        missed come just ahead of it.
+        """
+        
+        schema, key = self._prepare(user_input)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                result = QueryResponse.model_validate(cached)
+                yield from result.queries
+                yield result
+                return
+        
+        prompt = self.build_prompt(user_input, schema)
+        start = time.perf_counter()
+        parser = QueryStreamParser()
+        chunk = None
+        streamed = []
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+        ):
+            for obj in parser.feed(chunk.text or ""):
+                try:
+                    q = Query.model_validate(obj)
+                except ValueError:
+                    # Left for the full parse below to report
+                    continue
+                # A query that doesn't bind, or is too expensive, is repaired before it is yielded
+                q = self.validator.validate([q], schema)[0]
+                streamed.append(q)
+                yield q
+        # Usage metadata comes with the last chunk
+        self._record_call(prompt, schema, chunk, time.perf_counter() - start)
+        
+        result = self._parse_reply(parser.buffer)
+        if [q.name for q in streamed] == [q.name for q in result.queries]:
+            result.queries = streamed
+        else:
+            result.queries = self.validator.validate(result.queries, schema)
+            # Queries whose streamed object was skipped haven't been yielded yet
+            yielded = Counter(q.name for q in streamed)
+            for q in result.queries:
+                if yielded[q.name]:
+                    yielded[q.name] -= 1
+                else:
+                    yield q
+        self.cache.set(key, result.model_dump())
+        yield result
+    
+    def _ask_json(self, prompt: str) -> dict:
+        """One non-streaming call whose reply is a JSON object (used for SQL repairs)"""
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+        )
+        return json.loads(clean_json_block(response.text.strip()))
+    
+    def _record_call(self, prompt: str, schema: str, response, latency: float):
+        usage = getattr(response, "usage_metadata", None)
+        # Reported token count if the API returns one, else ~4 characters per token
+        tokens = getattr(usage, "prompt_token_count", None) or len(prompt) // 4
+        with self._stats_lock:
+            self._llm_stats["calls"] += 1
+            self._llm_stats["prompt_tokens"] += tokens
+            self._llm_stats["prompt_tables"] += schema.count("\nTable: ")
+            self._llm_stats["latency"] += latency
+    
     def generate_insights(self, insights_data: dict, sql_query: str = None) -> str:
         """Generate natural language insights from structured insights data"""
         
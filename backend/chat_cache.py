@@ -0,0 +1,111 @@
+"""
+Cache of validated Gemini responses for /api/chat.
+
+Responses are keyed on the normalized question, a hash of the schema prompt
+and the model name, so reloading a changed schema or switching models never
+serves an old answer. Entries live in an in-memory LRU with a TTL and, when
+CHAT_CACHE_PATH is set, in a SQLite table that survives restarts.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from cache import LRUCache
+
+CHAT_CACHE_MAX_BYTES = int(os.getenv("CHAT_CACHE_MAX_BYTES", str(8 * 1024**2)))
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "86400"))
+# SQLite file for the on-disk store; empty keeps the cache in memory only
+CHAT_CACHE_PATH = os.getenv("CHAT_CACHE_PATH", "")
+
+
+def normalize_question(text: str) -> str:
+    """Case, surrounding whitespace/punctuation and repeated spaces don't change the answer"""
+    return re.sub(r"\s+", " ", text.casefold()).strip(" \t\n?.!")
+
+
+def cache_key(user_input: str, schema: str, model: str) -> str:
+    digest = hashlib.sha256()
+    for part in (normalize_question(user_input), schema or "", model):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """In-memory LRU of response dicts, optionally backed by a SQLite table"""
+
+    def __init__(
+        self,
+        max_bytes: int = CHAT_CACHE_MAX_BYTES,
+        ttl: Optional[float] = CHAT_CACHE_TTL,
+        path: str = CHAT_CACHE_PATH,
+    ):
+        self.ttl = ttl
+        self.path = path
+        self._memory = LRUCache(max_bytes, ttl=ttl)
+        self._db = None
+        self._db_lock = threading.Lock()
+        self.disk_hits = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS chat_responses "
+                    "(key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                if ttl is not None:
+                    self._db.execute("DELETE FROM chat_responses WHERE created_at < ?", (time.time() - ttl,))
+
+    def get(self, key: str) -> Optional[dict]:
+        response = self._memory.get(key)
+        if response is not None or self._db is None:
+            return response
+
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT response, created_at FROM chat_responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        age = time.time() - row[1]
+        if self.ttl is not None and age >= self.ttl:
+            return None
+        response = json.loads(row[0])
+        # Promote to memory for the rest of the entry's lifetime
+        self._memory.set(key, response, ttl=self.ttl - age if self.ttl is not None else None)
+        self.disk_hits += 1
+        return response
+
+    def set(self, key: str, response: dict):
+        self._memory.set(key, response)
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO chat_responses VALUES (?, ?, ?)",
+                    (key, json.dumps(response), time.time()),
+                )
+
+    def clear(self):
+        self._memory.clear()
+        if self._db is not None:
+            with self._db_lock, self._db:
+                self._db.execute("DELETE FROM chat_responses")
+
+    def stats(self) -> dict:
+        stats = self._memory.stats()
+        # A disk hit is a memory miss; count it as a hit of the cache as a whole
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["disk_path"] = self.path or None
+        stats["disk_hits"] = self.disk_hits
+        if self._db is not None:
+            with self._db_lock:
+                stats["disk_entries"] = self._db.execute("SELECT count(*) FROM chat_responses").fetchone()[0]
+        return stats
@@ -0,0 +1,272 @@
+"""
+EXPLAIN-based pre-screening of generated chart queries.
+
+The query_guard watchdog stops a runaway query only after it has used its
+time. screen() first reads the estimated plan (EXPLAIN (FORMAT json)). It
+derives two numbers from it:
+
+- the rows the query returns;
+- its work, the sum of the rows every operator produces. A cross product or
+  nested-loop join counts the pairs it compares.
+
+Then it decides how to run the query before any row is read:
+
+- run: within COST_MAX_WORK, as it is.
+- aggregate: the caller's time-bucket rewrite (aggregation_planner) applies.
+- sample: over COST_MAX_WORK, or returning more than COST_MAX_ROWS rows. A
+  row-level query (no aggregates, DISTINCT or window functions, whose values
+  a sample would change) reads a Bernoulli sample of its largest table, at
+  the fraction that brings the estimate under the limits.
+- reject: over COST_MAX_WORK and not sampleable, or it would need less than
+  COST_MIN_SAMPLE of the table. CostRejected says why in terms the model
+  can act on when it rewrites the query. check() gives the same message
+  without raising, so sql_validator sends it to the repair call along
+  with binder errors.
+
+DuckDB's estimates are rough (filters are guessed), so the thresholds are
+set well above what the dashboard's queries need and the watchdog stays in
+place for what slips through. Every decision is logged, counted for
+/metrics and returned with the query's entry so the thresholds can be tuned.
+"""
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import duckdb
+
+from query_guard import QUERY_MAX_ROWS, statement_error
+
+# Estimated operator rows (see work above) a generated query may take; 0 disables screening
+COST_MAX_WORK = float(os.getenv("COST_MAX_WORK", str(5e7)))
+# Estimated result rows above which a row-level query is sampled
+COST_MAX_ROWS = int(os.getenv("COST_MAX_ROWS", str(QUERY_MAX_ROWS)))
+# Smallest sampling fraction worth returning; below it the query is rejected
+COST_MIN_SAMPLE = float(os.getenv("COST_MIN_SAMPLE", "0.01"))
+# Seed of the sample, so a question asked twice draws the same chart
+SAMPLE_SEED = 42
+
+# Operators whose output a sample of their input would change
+_AGGREGATING = {"HASH_GROUP_BY", "PERFECT_HASH_GROUP_BY", "UNGROUPED_AGGREGATE", "SIMPLE_AGGREGATE",
+                "WINDOW", "STREAMING_WINDOW", "DISTINCT"}
+# Operators that compare every pair of their children's rows
+_PAIRWISE = {"CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN"}
+
+_stats_lock = threading.Lock()
+_stats = {"screened": 0, "run": 0, "aggregate": 0, "sample": 0, "reject": 0, "estimate_time": 0.0}
+
+
+class CostRejected(RuntimeError):
+    """A generated query's estimated cost is over the limit and it can't be sampled"""
+
+    def __init__(self, message: str, decision: dict):
+        super().__init__(message)
+        self.decision = decision
+
+
+def _walk(node: dict, estimate: dict) -> int:
+    """Estimated output rows of a plan node; adds its work and tables to the estimate"""
+    children = [_walk(child, estimate) for child in node.get("children", [])]
+    name = node.get("name", "").strip()
+    info = node.get("extra_info") or {}
+    rows = info.get("Estimated Cardinality")
+    if rows is not None and int(rows) == 0 and any(children):
+        # Operators above an ORDER BY report ~0 rows; take their input's instead
+        rows = None
+    work = None
+    if name in _PAIRWISE and children:
+        # Every pair is compared, whatever the join keeps
+        work = math.prod(children)
+        estimate["pairwise"].append(name)
+        rows = int(rows) if rows is not None else work
+    elif rows is not None:
+        rows = int(rows)
+    elif name in ("UNGROUPED_AGGREGATE", "SIMPLE_AGGREGATE"):
+        rows = 1
+    else:
+        rows = max(children, default=0)
+    if name in _AGGREGATING:
+        estimate["aggregated"] = True
+    if name.startswith("SEQ_SCAN") and info.get("Table"):
+        table = info["Table"]
+        estimate["tables"][table] = max(estimate["tables"].get(table, 0), rows)
+    estimate["work"] += max(work or 0, rows)
+    return rows
+
+
+def estimate_cost(sql: str, con: duckdb.DuckDBPyConnection) -> dict:
+    """
+    Estimated result rows and work of a statement, the tables it scans (with
+    their estimated rows), whether it aggregates, and its pairwise operators
+    """
+    plan = con.execute(f"EXPLAIN (FORMAT json) {sql.strip().rstrip(';')}").fetchall()
+    estimate = {"rows": 0, "work": 0, "tables": {}, "aggregated": False, "pairwise": []}
+    for _, text in plan:
+        for root in json.loads(text):
+            estimate["rows"] += _walk(root, estimate)
+    return estimate
+
+
+def sample_table(sql: str, table: str, fraction: float, con: duckdb.DuckDBPyConnection) -> Optional[str]:
+    """
+    The statement reading a repeatable Bernoulli sample of the first
+    unsampled reference to table, or None if it has none
+    """
+    tree = json.loads(con.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+    if tree.get("error"):
+        return None
+
+    def visit(node) -> bool:
+        if isinstance(node, dict):
+            if (node.get("type") == "BASE_TABLE" and node.get("table_name", "").lower() == table.lower()
+                    and node.get("sample") is None):
+                node["sample"] = {
+                    "sample_size": {"type": {"id": "DOUBLE", "type_info": None}, "is_null": False,
+                                    "value": round(fraction * 100, 4)},
+                    "is_percentage": True,
+                    "method": "Bernoulli",
+                    "seed": SAMPLE_SEED,
+                }
+                return True
+            return any(visit(value) for value in node.values())
+        if isinstance(node, list):
+            return any(visit(value) for value in node)
+        return False
+
+    if not visit(tree["statements"]):
+        return None
+    return con.execute("SELECT json_deserialize_sql(?)", [json.dumps(tree)]).fetchone()[0]
+
+
+def _describe(estimate: dict) -> str:
+    reason = f"estimated to process ~{estimate['work']:,.0f} rows (limit {COST_MAX_WORK:,.0f})"
+    if estimate["pairwise"]:
+        tables = " and ".join(sorted(estimate["tables"])) or "its inputs"
+        reason += f"; the plan has a {estimate['pairwise'][0].lower().replace('_', ' ')} over {tables}"
+    return reason
+
+
+def _record(decision: dict):
+    with _stats_lock:
+        _stats["screened"] += 1
+        _stats[decision["decision"]] += 1
+        _stats["estimate_time"] += decision["estimate_ms"] / 1000
+    detail = f" ({decision['reason']})" if decision.get("reason") else ""
+    print(f"  Cost screen: {decision['decision']}, ~{decision['estimated_rows']:,} rows, "
+          f"~{decision['estimated_work']:,} work{detail}")
+
+
+def _unscreened(sql: str, aggregate) -> Tuple[str, None, Optional[dict]]:
+    if aggregate is None:
+        return sql, None, None
+    sql, plan = aggregate(sql, None)
+    return sql, None, plan
+
+
+def _decide(sql: str, estimate: dict, plan: Optional[dict], con: duckdb.DuckDBPyConnection) -> Tuple[str, dict]:
+    """The statement to run and the decision for it, given its estimate and aggregation plan"""
+    decision = {
+        "decision": "aggregate" if plan else "run",
+        "estimated_rows": estimate["rows"],
+        "estimated_work": estimate["work"],
+        "max_work": COST_MAX_WORK,
+        "max_rows": COST_MAX_ROWS,
+    }
+    over_work = estimate["work"] > COST_MAX_WORK
+    if over_work or (plan is None and estimate["rows"] > COST_MAX_ROWS):
+        fraction = min(COST_MAX_WORK / max(estimate["work"], 1), COST_MAX_ROWS / max(estimate["rows"], 1))
+        table = max(estimate["tables"], key=estimate["tables"].get, default=None)
+        sampled = None
+        if not estimate["aggregated"] and table and fraction >= COST_MIN_SAMPLE:
+            try:
+                sampled = sample_table(sql, table, fraction, con)
+            except duckdb.InterruptException:
+                raise
+            except duckdb.Error as e:
+                print(f"Sampling skipped: {e}")
+        if sampled:
+            sql = sampled
+            decision.update(decision="sample", sample={"table": table, "fraction": round(fraction, 6)})
+        elif over_work:
+            advice = ("Join the tables on their matching key columns instead of a cross join"
+                      if estimate["pairwise"] else "Filter the rows, or aggregate them further, in SQL")
+            decision.update(decision="reject", reason=_describe(estimate), advice=advice)
+        # Too many rows but not sampleable: it runs, and the row cap cuts it
+    return sql, decision
+
+
+def _rejection(decision: dict) -> str:
+    return f"Query rejected before running: {decision['reason']}. {decision['advice']}."
+
+
+def screen(
+    sql: str,
+    con: duckdb.DuckDBPyConnection,
+    aggregate: Callable[[str, Optional[int]], Tuple[str, Optional[dict]]] = None,
+) -> Tuple[str, Optional[dict], Optional[dict]]:
+    """
+    Decide how to run a generated statement from its estimated plan.
+    Returns (sql to run, decision, aggregation plan). aggregate is the
+    caller's rewrite ((sql, estimated rows) -> (sql, plan)), tried unless
+    the query is over the work limit. The decision (None when screening is
+    off or the statement can't be explained) holds the estimate, the
+    thresholds and the time the estimate took. Raises CostRejected.
+    """
+    if COST_MAX_WORK <= 0:
+        return _unscreened(sql, aggregate)
+    start = time.perf_counter()
+    try:
+        estimate = estimate_cost(sql, con)
+    except duckdb.InterruptException:
+        raise
+    except duckdb.Error as e:
+        # Not explainable (e.g. not a query); the watchdog still applies
+        print(f"Cost screening skipped: {e}")
+        return _unscreened(sql, aggregate)
+    estimate_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    plan = None
+    if estimate["work"] <= COST_MAX_WORK and aggregate:
+        sql, plan = aggregate(sql, estimate["rows"])
+    sql, decision = _decide(sql, estimate, plan, con)
+    decision["estimate_ms"] = estimate_ms
+    _record(decision)
+    if decision["decision"] == "reject":
+        raise CostRejected(_rejection(decision), decision)
+    return sql, decision, plan
+
+
+def check(sql: str, con: duckdb.DuckDBPyConnection) -> Optional[str]:
+    """
+    Why screen() would reject a statement, or None if it would run (sampled
+    or not); not counted in stats(). Raises duckdb.Error if the statement
+    doesn't bind, so it doubles as the validator's binding check. Anything
+    but a single SELECT is rejected (query_guard.statement_error).
+    """
+    error = statement_error(sql, con)
+    if error:
+        return error
+    if COST_MAX_WORK <= 0:
+        con.execute(f"EXPLAIN {sql.strip().rstrip(';')}")
+        return None
+    _, decision = _decide(sql, estimate_cost(sql, con), None, con)
+    return _rejection(decision) if decision["decision"] == "reject" else None
+
+
+def stats() -> Dict[str, object]:
+    """Queries screened, by decision, and the average time spent estimating"""
+    with _stats_lock:
+        stats = dict(_stats)
+    screened = stats.pop("screened")
+    estimate_time = stats.pop("estimate_time")
+    return {
+        "enabled": COST_MAX_WORK > 0,
+        "max_work": COST_MAX_WORK,
+        "max_rows": COST_MAX_ROWS,
+        "min_sample": COST_MIN_SAMPLE,
+        "screened": screened,
+        "decisions": stats,
+        "avg_estimate_ms": estimate_time / screened * 1000 if screened else None,
+    }
@@ -1,39 +1,83 @@
-import duckdb
-import os
+import re
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import db_pool
 
 DB_PATH = "codejam_15.db"
 
+# Tables targeted by a write statement, used to invalidate cached results
+_WRITE_TARGET_RE = re.compile(
+    r"\b(?:INSERT\s+(?:OR\s+\w+\s+)?INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|"
+    r"(?:CREATE|DROP|ALTER)\s+(?:OR\s+REPLACE\s+)?(?:TEMP(?:ORARY)?\s+)?TABLE"
+    r"(?:\s+IF\s+(?:NOT\s+)?EXISTS)?|COPY)\s+\"?([A-Za-z_][\w.]*)",
+    re.IGNORECASE,
+)
+
 def get_db_connection():
-    """Get DuckDB connection"""
-    if not os.path.exists(DB_PATH):
-        raise FileNotFoundError(f"Database not found at {DB_PATH}")
-    return duckdb.connect(DB_PATH, read_only=False)
+    """Get a DuckDB cursor on the shared database handle (caller closes it)"""
+    return db_pool.get_manager(DB_PATH).connect()
 
 def execute_query(query, params=None):
     """Execute a query and return results as a list of dicts"""
-    con = get_db_connection()
-    try:
+    # Arrow builds the row dicts in C++ instead of zipping tuples in Python
+    return execute_query_arrow(query, params).to_pylist()
+
+def execute_query_arrow(query, params=None):
+    """Execute a query and return the result as a pyarrow Table"""
+    with db_pool.cursor(DB_PATH) as con:
+        if params:
+            return con.execute(query, params).fetch_arrow_table()
+        return con.execute(query).fetch_arrow_table()
+
+def column_to_list(column):
+    """
+    Convert an Arrow column to a JSON-ready list without going through pandas.
+
+    Dates become 'YYYY-MM-DD' strings; timestamps become 'YYYY-MM-DD HH:MM:SS',
+    or just the date when every value falls on midnight. Decimals (including
+    DuckDB HUGEINT sums) become floats. NULLs become None.
+    """
+    col_type = column.type
+    if pa.types.is_timestamp(col_type):
+        midnight = pc.equal(pc.floor_temporal(column, unit="day"), column)
+        if pc.all(midnight).as_py() is not False:
+            column = pc.cast(column, pa.date32())
+        else:
+            column = pc.cast(column, pa.timestamp("s", tz=col_type.tz), safe=False)
+        return pc.cast(column, pa.string()).to_pylist()
+    if pa.types.is_date(col_type) or pa.types.is_time(col_type):
+        return pc.cast(column, pa.string()).to_pylist()
+    if pa.types.is_decimal(col_type):
+        column = pc.cast(column, pa.float64())
+        col_type = column.type
+    if (pa.types.is_integer(col_type) or pa.types.is_floating(col_type)) and column.null_count == 0:
+        # Faster than to_pylist for plain numeric data
+        return column.to_numpy().tolist()
+    return column.to_pylist()
+
+def execute_write(query, params=None):
+    """
+    Execute a statement that modifies data and invalidate cached results
+    for the tables it touches.
+    """
+    with db_pool.cursor(DB_PATH) as con:
         if params:
-            result = con.execute(query, params).fetchall()
+            con.execute(query, params)
         else:
-            result = con.execute(query).fetchall()
-        
-        # Get column names
-        columns = [desc[0] for desc in con.description]
-        
-        # Convert to list of dicts
-        return [dict(zip(columns, row)) for row in result]
-    finally:
-        con.close()
+            con.execute(query)
+    tables = {name.split(".")[-1] for name in _WRITE_TARGET_RE.findall(query)}
+    db_pool.get_manager(DB_PATH).mark_written(tables or None)
 
 def execute_query_df(query, params=None):
-    """Execute a query and return as pandas DataFrame"""
-    con = get_db_connection()
-    try:
+    """
+    Execute a query and return as pandas DataFrame.
+    Kept for callers that need pandas; chart queries use execute_query_arrow.
+    """
+    with db_pool.cursor(DB_PATH) as con:
         if params:
             result = con.execute(query, params).df()
         else:
             result = con.execute(query).df()
         return result
-    finally:
-        con.close()
\ No newline at end of file
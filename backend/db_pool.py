@@ -0,0 +1,256 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import duckdb
+
+DEFAULT_DB_PATH = "codejam_15.db"
+
+# Upper bound on cursors handed out at once per database file
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# Seconds a request waits for a free cursor before giving up
+CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no cursor becomes available within the checkout timeout"""
+
+
+class ConnectionManager:
+    """
+    Owns one long-lived DuckDB handle for a database file.
+
+    Request threads borrow cursors (``con.cursor()``) from a bounded pool, so the
+    file is opened and the catalog loaded once per process instead of per query.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DEFAULT_DB_PATH,
+        max_cursors: int = POOL_SIZE,
+        timeout: float = CHECKOUT_TIMEOUT,
+        read_only: bool = False,
+    ):
+        self.db_path = db_path
+        self.max_cursors = max_cursors
+        self.timeout = timeout
+        self.read_only = read_only
+
+        self._con: Optional[duckdb.DuckDBPyConnection] = None
+        self._lock = threading.Lock()
+        self._idle: "queue.LifoQueue[duckdb.DuckDBPyConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_cursors)
+        self._in_use = 0
+        self._created = 0
+        self._discarded = 0
+        self._closed = False
+
+        # Data-version tracking: writes made through this process bump
+        # per-table counters, changes to the file from anywhere else bump
+        # the external counter.
+        self._file_token = self._stat_file()
+        self._external_version = 0
+        self._write_version = 0
+        self._table_versions: Dict[str, int] = {}
+        self._write_listeners: List[Callable[[Optional[Tuple[str, ...]]], None]] = []
+
+    def _database(self) -> duckdb.DuckDBPyConnection:
+        """Open the database handle on first use"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Connection manager for {self.db_path} is closed")
+            if self._con is None:
+                if self.db_path != ":memory:" and not os.path.exists(self.db_path):
+                    raise FileNotFoundError(f"Database not found at {self.db_path}")
+                self._con = duckdb.connect(self.db_path, read_only=self.read_only)
+            return self._con
+
+    def _new_cursor(self) -> duckdb.DuckDBPyConnection:
+        cur = self._database().cursor()
+        with self._lock:
+            self._created += 1
+        return cur
+
+    def _discard(self, cur: duckdb.DuckDBPyConnection):
+        with self._lock:
+            self._discarded += 1
+        try:
+            cur.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def cursor(self):
+        """
+        Borrow a cursor for the duration of a ``with`` block.
+
+        Cursors that hit a connection-level error are discarded instead of being
+        returned to the pool.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(
+                f"No DuckDB cursor available for {self.db_path} after {self.timeout}s"
+            )
+        cur = None
+        healthy = True
+        try:
+            try:
+                cur = self._idle.get_nowait()
+            except queue.Empty:
+                cur = self._new_cursor()
+            with self._lock:
+                self._in_use += 1
+            try:
+                yield cur
+            except (duckdb.ConnectionException, duckdb.FatalException):
+                healthy = False
+                raise
+        finally:
+            if cur is not None:
+                with self._lock:
+                    self._in_use -= 1
+                    closed = self._closed
+                if healthy and not closed:
+                    self._idle.put(cur)
+                else:
+                    self._discard(cur)
+            self._slots.release()
+
+    def connect(self) -> duckdb.DuckDBPyConnection:
+        """Return an unpooled cursor on the shared handle; the caller closes it"""
+        return self._new_cursor()
+
+    def health_check(self) -> dict:
+        """Run a trivial query on a pooled cursor and report pool state"""
+        start = time.perf_counter()
+        try:
+            with self.cursor() as cur:
+                cur.execute("SELECT 1").fetchone()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+        stats = self.stats()
+        stats.update({
+            "ok": ok,
+            "error": error,
+            "latency_ms": (time.perf_counter() - start) * 1000,
+        })
+        return stats
+
+    def _stat_file(self) -> tuple:
+        token = []
+        for path in (self.db_path, self.db_path + ".wal"):
+            try:
+                st = os.stat(path)
+                token.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                token.append(None)
+        return tuple(token)
+
+    def data_version(self, tables: Optional[Iterable[str]] = None) -> tuple:
+        """
+        Version token for the data behind a result.
+
+        Pass the tables a query reads to get a token that only changes when
+        one of them is written; without tables any write changes it.
+        """
+        token = self._stat_file()
+        with self._lock:
+            if token != self._file_token:
+                self._file_token = token
+                self._external_version += 1
+            if tables is None:
+                return (self._external_version, self._write_version)
+            return (self._external_version,) + tuple(
+                self._table_versions.get(t.lower(), 0) for t in sorted(tables)
+            )
+
+    def mark_written(self, tables: Optional[Iterable[str]] = None):
+        """
+        Record a write made through this process and notify listeners.
+        tables=None means the written tables are unknown (invalidate all).
+        """
+        with self._lock:
+            self._write_version += 1
+            if tables is None:
+                self._external_version += 1
+            else:
+                tables = tuple(sorted({t.lower() for t in tables}))
+                for t in tables:
+                    self._table_versions[t] = self._table_versions.get(t, 0) + 1
+            # Our own write changed the file; don't count it as external too
+            self._file_token = self._stat_file()
+            listeners = list(self._write_listeners)
+        for listener in listeners:
+            listener(tables)
+
+    def add_write_listener(self, listener: Callable[[Optional[Tuple[str, ...]]], None]):
+        """Register listener(tables) to run after each mark_written()"""
+        with self._lock:
+            self._write_listeners.append(listener)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "open": self._con is not None,
+                "max_cursors": self.max_cursors,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+    def close(self):
+        """Close idle cursors and the database handle"""
+        with self._lock:
+            self._closed = True
+            con, self._con = self._con, None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            except Exception:
+                pass
+        if con is not None:
+            con.close()
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_path: str = DEFAULT_DB_PATH) -> ConnectionManager:
+    """Get the process-wide connection manager for a database file"""
+    key = db_path if db_path == ":memory:" else os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_path)
+            _managers[key] = manager
+        return manager
+
+
+def cursor(db_path: str = DEFAULT_DB_PATH):
+    """Shortcut for ``get_manager(db_path).cursor()``"""
+    return get_manager(db_path).cursor()
+
+
+def close_all():
+    """Close every open database handle (registered with atexit)"""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        try:
+            manager.close()
+        except Exception as e:
+            print(f"Error closing DuckDB handle for {manager.db_path}: {e}")
+
+
+atexit.register(close_all)
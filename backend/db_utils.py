@@ -1,9 +1,11 @@
 import duckdb
 from typing import List, Dict, Optional
 
+import db_pool
+
 def get_connection(db_path: str = "codejam_15.db"):
-    """Get a DuckDB connection"""
-    return duckdb.connect(db_path)
+    """Get a DuckDB cursor on the shared database handle (caller closes it)"""
+    return db_pool.get_manager(db_path).connect()
 
 def get_table_columns(con: duckdb.DuckDBPyConnection, table_name: str) -> List[Dict[str, str]]:
     """
@@ -50,15 +52,15 @@ def get_database_schema(
             ...
         ]
     """
-    con = get_connection(db_path)
-    
-    # Get all tables
-    tables = [t[0] for t in con.execute("SHOW TABLES").fetchall()]
+    with db_pool.cursor(db_path) as con:
+        # Get all tables
+        tables = [t[0] for t in con.execute("SHOW TABLES").fetchall()]
+        columns_by_table = {t: get_table_columns(con, t) for t in tables}
     
     schema = []
     for table_name in tables:
         # Get columns for this table
-        columns_info = get_table_columns(con, table_name)
+        columns_info = columns_by_table[table_name]
         
         # Format columns with descriptions
         formatted_columns = []
@@ -88,7 +90,6 @@ def get_database_schema(
         
         schema.append(table_entry)
     
-    con.close()
     return schema
 
 def get_default_table_descriptions() -> Dict[str, str]:
@@ -201,12 +202,11 @@ def get_database_schema_with_descriptions(db_path: str = "codejam_15.db") -> Lis
 
 def get_all_tables_info(db_path: str = "codejam_15.db"):
     """Legacy function - prints table information (kept for backward compatibility)"""
-    con = get_connection(db_path)
-    tables = [t[0] for t in con.execute("SHOW TABLES").fetchall()]
-    for table in tables:
-        cols = [c[1] for c in con.execute(f"PRAGMA table_info('{table}')").fetchall()]
-        print(f"Table {table}: columns = {cols}")
-    con.close()
+    with db_pool.cursor(db_path) as con:
+        tables = [t[0] for t in con.execute("SHOW TABLES").fetchall()]
+        for table in tables:
+            cols = [c[1] for c in con.execute(f"PRAGMA table_info('{table}')").fetchall()]
+            print(f"Table {table}: columns = {cols}")
 
 if __name__ == "__main__":
     # Example usage - get schema with descriptions
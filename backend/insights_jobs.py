@@ -0,0 +1,265 @@
+"""
+Background key-insights jobs.
+
+POST /api/key-insights/jobs submits a job and returns its id straight away;
+GET /api/key-insights/jobs/<id> polls its status, current stage and result.
+GET /api/key-insights runs the same job and waits for it (run_job).
+
+The web process only exports the query result to a temporary Parquet file
+(DuckDB does this in C++, without Python objects). Profiling then runs in a
+separate worker process on its own in-memory DuckDB, under an address-space
+limit and a wall-clock timeout, so a heavy profile can neither block a
+request thread nor take the web process's memory with it. The database file
+itself can't be opened from a second process while this one holds it.
+"""
+import multiprocessing as mp
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+import db_pool
+from key_insights import get_key_insights
+from scheduler import WORKLOAD_CLASSES, Overloaded, apply_settings, scheduler
+from sql_profiler import strip_query
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; memory caps are skipped
+    resource = None
+
+# Worker processes running at once; further jobs wait in "queued"
+JOB_WORKERS = int(os.getenv("INSIGHTS_JOB_WORKERS", "2"))
+# Seconds a worker may run before it is killed
+JOB_TIMEOUT = float(os.getenv("INSIGHTS_JOB_TIMEOUT", "300"))
+# Address-space limit per worker process, in MB (DuckDB gets half of it)
+JOB_MEMORY_MB = int(os.getenv("INSIGHTS_JOB_MEMORY_MB", "4096"))
+# Seconds finished jobs (and their results) are kept for polling
+JOB_RETENTION = float(os.getenv("INSIGHTS_JOB_RETENTION", "900"))
+# Seconds to wait for the last messages of a worker that has exited
+EXIT_DRAIN_TIMEOUT = 1.0
+
+# Forked from a clean server process that has already imported the
+# profilers, so workers start fast without inheriting the web process's
+# DuckDB threads. __main__ is not preloaded: workers import it as
+# __mp_main__, so it (and every module it imports) must not touch the
+# database file at import time, which the web process holds locked.
+if "forkserver" in mp.get_all_start_methods():
+    _context = mp.get_context("forkserver")
+    _context.set_forkserver_preload(["key_insights"])
+else:
+    _context = mp.get_context("spawn")
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class Job:
+    """State of one insights job, as reported to pollers"""
+
+    def __init__(self, sql: str, mode: str, approximate: Optional[bool], key: tuple):
+        self.id = uuid.uuid4().hex
+        self.sql = sql
+        self.mode = mode
+        self.approximate = approximate
+        self.key = key
+        self.status = "queued"
+        self.stage = "queued"
+        self.stages = [{"stage": "queued", "at": time.time()}]
+        self.rows = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+        self.stages.append({"stage": stage, "at": time.time()})
+
+    def finish(self, status: str, result: dict = None, error: str = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self.set_stage(status)
+        self.finished.set()
+
+    def to_dict(self, include_result: bool = True) -> dict:
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": list(self.stages),
+            "mode": self.mode,
+            "rows": self.rows,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "elapsed": (self.finished_at or time.time()) - self.created_at,
+        }
+        if self.error:
+            data["error"] = self.error
+        if include_result and self.status == "done":
+            data["result"] = self.result
+        return data
+
+
+_jobs: Dict[str, Job] = {}
+_jobs_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(JOB_WORKERS)
+
+
+def _prune():
+    """Forget finished jobs older than JOB_RETENTION (call with _jobs_lock held)"""
+    cutoff = time.time() - JOB_RETENTION
+    for job_id in [j.id for j in _jobs.values() if j.finished_at and j.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def submit_job(query: str, mode: str = "auto", approximate: bool = None):
+    """
+    Start profiling a query in the background. Returns (job, deduplicated):
+    a job for the same SQL, options and data version that is still queued,
+    running or finished successfully is reused instead of starting another.
+    """
+    sql = strip_query(query)
+    key = (" ".join(sql.split()), mode, approximate, db_pool.get_manager().data_version())
+    with _jobs_lock:
+        _prune()
+        for job in _jobs.values():
+            if job.key == key and job.status in ACTIVE_STATUSES + ("done",):
+                return job, True
+        # Shed new work once the insights queue is full
+        queued = sum(1 for job in _jobs.values() if job.status == "queued")
+        max_queue = WORKLOAD_CLASSES["insights"]["max_queue"]
+        if queued >= max_queue:
+            raise Overloaded("insights", f"{queued} jobs queued", retry_after=JOB_TIMEOUT / 10)
+        job = Job(sql, mode, approximate, key)
+        _jobs[job.id] = job
+    threading.Thread(target=_run, args=(job,), name=f"insights-job-{job.id[:8]}", daemon=True).start()
+    return job, False
+
+
+def run_job(query: str, mode: str = "auto", approximate: bool = None) -> Job:
+    """Submit a job (or join the same one) and wait until it has finished"""
+    job, _ = submit_job(query, mode=mode, approximate=approximate)
+    # The export may wait up to JOB_TIMEOUT for a slot, then the worker gets JOB_TIMEOUT
+    if not job.finished.wait(2 * JOB_TIMEOUT + 10):
+        raise TimeoutError(f"Insights job {job.id} did not finish")
+    return job
+
+
+def get_job(job_id: str) -> Optional[Job]:
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def jobs_stats() -> dict:
+    with _jobs_lock:
+        statuses = [job.status for job in _jobs.values()]
+    return {
+        "workers": JOB_WORKERS,
+        "timeout": JOB_TIMEOUT,
+        "memory_mb": JOB_MEMORY_MB,
+        "jobs": {status: statuses.count(status) for status in sorted(set(statuses))},
+    }
+
+
+def _run(job: Job):
+    """Job thread: wait for a worker slot, export, then supervise the worker"""
+    path = os.path.join(tempfile.gettempdir(), f"insights_{job.id}.parquet")
+    with _slots:
+        job.status = "running"
+        try:
+            job.set_stage("exporting")
+            target = path.replace("'", "''")
+            # The export runs on the web process's DuckDB, so it yields to interactive work
+            with scheduler.slot("insights", shed=False, max_wait=JOB_TIMEOUT), db_pool.cursor() as con:
+                job.rows = con.execute(f"COPY ({job.sql}) TO '{target}' (FORMAT PARQUET)").fetchone()[0]
+            _supervise(job, path)
+        except Exception as e:
+            job.finish("failed", error=str(e))
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    print(f"Insights job {job.id} {job.status} in {job.finished_at - job.created_at:.2f}s")
+
+
+def _supervise(job: Job, path: str):
+    """Start the worker process and relay its progress until it ends or times out"""
+    messages = _context.Queue()
+    worker = _context.Process(
+        target=_work,
+        args=(path, job.mode, job.approximate, JOB_MEMORY_MB, messages),
+        name=f"insights-worker-{job.id[:8]}",
+        daemon=True,
+    )
+    job.set_stage("starting")
+    worker.start()
+    deadline = time.monotonic() + JOB_TIMEOUT
+    exited = False
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                job.finish("timed_out", error=f"Profiling took longer than {JOB_TIMEOUT:g}s")
+                return
+            try:
+                # Once the worker has exited, read what it sent before it did
+                kind, payload = messages.get(timeout=EXIT_DRAIN_TIMEOUT if exited else min(remaining, 1.0))
+            except queue.Empty:
+                if exited:
+                    job.finish("failed", error=_exit_reason(worker.exitcode))
+                    return
+                exited = not worker.is_alive()
+                continue
+            if kind == "stage":
+                job.set_stage(payload)
+            elif kind == "done":
+                job.finish("done", result=payload)
+                return
+            else:
+                job.finish("failed", error=payload)
+                return
+    finally:
+        if worker.is_alive():
+            worker.terminate()
+        worker.join(timeout=5)
+        messages.close()
+
+
+def _exit_reason(exitcode: int) -> str:
+    if exitcode is not None and exitcode < 0:
+        # Allocations past RLIMIT_AS often end in a signal rather than MemoryError
+        return (f"Worker was killed by signal {-exitcode}; it may have exceeded "
+                f"the {JOB_MEMORY_MB}MB memory limit")
+    return f"Worker exited with code {exitcode}"
+
+
+def _work(path: str, mode: str, approximate: Optional[bool], memory_mb: int, messages):
+    """Worker process entry point: profile the exported Parquet file"""
+    try:
+        if resource is not None and memory_mb:
+            limit = memory_mb * 1024**2
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        with db_pool.cursor(":memory:") as con:
+            con.execute(f"SET memory_limit = '{memory_mb // 2}MB'")
+            # The worker's own instance takes the insights class's threads/memory_limit
+            apply_settings(con, "insights")
+        source = "'" + path.replace("'", "''") + "'"
+        result = get_key_insights(
+            f"SELECT * FROM read_parquet({source})",
+            mode=mode,
+            approximate=approximate,
+            db_path=":memory:",
+            progress=lambda stage: messages.put(("stage", stage)),
+        )
+        messages.put(("done", result))
+    except MemoryError:
+        messages.put(("error", f"Profiling exceeded the {memory_mb}MB memory limit"))
+    except Exception as e:
+        messages.put(("error", str(e)))
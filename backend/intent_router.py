@@ -0,0 +1,227 @@
+"""
+Offline intent routing for /api/chat.
+
+Many chat questions ("daily revenue", "top 5 products", "expenses over time")
+are exactly one of the canned QUERY_FUNCTIONS. IntentRouter matches a
+question against a keyword pattern per query type, pulls the date range and
+top_n slots out of the text, and scores how much of the question the match
+explains. Questions it explains well enough are answered from run_query in
+milliseconds; anything else (unknown words, filters the canned query can't
+apply, ties between intents) falls through to GeminiSQLWrapper. No model or
+network calls are made.
+"""
+import calendar
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from schema_retriever import tokenize
+
+# Share of a question's words the matched intent must account for
+ROUTER_MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.75"))
+# 0 sends every question to Gemini
+INTENT_ROUTING = os.getenv("INTENT_ROUTING", "1") != "0"
+
+# Words that ask for a chart without saying which one
+_FILLER = {
+    "display", "see", "view", "get", "can", "you", "please", "want", "like", "would", "list",
+    "bar", "line", "visualize", "visualise", "breakdown", "all", "data", "our", "we", "do",
+    "did", "have", "has", "been", "be", "about", "trend", "figure", "number", "this", "that",
+}
+
+# Per query type: token groups that must all appear (one token of each), the
+# other words it explains, the slots it accepts and how its chart is drawn
+INTENTS = {
+    "revenue_vs_expenses": {
+        "required": [{"revenue"}, {"expense"}],
+        "vocabulary": {"compare", "comparison", "against", "time", "month", "monthly"},
+        "slots": set(),
+        "chart": "line",
+    },
+    "daily_revenue": {
+        "required": [{"revenue"}, {"daily", "day", "time", "timeline", "history", "trend"}],
+        "vocabulary": {"trend"},
+        "slots": {"start_date", "end_date"},
+        "chart": "line",
+    },
+    "expenses_over_time": {
+        "required": [{"expense"}, {"time", "month", "monthly", "timeline", "history", "trend"}],
+        "vocabulary": {"trend"},
+        "slots": set(),
+        "chart": "line",
+    },
+    "top_products": {
+        "required": [{"product"}, {"top", "best", "popular", "selling", "seller", "sold", "quantity"}],
+        "vocabulary": {"unit", "most", "quantity", "sold", "selling", "seller"},
+        "slots": {"top_n"},
+        "chart": "bar",
+    },
+    "revenue_by_product": {
+        "required": [{"product"}, {"revenue"}],
+        "vocabulary": {"each", "every"},
+        "slots": set(),
+        "chart": "bar",
+    },
+    "revenue_by_customer": {
+        "required": [{"customer"}, {"revenue", "top", "best", "biggest", "largest"}],
+        "vocabulary": {"top", "best", "biggest", "largest", "most", "revenue"},
+        "slots": {"top_n"},
+        "chart": "bar",
+    },
+    "payroll_by_department": {
+        "required": [{"payroll", "salary"}, {"department"}],
+        "vocabulary": {"payroll", "salary", "employee", "each", "every"},
+        "slots": set(),
+        "chart": "bar",
+    },
+}
+
+# Words that negate or reverse what a canned query answers (its largest first);
+# a question with one goes to Gemini. "t" is what tokenize leaves of "n't".
+_NEGATIONS = {
+    "no", "not", "never", "without", "none", "except", "excluding", "t", "dont", "doesnt", "didnt",
+    "least", "lowest", "bottom", "worst", "fewest", "smallest",
+}
+
+_NUMBER_WORDS = {
+    "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+    "fifteen": 15, "twenty": 20, "fifty": 50,
+}
+_MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+
+_DATE = r"(\d{4}-\d{2}-\d{2})"
+_TOP_N = re.compile(r"\b(?:top|best|biggest|largest)\s+(\d{1,3}|" + "|".join(_NUMBER_WORDS) + r")\b")
+_BETWEEN = re.compile(rf"\b(?:between|from)\s+{_DATE}\s+(?:and|to|until)\s+{_DATE}")
+_SINCE = re.compile(rf"\b(?:since|after|from|starting)\s+{_DATE}")
+_UNTIL = re.compile(rf"\b(?:before|until|through|to|up to|ending)\s+{_DATE}")
+_MONTH_YEAR = re.compile(r"\b(?:in\s+|for\s+|during\s+)?(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\.?\s+(\d{4})\b")
+_YEAR = re.compile(r"\b(?:in\s+|for\s+|during\s+)?((?:19|20)\d{2})\b")
+
+
+def extract_slots(text: str) -> Tuple[Dict[str, object], str]:
+    """
+    Date range and top_n filters stated in a question, and the question with
+    the words that stated them removed (except "top", "best", ...)
+    """
+    text = text.lower()
+    slots = {}
+
+    def take(pattern, handle, span=0):
+        # Drops the matched words (or only the given group) from the text
+        nonlocal text
+        match = pattern.search(text)
+        if match:
+            handle(*match.groups())
+            text = text[:match.start(span)] + " " + text[match.end(span):]
+
+    def top_n(value):
+        slots["top_n"] = int(value) if value.isdigit() else _NUMBER_WORDS[value]
+
+    def between(start, end):
+        slots["start_date"], slots["end_date"] = start, end
+
+    def month_year(month, year):
+        month, year = _MONTHS[month], int(year)
+        slots["start_date"] = f"{year:04d}-{month:02d}-01"
+        slots["end_date"] = f"{year:04d}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}"
+
+    def year(value):
+        slots.setdefault("start_date", f"{value}-01-01")
+        slots.setdefault("end_date", f"{value}-12-31")
+
+    take(_TOP_N, top_n, span=1)  # "top" still counts as a word of the question
+    take(_BETWEEN, between)
+    if "start_date" not in slots:
+        take(_SINCE, lambda value: slots.__setitem__("start_date", value))
+        take(_UNTIL, lambda value: slots.__setitem__("end_date", value))
+        if not slots.keys() & {"start_date", "end_date"}:
+            take(_MONTH_YEAR, month_year)
+            take(_YEAR, year)
+    return slots, text
+
+
+def _score(intent: dict, tokens: List[str], slots: Dict[str, object]) -> float:
+    """Share of the question (words and stated filters) the intent explains; 0 if it doesn't apply"""
+    present = set(tokens)
+    # A negated question, or "top 0", is not what any canned query answers
+    if present & _NEGATIONS or slots.get("top_n", 1) < 1:
+        return 0.0
+    if not all(group & present for group in intent["required"]):
+        return 0.0
+    known = set().union(*intent["required"]) | intent["vocabulary"] | _FILLER
+    explained = sum(1 for token in tokens if token in known)
+    # A filter the canned query can't apply leaves part of the question unanswered
+    explained += sum(1 for slot in slots if slot in intent["slots"])
+    total = len(tokens) + len(slots)
+    return explained / total if total else 0.0
+
+
+class IntentRouter:
+    """Keyword router from chat questions to QUERY_FUNCTIONS entries"""
+
+    def __init__(self, intents: dict = INTENTS, min_confidence: float = ROUTER_MIN_CONFIDENCE):
+        self.intents = intents
+        self.min_confidence = min_confidence
+        self._lock = threading.Lock()
+        self._stats = {"questions": 0, "routed": 0, "failed": 0, "match_time": 0.0, "answer_time": 0.0}
+
+    def route(self, question: str) -> Optional[dict]:
+        """
+        {'query_type', 'filters', 'confidence'} for a question one canned
+        query answers, else None. A tie between two intents is not a match.
+        """
+        start = time.perf_counter()
+        slots, rest = extract_slots(question or "")
+        tokens = tokenize(rest)
+        scored = sorted(
+            ((_score(intent, tokens, slots), name) for name, intent in self.intents.items()),
+            reverse=True,
+        )
+        (best, query_type), runner_up = scored[0], scored[1][0] if len(scored) > 1 else 0.0
+        match = None
+        if INTENT_ROUTING and best >= self.min_confidence and best > runner_up:
+            accepted = self.intents[query_type]["slots"]
+            match = {
+                "query_type": query_type,
+                "filters": {k: v for k, v in slots.items() if k in accepted},
+                "confidence": round(best, 3),
+            }
+        with self._lock:
+            self._stats["questions"] += 1
+            self._stats["match_time"] += time.perf_counter() - start
+        return match
+
+    def record(self, elapsed: float, ok: bool = True):
+        """Count a routed question as answered (with its total latency) or as failed"""
+        with self._lock:
+            if ok:
+                self._stats["routed"] += 1
+                self._stats["answer_time"] += elapsed
+            else:
+                self._stats["failed"] += 1
+
+    def stats(self, llm_latency: Optional[float] = None) -> dict:
+        """
+        Hit rate and latency of routed questions; given the average Gemini
+        latency, also the time routing saved
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        questions, routed = stats["questions"], stats["routed"]
+        avg_routed = stats["answer_time"] / routed if routed else None
+        result = {
+            "enabled": INTENT_ROUTING,
+            "min_confidence": self.min_confidence,
+            "questions": questions,
+            "routed": routed,
+            "failed": stats["failed"],
+            "hit_rate": routed / questions if questions else 0.0,
+            "avg_match_latency": stats["match_time"] / questions if questions else None,
+            "avg_routed_latency": avg_routed,
+        }
+        if llm_latency and avg_routed is not None:
+            result["latency_saved"] = routed * max(llm_latency - avg_routed, 0.0)
+        return result
@@ -1,6 +1,7 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from routes import api 
+from queries import registry
 
 app = Flask(__name__)
 
@@ -21,4 +22,8 @@ def index():
     return {'message': 'API is running'}
 
 if __name__ == '__main__':
+    # Canned queries that no longer match the schema stop the server here.
+    # Not at import: the reloader, WSGI servers and insights workers import
+    # this module, and the check must not hold the database file open.
+    registry.validate()
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
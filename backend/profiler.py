@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+
+# Number of sample values reported at each end of a column
+SAMPLE_SIZE = 5
+# Bins in the per-column histograms sent to the frontend
+HISTOGRAM_BINS = 20
+# Most frequent values reported for categorical columns
+TOP_VALUES = 10
+# Rows sampled for each interaction scatter plot
+INTERACTION_SAMPLE = 500
+# Most column pairs listed under "correlations"; k numeric columns have
+# k * (k - 1) / 2 pairs, so wide tables keep only the strongest ones
+MAX_CORRELATION_PAIRS = 100
+# Strongest pairs that get an interaction scatter plot
+TOP_INTERACTIONS = 3
+
+
+def to_python_type(obj):
+    """Convert numpy types to native Python types for JSON serialization"""
+    if isinstance(obj, (np.integer, np.int64, np.int32)):
+        return int(obj)
+    if isinstance(obj, (np.floating, np.float64, np.float32)):
+        return float(obj)
+    if isinstance(obj, dict):
+        return {k: to_python_type(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_python_type(v) for v in obj]
+    return obj
+
+
+def mark_approximate(insights: dict) -> dict:
+    """
+    Set the top-level "approximate" flag. Profilers that estimate a figure
+    list it, with its error bound, under "approximate" in the overview or in
+    that column.
+    """
+    insights["approximate"] = bool(
+        insights["overview"].get("approximate")
+        or any(col.get("approximate") for col in insights["columns"])
+    )
+    return insights
+
+
+def correlation_pairs(columns, matrix, limit: int = MAX_CORRELATION_PAIRS) -> list:
+    """
+    The column pairs above the diagonal of a correlation matrix, strongest
+    first (NaN last), capped at `limit`. col1 is the alphabetically smaller
+    name of each pair.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    i, j = np.triu_indices(len(columns), k=1)
+    values = matrix[i, j]
+    strength = np.nan_to_num(np.abs(values), nan=-1.0)
+    if len(values) > limit:
+        keep = np.argpartition(-strength, limit - 1)[:limit] if limit else np.empty(0, dtype=np.intp)
+        i, j, values, strength = i[keep], j[keep], values[keep], strength[keep]
+    order = np.lexsort((j, i, -strength))
+    names = np.asarray(columns, dtype=object)
+    first, second = names[i[order]], names[j[order]]
+    swap = first > second
+    return [
+        {"col1": col1, "col2": col2, "correlation": corr}
+        for col1, col2, corr in zip(
+            np.where(swap, second, first).tolist(),
+            np.where(swap, first, second).tolist(),
+            values[order].tolist(),
+        )
+    ]
+
+
+def interaction_points(x: np.ndarray, y: np.ndarray, rng=None) -> list:
+    """Scatter data: up to INTERACTION_SAMPLE rows where x and y are both present"""
+    rows = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    if len(rows) > INTERACTION_SAMPLE:
+        rows = (rng or np.random.default_rng()).choice(rows, INTERACTION_SAMPLE, replace=False)
+    return [{"x": a, "y": b} for a, b in zip(x[rows].tolist(), y[rows].tolist())]
+
+
+def _is_categorical(series: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def _samples(series: pd.Series):
+    """Smallest and largest values as strings, or (None, None) if not orderable"""
+    try:
+        return (
+            [str(v) for v in series.nsmallest(SAMPLE_SIZE).tolist()],
+            [str(v) for v in series.nlargest(SAMPLE_SIZE).tolist()],
+        )
+    except Exception:
+        return None, None
+
+
+def profile_dataframe(df: pd.DataFrame) -> dict:
+    """
+    Build the key-insights payload for a DataFrame.
+
+    Per-column counts and numeric statistics are computed for all columns at
+    once with vectorized pandas reductions rather than column by column.
+    """
+    row_count = len(df)
+    insights = {
+        "overview": {
+            "row_count": row_count,
+            "column_count": len(df.columns),
+            "memory_usage": df.memory_usage(deep=True).sum() / 1024**2,  # MB
+            "duplicate_rows": df.duplicated().sum(),
+        },
+        "columns": [],
+        "approximate": False,
+    }
+
+    missing = df.isna().sum()
+    unique = df.nunique()
+
+    # Booleans count as numeric (as in pandas) but need floats for the stats
+    numeric_cols = df.select_dtypes(include=["number", "bool"]).columns
+    numeric = df[numeric_cols].astype("float64") if len(numeric_cols) else df[numeric_cols]
+    if len(numeric_cols):
+        summary = numeric.agg(["mean", "median", "std", "min", "max"])
+        quartiles = numeric.quantile([0.25, 0.75])
+
+    for col in df.columns:
+        series = df[col]
+        col_data = {
+            "name": col,
+            "type": str(series.dtype),
+            "missing": int(missing[col]),
+            "missing_percent": float(missing[col] / row_count * 100) if row_count > 0 else 0,
+            "unique": int(unique[col]),
+        }
+
+        min_samples, max_samples = _samples(series)
+        if min_samples is not None:
+            col_data["min_samples"] = min_samples
+            col_data["max_samples"] = max_samples
+
+        # -----------------------------
+        # NUMERIC COLUMNS
+        # -----------------------------
+        if col in numeric_cols:
+            if missing[col] < row_count:
+                col_data["stats"] = {
+                    "mean": float(summary.at["mean", col]),
+                    "median": float(summary.at["median", col]),
+                    "std": float(summary.at["std", col]),
+                    "min": float(summary.at["min", col]),
+                    "max": float(summary.at["max", col]),
+                    "q25": float(quartiles.at[0.25, col]),
+                    "q75": float(quartiles.at[0.75, col]),
+                }
+
+                # Histogram (for frontend charts)
+                values = numeric[col].to_numpy()
+                hist, bins = np.histogram(values[~np.isnan(values)], bins=HISTOGRAM_BINS)
+                col_data["histogram"] = {
+                    "counts": hist.tolist(),
+                    "bins": bins.tolist()
+                }
+            else:
+                col_data["stats"] = None
+
+        # -----------------------------
+        # CATEGORICAL COLUMNS
+        # -----------------------------
+        elif _is_categorical(series):
+            value_counts = series.value_counts().head(TOP_VALUES)
+            col_data["top_values"] = [
+                {"value": str(val), "count": int(count)}
+                for val, count in value_counts.items()
+            ]
+
+        # -----------------------------
+        # DATETIME COLUMNS
+        # -----------------------------
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            if missing[col] < row_count:
+                col_data["stats"] = {
+                    "min": str(series.min()),
+                    "max": str(series.max()),
+                }
+
+        insights["columns"].append(col_data)
+
+    # -----------------------------
+    # CORRELATION MATRIX
+    # -----------------------------
+    numeric_cols = df.select_dtypes(include=["number"]).columns
+
+    if len(numeric_cols) > 1:
+        corr_matrix = df[numeric_cols].corr()
+
+        insights["correlation_matrix"] = {
+            "columns": numeric_cols.tolist(),
+            "data": corr_matrix.values.tolist(),
+        }
+
+        # Strongest pairs first, capped at MAX_CORRELATION_PAIRS for wide tables
+        insights["correlations"] = correlation_pairs(numeric_cols, corr_matrix.values)
+    else:
+        insights["correlation_matrix"] = None
+        insights["correlations"] = []
+
+    # -----------------------------
+    # TOP INTERACTIONS (scatter data)
+    # -----------------------------
+    if len(numeric_cols) >= 2:
+        insights["interactions"] = []
+
+        for pair in insights["correlations"][:TOP_INTERACTIONS]:
+            col1, col2 = pair["col1"], pair["col2"]
+            insights["interactions"].append({
+                "col1": col1,
+                "col2": col2,
+                "correlation": pair["correlation"],
+                "data": interaction_points(
+                    df[col1].to_numpy(dtype=np.float64, na_value=np.nan),
+                    df[col2].to_numpy(dtype=np.float64, na_value=np.nan),
+                ),
+            })
+
+    return to_python_type(insights)
@@ -1,34 +1,109 @@
-from db import execute_query, execute_query_df
-import pandas as pd
+import inspect
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import db_pool
+from cache import LRUCache
+from charts import downsample_result, parse_max_points, series
+from db import DB_PATH
+from query_registry import QueryRegistry
+
+# Canned statements, prepared once per pooled cursor (query_registry);
+# $n are typed parameters in the order of 'params'
+STATEMENTS = {
+    'daily_revenue': {
+        'sql': """
+        SELECT 
+            date as x,
+            total_revenue as y
+        FROM daily_revenue
+        WHERE ($1::DATE IS NULL OR date >= $1::DATE)
+          AND ($2::DATE IS NULL OR date <= $2::DATE)
+        ORDER BY date
+        """,
+        'params': [('start_date', 'DATE'), ('end_date', 'DATE')],
+    },
+    'revenue_by_product': {
+        'sql': """
+        SELECT 
+            p.product_name as x,
+            SUM(i.line_total) as y
+        FROM order_items i
+        JOIN products p ON i.product_id = p.product_id
+        GROUP BY p.product_name
+        ORDER BY y DESC
+        """,
+    },
+    'revenue_by_customer': {
+        'sql': """
+        SELECT 
+            c.customer_name as x,
+            SUM(o.total_amount) as y
+        FROM orders o
+        JOIN customers c ON o.customer_id = c.customer_id
+        GROUP BY c.customer_name
+        ORDER BY y DESC
+        LIMIT $1::BIGINT
+        """,
+        'params': [('top_n', 'BIGINT')],
+    },
+    'payroll_by_department': {
+        'sql': """
+        SELECT 
+            department as x,
+            SUM(base_salary) as y
+        FROM payroll
+        GROUP BY department
+        ORDER BY y DESC
+        """,
+    },
+    'monthly_expenses': {
+        'sql': """
+        SELECT 
+            DATE_TRUNC('month', date) as month,
+            SUM(amount) as amount
+        FROM expenses
+        GROUP BY DATE_TRUNC('month', date)
+        ORDER BY month
+        """,
+    },
+    'monthly_revenue': {
+        'sql': """
+        SELECT 
+            DATE_TRUNC('month', date) as month,
+            SUM(total_revenue) as amount
+        FROM daily_revenue
+        GROUP BY DATE_TRUNC('month', date)
+        ORDER BY month
+        """,
+    },
+    'top_products': {
+        'sql': """
+        SELECT 
+            p.product_name as x,
+            SUM(i.quantity) as y
+        FROM order_items i
+        JOIN products p ON i.product_id = p.product_id
+        GROUP BY p.product_name
+        ORDER BY y DESC
+        LIMIT $1::BIGINT
+        """,
+        'params': [('top_n', 'BIGINT')],
+    },
+}
+
+registry = QueryRegistry(STATEMENTS, DB_PATH)
 
 def get_daily_revenue_trend(start_date=None, end_date=None):
     """
     Get daily revenue trend in Plotly format
     Returns: dict with x (dates) and y (revenue) arrays
     """
-    query = """
-    SELECT 
-        date as x,
-        total_revenue as y
-    FROM daily_revenue
-    WHERE 1=1
-    """
-    
-    params = []
-    if start_date:
-        query += " AND date >= ?"
-        params.append(start_date)
-    if end_date:
-        query += " AND date <= ?"
-        params.append(end_date)
-    
-    query += " ORDER BY date"
-    
-    df = execute_query_df(query, params if params else None)
+    table = registry.execute('daily_revenue', start_date, end_date)
     
     return {
-        'x': df['x'].astype(str).tolist(),  # Convert dates to strings
-        'y': df['y'].tolist(),
+        **series(table),
         'type': 'scatter',
         'mode': 'lines+markers',
         'name': 'Daily Revenue'
@@ -36,24 +111,13 @@ def get_daily_revenue_trend(start_date=None, end_date=None):
 
 def get_revenue_by_product():
     """
-    Get total revenue by product in Plotly format
+    Get total revenue (order line totals) by product in Plotly format
     Returns: dict with x (product names) and y (revenue) arrays
     """
-    query = """
-    SELECT 
-        p.product_name as x,
-        SUM(o.revenue) as y
-    FROM orders o
-    JOIN products p ON o.product_id = p.product_id
-    GROUP BY p.product_name
-    ORDER BY y DESC
-    """
-    
-    df = execute_query_df(query)
+    table = registry.execute('revenue_by_product')
     
     return {
-        'x': df['x'].tolist(),
-        'y': df['y'].tolist(),
+        **series(table),
         'type': 'bar',
         'name': 'Revenue by Product'
     }
@@ -62,45 +126,22 @@ def get_revenue_by_customer(top_n=10):
     """
     Get top N customers by revenue in Plotly format
     """
-    query = """
-    SELECT 
-        c.name as x,
-        SUM(o.revenue) as y
-    FROM orders o
-    JOIN customers c ON o.customer_id = c.customer_id
-    GROUP BY c.name
-    ORDER BY y DESC
-    LIMIT ?
-    """
-    
-    df = execute_query_df(query, [top_n])
+    table = registry.execute('revenue_by_customer', top_n)
     
     return {
-        'x': df['x'].tolist(),
-        'y': df['y'].tolist(),
+        **series(table),
         'type': 'bar',
         'name': f'Top {top_n} Customers by Revenue'
     }
 
 def get_payroll_by_department():
     """
-    Get total payroll by department in Plotly format
-    """
-    query = """
-    SELECT 
-        d.department_name as x,
-        SUM(p.salary) as y
-    FROM payroll p
-    JOIN departments d ON p.department_id = d.department_id
-    GROUP BY d.department_name
-    ORDER BY y DESC
+    Get total base salary by department in Plotly format
     """
-    
-    df = execute_query_df(query)
+    table = registry.execute('payroll_by_department')
     
     return {
-        'x': df['x'].tolist(),
-        'y': df['y'].tolist(),
+        **series(table),
         'type': 'bar',
         'name': 'Payroll by Department'
     }
@@ -109,20 +150,10 @@ def get_expenses_over_time():
     """
     Get expenses over time (aggregated by month) in Plotly format
     """
-    query = """
-    SELECT 
-        DATE_TRUNC('month', date) as x,
-        SUM(amount) as y
-    FROM expenses
-    GROUP BY DATE_TRUNC('month', date)
-    ORDER BY x
-    """
-    
-    df = execute_query_df(query)
+    table = registry.execute('monthly_expenses')
     
     return {
-        'x': df['x'].astype(str).tolist(),
-        'y': df['y'].tolist(),
+        **series(table, 'month', 'amount'),
         'type': 'scatter',
         'mode': 'lines+markers',
         'name': 'Monthly Expenses'
@@ -133,40 +164,18 @@ def get_revenue_vs_expenses():
     Compare revenue vs expenses (multi-trace for Plotly)
     Returns: list of two traces
     """
-    # Get monthly revenue
-    revenue_query = """
-    SELECT 
-        DATE_TRUNC('month', date) as month,
-        SUM(total_revenue) as amount
-    FROM daily_revenue
-    GROUP BY DATE_TRUNC('month', date)
-    ORDER BY month
-    """
-    
-    # Get monthly expenses
-    expenses_query = """
-    SELECT 
-        DATE_TRUNC('month', date) as month,
-        SUM(amount) as amount
-    FROM expenses
-    GROUP BY DATE_TRUNC('month', date)
-    ORDER BY month
-    """
-    
-    revenue_df = execute_query_df(revenue_query)
-    expenses_df = execute_query_df(expenses_query)
+    revenue_table = registry.execute('monthly_revenue')
+    expenses_table = registry.execute('monthly_expenses')
     
     return [
         {
-            'x': revenue_df['month'].astype(str).tolist(),
-            'y': revenue_df['amount'].tolist(),
+            **series(revenue_table, 'month', 'amount'),
             'type': 'scatter',
             'mode': 'lines+markers',
             'name': 'Revenue'
         },
         {
-            'x': expenses_df['month'].astype(str).tolist(),
-            'y': expenses_df['amount'].tolist(),
+            **series(expenses_table, 'month', 'amount'),
             'type': 'scatter',
             'mode': 'lines+markers',
             'name': 'Expenses'
@@ -177,22 +186,10 @@ def get_top_products_by_quantity(top_n=5):
     """
     Get top N products by quantity sold
     """
-    query = """
-    SELECT 
-        p.product_name as x,
-        SUM(o.quantity) as y
-    FROM orders o
-    JOIN products p ON o.product_id = p.product_id
-    GROUP BY p.product_name
-    ORDER BY y DESC
-    LIMIT ?
-    """
-    
-    df = execute_query_df(query, [top_n])
+    table = registry.execute('top_products', top_n)
     
     return {
-        'x': df['x'].tolist(),
-        'y': df['y'].tolist(),
+        **series(table),
         'type': 'bar',
         'name': f'Top {top_n} Products by Quantity'
     }
@@ -206,4 +203,82 @@ QUERY_FUNCTIONS = {
     'expenses_over_time': get_expenses_over_time,
     'revenue_vs_expenses': get_revenue_vs_expenses,
     'top_products': get_top_products_by_quantity,
-}
\ No newline at end of file
+}
+
+# Tables each query type reads; a write to one of them invalidates its cached results
+QUERY_TABLES = {
+    'daily_revenue': ('daily_revenue',),
+    'revenue_by_product': ('order_items', 'products'),
+    'revenue_by_customer': ('orders', 'customers'),
+    'payroll_by_department': ('payroll',),
+    'expenses_over_time': ('expenses',),
+    'revenue_vs_expenses': ('daily_revenue', 'expenses'),
+    'top_products': ('order_items', 'products'),
+}
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024**2)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))
+
+# Worker threads shared by all batch requests; each query borrows a pooled cursor
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="query-batch")
+_result_cache = LRUCache(RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL)
+db_pool.get_manager(DB_PATH).add_write_listener(
+    lambda tables: _result_cache.invalidate(tables)
+)
+
+def _bind_filters(query_func, filters):
+    """Keep the filters the function accepts, with its defaults filled in"""
+    sig = inspect.signature(query_func)
+    bound = sig.bind(**{k: v for k, v in (filters or {}).items() if k in sig.parameters})
+    bound.apply_defaults()
+    return bound.arguments
+
+def run_query(query_type, filters=None, max_points=None):
+    """
+    Run a QUERY_FUNCTIONS entry, serving repeat calls from the result cache.
+    Cached results are keyed on the query type, the normalized filters and the
+    data version of the tables the query reads. Callers must not mutate them.
+    With max_points, line traces are downsampled (LTTB) on the way out; the
+    cache always holds the full series.
+    """
+    query_func = QUERY_FUNCTIONS[query_type]
+    kwargs = _bind_filters(query_func, filters)
+    key = (query_type, json.dumps(kwargs, sort_keys=True, default=str))
+    tables = QUERY_TABLES.get(query_type)
+    version = db_pool.get_manager(DB_PATH).data_version(tables)
+
+    result = _result_cache.get(key, version=version)
+    if result is None:
+        result = query_func(**kwargs)
+        _result_cache.set(key, result, version=version, tags=tables or ())
+    return downsample_result(result, max_points)
+
+def _run_batch_item(spec):
+    query_type = spec.get('query_type')
+    item = {'query_type': query_type}
+    try:
+        if query_type not in QUERY_FUNCTIONS:
+            raise ValueError(f'Unknown query_type: {query_type}')
+        item['data'] = run_query(query_type, spec.get('filters') or {}, parse_max_points(spec.get('max_points')))
+        item['success'] = True
+    except Exception as e:
+        item['success'] = False
+        item['error'] = str(e)
+    return item
+
+def run_batch(specs):
+    """
+    Run several {query_type, filters} specs concurrently on the batch pool.
+    Results come back in request order; a failing item carries its own error.
+    """
+    return list(_batch_executor.map(_run_batch_item, specs))
+
+def cache_stats():
+    """Hit/miss counters and memory use of the result cache"""
+    return _result_cache.stats()
+
+def registry_stats():
+    """Prepared canned statements and their executions"""
+    return registry.stats()
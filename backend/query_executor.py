@@ -0,0 +1,241 @@
+"""
+Execution of the SQL queries generated for a chat response.
+
+Every query of a response runs concurrently on its own pooled cursor, so a
+response with several charts takes about as long as its slowest query.
+Results come back in response order, each query's error is kept to its own
+entry, and each statement is executed exactly once: identical SQL within a
+response shares one run, and rows are built from the single result set.
+Before running, SELECT * is narrowed to the chart's columns (sql_rewrite)
+and its estimated plan is screened (cost_estimator): a query that is too
+expensive is sampled or rejected before it starts, and a long
+date/timestamp x axis is bucketed with date_trunc (aggregation_planner).
+Everything runs under the query_guard time limit and row/byte caps; a
+rejected, cancelled or cut-short query is reported in its own entry.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import pyarrow as pa
+
+import db_pool
+from aggregation_planner import TIME_BUCKET_TARGET_POINTS, finish_buckets, plan_buckets
+from charts import plotly_trace
+from cost_estimator import CostRejected, screen
+from query_guard import QueryTimeoutError, StatementRejected, Watchdog, fetch_capped, statement_error
+from sql_rewrite import prune_projection
+
+# Threads running generated queries; each borrows a cursor from the pool
+CHAT_QUERY_WORKERS = int(os.getenv("CHAT_QUERY_WORKERS", "4"))
+
+# Narrow generated SELECT * queries to the chart's x/y columns (0 disables)
+PROJECTION_PRUNING = os.getenv("PROJECTION_PRUNING", "1") != "0"
+
+_executor = ThreadPoolExecutor(max_workers=CHAT_QUERY_WORKERS, thread_name_prefix="chat-query")
+_stats_lock = threading.Lock()
+_pruning = {"queries": 0, "rewritten": 0, "columns_dropped": 0, "cells_skipped": 0}
+_bucketing = {"bucketed": 0, "rows_before": 0, "rows_after": 0}
+
+
+def fetch_table(
+    sql: str,
+    columns: Sequence[str] = None,
+    max_points: int = None,
+) -> Tuple[pa.Table, dict]:
+    """
+    Run a statement once on a pooled cursor and return its result as Arrow,
+    with metadata for its frontend entry: 'cost' (the plan screening
+    decision), 'aggregation' (the time-bucket plan) and 'truncated' (the cap
+    that cut the result short), when they apply.
+    If chart columns (x, y) are given, SELECT * is narrowed to them where
+    that is safe, and a temporal x with more values than max_points (or the
+    default budget) is aggregated into date_trunc buckets.
+    Raises StatementRejected for anything but a single SELECT, CostRejected
+    if the estimated plan is too expensive to run, and QueryTimeoutError if
+    the whole run exceeds the time limit.
+    """
+    with db_pool.cursor() as con, Watchdog(con) as watchdog:
+        error = statement_error(sql, con)
+        if error:
+            raise StatementRejected(error)
+        report = aggregate = truncated = None
+        if columns and PROJECTION_PRUNING:
+            sql, report = prune_projection(sql, columns, con)
+        if columns and len(columns) == 2:
+            def aggregate(sql, estimated_rows):
+                return plan_buckets(sql, columns[0], columns[1], con, max_points, estimated_rows)
+        sql, cost, plan = screen(sql, con, aggregate)
+        watchdog.check()
+        table, truncated = fetch_capped(con.execute(sql))
+
+    if plan:
+        table, plan = finish_buckets(table, plan)
+    with _stats_lock:
+        _pruning["queries"] += 1
+        if report:
+            _pruning["rewritten"] += 1
+            _pruning["columns_dropped"] += len(report["dropped"])
+            _pruning["cells_skipped"] += table.num_rows * len(report["dropped"])
+    if report:
+        print(f"  Projection pruned to {report['columns']} ({len(report['dropped'])} of {report['original_columns']} columns dropped)")
+    if plan:
+        plan["rows"] = table.num_rows
+        with _stats_lock:
+            _bucketing["bucketed"] += 1
+            _bucketing["rows_before"] += plan["original_rows"]
+            _bucketing["rows_after"] += table.num_rows
+        print(f"  Bucketed by {plan['bucket']} ({plan['aggregate']} of {plan['y']}): {plan['original_rows']} rows -> {table.num_rows}")
+    if truncated:
+        print(f"  Result truncated at {truncated['rows']} rows ({truncated['reason']} cap)")
+    if cost and cost['decision'] == 'sample':
+        print(f"  Sampled {cost['sample']['fraction']:.2%} of {cost['sample']['table']}")
+    meta = {'cost': cost, 'aggregation': plan, 'truncated': truncated}
+    return table, {key: value for key, value in meta.items() if value}
+
+
+def pruning_stats() -> dict:
+    """How many generated queries were narrowed, and the columns/cells they no longer return"""
+    with _stats_lock:
+        stats = dict(_pruning)
+    stats["enabled"] = PROJECTION_PRUNING
+    return stats
+
+
+def bucketing_stats() -> dict:
+    """How many generated queries were aggregated into time buckets, and their rows before/after"""
+    with _stats_lock:
+        stats = dict(_bucketing)
+    stats["target_points"] = TIME_BUCKET_TARGET_POINTS
+    return stats
+
+
+def chart_columns(q) -> List[str]:
+    """Columns the chart of a generated query reads"""
+    chart = q.suggested_chart
+    return [chart.x, chart.y] if isinstance(chart.y, str) else []
+
+
+def _chart_meta(q) -> dict:
+    return {
+        'type': q.suggested_chart.type,
+        'x': q.suggested_chart.x,
+        'y': q.suggested_chart.y,
+        'title': q.suggested_chart.title
+    }
+
+
+def shape_result(
+    q,
+    table: pa.Table = None,
+    error: str = None,
+    max_points: int = None,
+    meta: dict = None,
+) -> dict:
+    """
+    The frontend entry for one generated query: rows, Plotly-ready data and
+    chart metadata, or its error. Line traces longer than max_points are
+    downsampled; the rows are always complete. meta ('cost', 'aggregation',
+    'truncated', 'timed_out') is added to the entry as it is, and so is the
+    query's 'repaired' note when its SQL was fixed before running.
+    """
+    if getattr(q, 'repaired', None):
+        meta = {'repaired': q.repaired, **(meta or {})}
+    if error is not None:
+        return {
+            'name': q.name,
+            'sql': q.sql,
+            'data': [],
+            'plotly_data': None,
+            'error': error,
+            'suggested_chart': _chart_meta(q),
+            **(meta or {})
+        }
+
+    # Transform to Plotly format
+    plotly_data = None
+    if table.num_rows and isinstance(q.suggested_chart.y, str):  # Only single y-axis supported
+        plotly_data = plotly_trace(
+            table,
+            q.suggested_chart.x,
+            q.suggested_chart.y,
+            q.suggested_chart.type,
+            q.suggested_chart.title,
+            max_points
+        )
+
+    return {
+        'name': q.name,
+        'sql': q.sql,
+        'data': table.to_pylist(),  # Keep raw data for reference
+        'plotly_data': plotly_data,  # Add Plotly-ready data
+        'suggested_chart': _chart_meta(q),
+        **(meta or {})
+    }
+
+
+def _fetch_logged(name: str, sql: str, columns: Sequence[str], max_points: int = None) -> Tuple[pa.Table, dict]:
+    start = time.perf_counter()
+    table, meta = fetch_table(sql, columns, max_points)
+    print(f"\nQuery '{name}' executed successfully in {(time.perf_counter() - start) * 1000:.1f} ms:")
+    print(f"  Rows returned: {table.num_rows}")
+    if table.num_rows:
+        print(f"  Sample row: {table.slice(0, 1).to_pylist()[0]}")
+    return table, meta
+
+
+def _resolve(q, rows: Future, max_points: int = None) -> dict:
+    """Wait for a query's rows and shape them, keeping any error to this entry"""
+    try:
+        table, meta = rows.result()
+        return shape_result(q, table, max_points=max_points, meta=meta)
+    except CostRejected as e:
+        error_msg = f"Query '{q.name}' was not run: {str(e)}"
+        print(f"\n{error_msg}\n")
+        return shape_result(q, error=error_msg, meta={'cost': e.decision})
+    except StatementRejected as e:
+        error_msg = f"Query '{q.name}' was not run: {str(e)}"
+        print(f"\n{error_msg}\n")
+        return shape_result(q, error=error_msg)
+    except QueryTimeoutError as e:
+        error_msg = f"Query '{q.name}' was cancelled: {str(e)}"
+        print(f"\n{error_msg}\n")
+        return shape_result(q, error=error_msg, meta={'timed_out': True})
+    except Exception as e:
+        error_msg = f"Error executing query '{q.name}': {str(e)}"
+        print(f"\n{error_msg}\n")
+        return shape_result(q, error=error_msg)
+
+
+def execute_generated_query(q, max_points: int = None) -> dict:
+    """Run one generated query and shape it for the frontend (on the calling thread)"""
+    rows = Future()
+    try:
+        rows.set_result(_fetch_logged(q.name, q.sql, chart_columns(q), max_points))
+    except Exception as e:
+        rows.set_exception(e)
+    return _resolve(q, rows, max_points)
+
+
+def submit(q, max_points: int = None) -> Future:
+    """Start one generated query on the executor; the future resolves to its frontend entry"""
+    return _executor.submit(execute_generated_query, q, max_points)
+
+
+def execute_all(queries, max_points: int = None) -> List[dict]:
+    """
+    Run the generated queries of one response concurrently and return their
+    frontend entries in response order
+    """
+    if len(queries) <= 1:
+        return [execute_generated_query(q, max_points) for q in queries]
+
+    # Identical SQL (for the same chart columns) in one response runs once and is shared
+    runs: Dict[tuple, Future] = {}
+    for q in queries:
+        key = (q.sql, tuple(chart_columns(q)))
+        if key not in runs:
+            runs[key] = _executor.submit(_fetch_logged, q.name, q.sql, key[1], max_points)
+    return [_resolve(q, runs[(q.sql, tuple(chart_columns(q)))], max_points) for q in queries]
@@ -0,0 +1,163 @@
+"""
+Limits on executing LLM-generated SQL.
+
+Generated queries can be arbitrarily expensive (a cross join of orders and
+order_items pins a core and fills memory). Each one runs under a Watchdog
+that calls interrupt() on its cursor once QUERY_TIMEOUT seconds have passed,
+which also covers the planning queries run before it. Results are read
+in record batches with fetch_capped, which stops streaming once
+QUERY_MAX_ROWS rows or QUERY_MAX_BYTES bytes have arrived, so an oversized
+result is never materialized. Callers get the rows kept plus a description
+of the cut, or a QueryTimeoutError, and report them per query instead of
+failing the request.
+
+The cursors are pooled and share one DuckDB instance, so only a single
+SELECT (WITH ... SELECT, VALUES, SHOW and the like) may run: a SET, CREATE,
+ATTACH or COPY would change state for every later query.
+"""
+import os
+import threading
+from typing import Optional, Tuple
+
+import duckdb
+import pyarrow as pa
+
+# Wall-clock seconds a generated query may run (including planning); 0 disables
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "15"))
+# Most rows / Arrow bytes kept from one generated query's result
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "100000"))
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(64 * 1024**2)))
+# Rows per record batch while streaming a result
+FETCH_BATCH_ROWS = 8192
+
+_stats_lock = threading.Lock()
+_stats = {"queries": 0, "timed_out": 0, "truncated": 0}
+
+
+class QueryTimeoutError(RuntimeError):
+    """A generated query was interrupted after running for longer than its timeout"""
+
+
+class StatementRejected(ValueError):
+    """Generated SQL that is not a single SELECT, so it was not run"""
+
+
+def statement_error(sql: str, con: duckdb.DuckDBPyConnection) -> Optional[str]:
+    """
+    Why sql is not a single read-only query, or None if it is. Raises
+    duckdb.ParserException if it doesn't parse.
+    """
+    statements = con.extract_statements(sql)
+    if len(statements) != 1:
+        return f"Expected a single SELECT statement, got {len(statements)} statements"
+    if statements[0].type != duckdb.StatementType.SELECT:
+        return f"Only SELECT statements may run, not {statements[0].type.name}"
+    return None
+
+
+class Watchdog:
+    """
+    Interrupts whatever the cursor is running once timeout seconds have
+    passed, for the duration of a ``with`` block. Once the block has exited
+    the cursor may be back in the pool running someone else's query, so
+    interrupt() is never called after that, even by a timer that had
+    already started firing.
+    """
+
+    def __init__(self, con: duckdb.DuckDBPyConnection, timeout: Optional[float] = None):
+        self.con = con
+        self.timeout = QUERY_TIMEOUT if timeout is None else timeout
+        self.fired = False
+        self._timer = None
+        # Held while interrupting, so __exit__ waits out a timer mid-fire
+        self._lock = threading.Lock()
+        self._exited = False
+
+    def _fire(self):
+        with self._lock:
+            if self._exited:
+                return
+            self.fired = True
+            self.con.interrupt()
+
+    def _error(self) -> QueryTimeoutError:
+        return QueryTimeoutError(f"Query exceeded the {self.timeout:g}s time limit and was cancelled")
+
+    def check(self):
+        """Raise QueryTimeoutError if the deadline has passed"""
+        if self.fired:
+            raise self._error()
+
+    def __enter__(self):
+        with _stats_lock:
+            _stats["queries"] += 1
+        if self.timeout > 0:
+            self._timer = threading.Timer(self.timeout, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._timer is not None:
+            self._timer.cancel()
+        with self._lock:
+            self._exited = True
+        if self.fired and isinstance(exc, (duckdb.InterruptException, QueryTimeoutError)):
+            with _stats_lock:
+                _stats["timed_out"] += 1
+            if isinstance(exc, duckdb.InterruptException):
+                raise self._error() from None
+        return False
+
+
+def fetch_capped(
+    result: duckdb.DuckDBPyConnection,
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> Tuple[pa.Table, Optional[dict]]:
+    """
+    Stream an executed statement's result into an Arrow table, stopping at
+    max_rows rows or max_bytes bytes. Returns (table, truncation); truncation
+    is None for a complete result, else says which cap was hit and how many
+    rows were kept. The caps default to QUERY_MAX_ROWS / QUERY_MAX_BYTES.
+    """
+    max_rows = QUERY_MAX_ROWS if max_rows is None else max_rows
+    max_bytes = QUERY_MAX_BYTES if max_bytes is None else max_bytes
+    reader = result.fetch_record_batch(FETCH_BATCH_ROWS)
+    batches, rows, size, reason = [], 0, 0, None
+    for batch in reader:
+        if not batch.num_rows:
+            continue
+        if rows >= max_rows:
+            reason = "rows"
+            break
+        if rows + batch.num_rows > max_rows:
+            reason = "rows"
+            batch = batch.slice(0, max_rows - rows)
+        if size + batch.nbytes > max_bytes:
+            reason = "bytes"
+            # Keep the part of the batch that fits, at its average row width
+            batch = batch.slice(0, int((max_bytes - size) / (batch.nbytes / batch.num_rows)))
+        if batch.num_rows:
+            batches.append(batch)
+            rows += batch.num_rows
+            size += batch.nbytes
+        if reason:
+            break
+    schema = reader.schema
+    reader.close()  # stops DuckDB producing the rest
+    table = pa.Table.from_batches(batches, schema=schema)
+    if reason is None:
+        return table, None
+
+    with _stats_lock:
+        _stats["truncated"] += 1
+    return table, {"reason": reason, "rows": rows, "max_rows": max_rows, "max_bytes": max_bytes}
+
+
+def stats() -> dict:
+    """Generated queries run under the guard, and how many were cancelled or cut short"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update(timeout=QUERY_TIMEOUT, max_rows=QUERY_MAX_ROWS, max_bytes=QUERY_MAX_BYTES)
+    return stats
@@ -0,0 +1,141 @@
+"""
+Prepared statements for the canned dashboard queries.
+
+QUERY_FUNCTIONS used to rebuild and re-plan their SQL on every call, and a
+query written against an old schema only failed when a chart asked for it.
+QueryRegistry holds every canned statement with its typed parameters.
+validate() prepares them all once against the catalog when the server
+starts (main.py), and raises RegistryError listing every statement that
+doesn't bind, so a schema drift stops the server instead of breaking charts
+one by one.
+
+Each pooled cursor prepares the statements the first time it runs one
+(prepared statements belong to a connection). After that a call only sends
+EXECUTE name(args), with no parse, bind or plan work. DuckDB's Python
+client can't bind ? parameters to EXECUTE, so every argument is first
+checked against its declared type and then written as a typed literal:
+DATE '2024-01-31', an integer, or NULL. No caller text reaches the SQL.
+"""
+import datetime
+import threading
+import time
+import weakref
+from typing import Dict, Sequence, Tuple
+
+import duckdb
+import pyarrow as pa
+
+import db_pool
+
+# Prefix of the prepared statement names, so they can't clash with others on a cursor
+PREFIX = "canned_"
+
+
+class RegistryError(RuntimeError):
+    """Canned statements that don't prepare against the current catalog"""
+
+
+def sql_literal(value, sql_type: str) -> str:
+    """A parameter value as a literal of its declared type; raises ValueError if it isn't one"""
+    if value is None:
+        return "NULL"
+    if sql_type == "DATE":
+        if isinstance(value, datetime.datetime):
+            value = value.date()
+        if not isinstance(value, datetime.date):
+            value = datetime.date.fromisoformat(str(value))
+        return f"DATE '{value.isoformat()}'"
+    if sql_type in ("INTEGER", "BIGINT"):
+        if isinstance(value, bool) or not str(value).lstrip("-").isdigit():
+            raise ValueError(f"expected an integer, got {value!r}")
+        return str(int(value))
+    raise ValueError(f"unsupported parameter type {sql_type}")
+
+
+class QueryRegistry:
+    """
+    Named statements ({name: {'sql', 'params': [(param, type), ...]}}),
+    prepared once per pooled cursor and executed by name. Parameters are
+    written $1, $2, ... in the SQL, in the order of 'params'.
+    """
+
+    def __init__(self, statements: Dict[str, dict], db_path: str = db_pool.DEFAULT_DB_PATH):
+        self.statements = statements
+        self.db_path = db_path
+        self._prepared = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._stats = {"executions": 0, "cursors_prepared": 0, "prepare_time": 0.0}
+
+    def _prepare_all(self, con: duckdb.DuckDBPyConnection) -> Dict[str, str]:
+        """Prepare every statement on a cursor; {name: error} for those that fail"""
+        errors = {}
+        for name, statement in self.statements.items():
+            try:
+                con.execute(f"PREPARE {PREFIX}{name} AS {statement['sql'].strip().rstrip(';')}")
+            except duckdb.Error as e:
+                errors[name] = str(e)
+        return errors
+
+    def _ensure_prepared(self, con: duckdb.DuckDBPyConnection):
+        with self._lock:
+            if con in self._prepared:
+                return
+        start = time.perf_counter()
+        errors = self._prepare_all(con)
+        if errors:
+            raise RegistryError(self._report(errors))
+        with self._lock:
+            self._prepared.add(con)
+            self._stats["cursors_prepared"] += 1
+            self._stats["prepare_time"] += time.perf_counter() - start
+
+    def _report(self, errors: Dict[str, str]) -> str:
+        lines = [f"{len(errors)} of {len(self.statements)} canned queries don't bind against {self.db_path}:"]
+        lines += [f"  {name}: {error}" for name, error in errors.items()]
+        return "\n".join(lines)
+
+    def validate(self):
+        """
+        Prepare every statement on a short-lived read-only connection, closed
+        before returning, so no handle (or file lock) outlives the check (on
+        a pooled cursor if this process already has the file open).
+        Raises RegistryError listing every statement that fails.
+        """
+        if db_pool.get_manager(self.db_path).stats()["open"]:
+            # This process already holds the file; a second handle can't open it
+            with db_pool.cursor(self.db_path) as con:
+                errors = self._prepare_all(con)
+        else:
+            with duckdb.connect(self.db_path, read_only=True) as con:
+                errors = self._prepare_all(con)
+        if errors:
+            raise RegistryError(self._report(errors))
+        print(f"Query registry: {len(self.statements)} canned queries validated")
+
+    def execute(self, name: str, *args) -> pa.Table:
+        """Run a statement with positional arguments (None for an unset filter) as Arrow"""
+        params: Sequence[Tuple[str, str]] = self.statements[name].get("params", ())
+        if len(args) != len(params):
+            raise TypeError(f"{name} takes {len(params)} arguments, got {len(args)}")
+        literals = []
+        for (param, sql_type), value in zip(params, args):
+            try:
+                literals.append(sql_literal(value, sql_type))
+            except ValueError as e:
+                raise ValueError(f"{param}: {e}") from None
+        call = f"EXECUTE {PREFIX}{name}" + (f"({', '.join(literals)})" if literals else "")
+
+        with db_pool.cursor(self.db_path) as con:
+            self._ensure_prepared(con)
+            table = con.execute(call).fetch_arrow_table()
+        with self._lock:
+            self._stats["executions"] += 1
+        return table
+
+    def stats(self) -> dict:
+        """Statements held, cursors they are prepared on and executions so far"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["live_cursors"] = len(self._prepared)
+        stats["statements"] = len(self.statements)
+        return stats
@@ -1,13 +1,41 @@
 from fastapi.responses import JSONResponse
-from flask import Blueprint, request, jsonify
-from key_insights import get_key_insights
-from queries import QUERY_FUNCTIONS
-from chat import GeminiSQLWrapper
-from db_utils import get_connection
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from key_insights import get_key_insights, INSIGHT_MODES
+from insights_jobs import submit_job, run_job, get_job, jobs_stats
+from queries import QUERY_FUNCTIONS, run_query, run_batch, cache_stats, registry_stats
+from chat import GeminiSQLWrapper, QueryResponse
+from chat_cache import normalize_question
+from concurrent.futures import Future, wait
+from charts import parse_max_points
+from query_executor import bucketing_stats, execute_all, pruning_stats, shape_result, submit as submit_query
+from intent_router import INTENTS, IntentRouter
+import query_guard
+import cost_estimator
+from scheduler import Overloaded, scheduler
+import math
+import db_pool
 import json
+import singleflight
+import queue
+import threading
+import time
 
 api = Blueprint('api', __name__)
 
+# Coalesce identical concurrent requests into one Gemini call / DuckDB run
+_chat_flight = singleflight.SingleFlight('chat')
+
+def _overloaded(e):
+    """429 for a request shed by the scheduler, with Retry-After"""
+    return jsonify({
+        'success': False,
+        'error': str(e),
+        'retry_after': e.retry_after
+    }), 429, {'Retry-After': str(math.ceil(e.retry_after))}
+
+# Questions a canned query answers skip Gemini
+_router = IntentRouter()
+
 # Initialize GeminiSQLWrapper once (singleton pattern)
 _wrapper = None
 
@@ -31,14 +59,25 @@ def query_data():
             "start_date": "2023-01-01",
             "end_date": "2023-12-31",
             "top_n": 10
-        }
+        },
+        "max_points": 500    (optional)
     }
+    Line traces longer than max_points are downsampled (LTTB) and carry
+    "original_points", the length of the full series.
     """
     try:
         data = request.get_json()
         query_type = data.get('query_type')
         filters = data.get('filters', {})
         
+        try:
+            max_points = parse_max_points(data.get('max_points'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         if not query_type:
             return jsonify({
                 'success': False,
@@ -52,19 +91,9 @@ def query_data():
                 'available_types': list(QUERY_FUNCTIONS.keys())
             }), 400
         
-        # Get the appropriate query function
-        query_func = QUERY_FUNCTIONS[query_type]
-        
-        # Call function with filters (if it accepts them)
-        import inspect
-        sig = inspect.signature(query_func)
-        
-        if len(sig.parameters) > 0:
-            # Function accepts parameters, pass relevant filters
-            result = query_func(**{k: v for k, v in filters.items() if k in sig.parameters})
-        else:
-            # Function doesn't accept parameters
-            result = query_func()
+        # Run the query function with the filters it accepts (cached)
+        with scheduler.slot('dashboard'):
+            result = run_query(query_type, filters, max_points)
         
         return jsonify({
             'success': True,
@@ -72,6 +101,63 @@ def query_data():
             'query_type': query_type
         })
         
+    except Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Largest number of charts accepted in one batch request
+MAX_BATCH_SIZE = 50
+
+@api.route('/query-data/batch', methods=['POST'])
+def query_data_batch():
+    """
+    Load several charts in one round trip; queries run concurrently
+    Expected JSON body:
+    {
+        "queries": [
+            {"query_type": "daily_revenue", "filters": {"start_date": "2023-01-01"}},
+            {"query_type": "top_products", "filters": {"top_n": 5}}
+        ],
+        "max_points": 500    (optional; a query's own max_points overrides it)
+    }
+    Each result carries its own success flag and error.
+    """
+    try:
+        data = request.get_json() or {}
+        specs = data.get('queries')
+        
+        if not isinstance(specs, list) or not specs:
+            return jsonify({
+                'success': False,
+                'error': 'queries must be a non-empty list'
+            }), 400
+        
+        if len(specs) > MAX_BATCH_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BATCH_SIZE} queries per batch'
+            }), 400
+        
+        if not all(isinstance(spec, dict) for spec in specs):
+            return jsonify({
+                'success': False,
+                'error': 'Each query must be an object with query_type and filters'
+            }), 400
+        
+        with scheduler.slot('dashboard'):
+            results = run_batch([{'max_points': data.get('max_points'), **spec} for spec in specs])
+        
+        return jsonify({
+            'success': True,
+            'results': results
+        })
+        
+    except Overloaded as e:
+        return _overloaded(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -86,6 +172,29 @@ def available_queries():
         'queries': list(QUERY_FUNCTIONS.keys())
     })
 
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Cache, connection pool and background job counters"""
+    return jsonify({
+        'success': True,
+        'result_cache': cache_stats(),
+        'query_registry': registry_stats(),
+        'chat_cache': _wrapper.cache.stats() if _wrapper is not None else None,
+        'chat_llm': _wrapper.llm_stats() if _wrapper is not None else None,
+        'sql_validation': _wrapper.validator.stats() if _wrapper is not None else None,
+        'db_pool': db_pool.get_manager().stats(),
+        'insights_jobs': jobs_stats(),
+        'singleflight': singleflight.stats(),
+        'projection_pruning': pruning_stats(),
+        'time_bucketing': bucketing_stats(),
+        'query_guard': query_guard.stats(),
+        'cost_estimation': cost_estimator.stats(),
+        'scheduler': scheduler.stats(),
+        'intent_router': _router.stats(
+            _wrapper.llm_stats()['avg_latency'] if _wrapper is not None and _wrapper.llm_stats()['calls'] else None
+        )
+    })
+
 @api.route('/test-db', methods=['GET'])
 def test_db():
     """Test database connection"""
@@ -95,7 +204,8 @@ def test_db():
         return jsonify({
             'success': True,
             'message': 'Database connection successful',
-            'order_count': result[0]['count']
+            'order_count': result[0]['count'],
+            'pool': db_pool.get_manager().health_check()
         })
     except Exception as e:
         return jsonify({
@@ -103,14 +213,123 @@ def test_db():
             'error': str(e)
         }), 500
 
+def chart_error(q):
+    """Why a generated query's chart can't be drawn, or None if it can"""
+    # Check chart type
+    if q.suggested_chart.type not in ['line', 'bar']:
+        return f"Unsupported chart type: {q.suggested_chart.type}. Only 'line' and 'bar' charts are supported."
+    
+    # Check if y is an array (multi-series not allowed)
+    if isinstance(q.suggested_chart.y, list):
+        return "Multi-series charts are not supported. Please request a single metric to visualize."
+    return None
+
+def _routed_entry(user_input, max_points=None):
+    """
+    The chat entry for a question the intent router answers from
+    QUERY_FUNCTIONS, or None to ask Gemini (no match, or the canned query failed)
+    """
+    start = time.perf_counter()
+    match = _router.route(user_input)
+    if match is None:
+        return None
+    query_type, filters = match['query_type'], match['filters']
+    try:
+        result = run_query(query_type, filters, max_points)
+    except Exception as e:
+        print(f"\nRouted query '{query_type}' failed, asking Gemini instead: {e}\n")
+        _router.record(time.perf_counter() - start, ok=False)
+        return None
+    
+    traces = result if isinstance(result, list) else [result]
+    entry = {
+        'name': query_type,
+        'sql': f"-- canned query: {query_type}" + (f" {json.dumps(filters)}" if filters else ""),
+        'data': [
+            {'series': trace.get('name'), 'x': x, 'y': y}
+            for trace in traces for x, y in zip(trace['x'], trace['y'])
+        ],
+        'plotly_data': result,
+        'suggested_chart': {
+            'type': INTENTS[query_type]['chart'],
+            'x': 'x',
+            'y': 'y',
+            'title': ' vs '.join(trace.get('name', '') for trace in traces)
+        },
+        'routed': match
+    }
+    elapsed = time.perf_counter() - start
+    _router.record(elapsed)
+    print(f"\nRouted to canned query '{query_type}' {filters} (confidence {match['confidence']}) in {elapsed * 1000:.1f} ms\n")
+    return entry
+
+def _chat_response(user_input, max_points=None):
+    """Generate and run the queries for one question (in a chat slot): (response body, status)"""
+    with scheduler.slot('chat'):
+        return _answer(user_input, max_points)
+
+def _answer(user_input, max_points=None):
+    # Known questions are answered locally
+    entry = _routed_entry(user_input, max_points)
+    if entry is not None:
+        return {
+            'success': True,
+            'queries': [entry]
+        }, 200
+    
+    # Get wrapper and process query
+    wrapper = get_wrapper()
+    
+    # Print to terminal
+    print("\n" + "=" * 70)
+    print(f"User Query: {user_input}")
+    print("=" * 70)
+    
+    result = wrapper.query(user_input)
+    
+    # Print query results to terminal
+    print("\nGenerated Query Response:")
+    print(json.dumps(result.model_dump(), indent=2))
+    print("=" * 70 + "\n")
+    
+    # Check for error response from AI
+    if result.error:
+        print(f"\n⚠️  AI Error: {result.error}\n")
+        return {
+            'success': False,
+            'error': result.error
+        }, 400
+    
+    # Validate chart types and y field
+    for q in result.queries:
+        error_msg = chart_error(q)
+        if error_msg:
+            print(f"\n⚠️  Validation Error: {error_msg}\n")
+            return {
+                'success': False,
+                'error': error_msg
+            }, 400
+    
+    # Execute SQL queries concurrently; results stay in response order
+    queries_with_data = execute_all(result.queries, max_points)
+    
+    # Return response to frontend
+    return {
+        'success': True,
+        'queries': queries_with_data
+    }, 200
+
 @api.route('/chat', methods=['POST'])
 def chat():
     """
     Chat endpoint that uses Gemini to generate SQL queries
     Expected JSON body:
     {
-        "user_input": "Show me total revenue by month for 2024"
+        "user_input": "Show me total revenue by month for 2024",
+        "max_points": 500    (optional; downsamples long line charts)
     }
+    Questions matching a canned query (intent_router) are answered from
+    QUERY_FUNCTIONS; their entry carries "routed".
     """
     try:
         data = request.get_json()
@@ -122,203 +341,24 @@ def chat():
                 'error': 'user_input is required'
             }), 400
         
-        # Get wrapper and process query
-        wrapper = get_wrapper()
-        
-        # Print to terminal
-        print("\n" + "=" * 70)
-        print(f"User Query: {user_input}")
-        print("=" * 70)
-        
-        result = wrapper.query(user_input)
-        
-        # Print query results to terminal
-        print("\nGenerated Query Response:")
-        print(json.dumps(result.model_dump(), indent=2))
-        print("=" * 70 + "\n")
-        
-        # Check for error response from AI
-        if result.error:
-            print(f"\n⚠️  AI Error: {result.error}\n")
+        try:
+            max_points = parse_max_points(data.get('max_points'))
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': result.error
+                'error': str(e)
             }), 400
         
-        # Validate chart types and y field
-        for q in result.queries:
-            # Check chart type
-            if q.suggested_chart.type not in ['line', 'bar']:
-                error_msg = f"Unsupported chart type: {q.suggested_chart.type}. Only 'line' and 'bar' charts are supported."
-                print(f"\n⚠️  Validation Error: {error_msg}\n")
-                return jsonify({
-                    'success': False,
-                    'error': error_msg
-                }), 400
-            
-            # Check if y is an array (multi-series not allowed)
-            if isinstance(q.suggested_chart.y, list):
-                error_msg = "Multi-series charts are not supported. Please request a single metric to visualize."
-                print(f"\n⚠️  Validation Error: {error_msg}\n")
-                return jsonify({
-                    'success': False,
-                    'error': error_msg
-                }), 400
-        
-        # Helper function to transform data to Plotly format
-        def transform_to_plotly(data, x_key, y_key, chart_type, title):
-            """Transform query data to Plotly format"""
-            if not data or len(data) == 0:
-                return None
-            
-            x_values = []
-            y_values = []
-            
-            for row in data:
-                # Try to find the x and y values in the row (case-insensitive)
-                x_value = None
-                y_value = None
-                
-                # Try exact match first
-                if x_key in row:
-                    x_value = row[x_key]
-                elif x_key.lower() in {k.lower(): k for k in row.keys()}:
-                    x_value = row[{k.lower(): k for k in row.keys()}[x_key.lower()]]
-                
-                if y_key in row:
-                    y_value = row[y_key]
-                elif y_key.lower() in {k.lower(): k for k in row.keys()}:
-                    y_value = row[{k.lower(): k for k in row.keys()}[y_key.lower()]]
-                
-                # Fallback to first/second column if keys not found
-                if x_value is None and len(row) > 0:
-                    x_value = list(row.values())[0]
-                if y_value is None and len(row) > 1:
-                    y_value = list(row.values())[1]
-                
-                if x_value is not None and y_value is not None:
-                    x_values.append(x_value)
-                    try:
-                        y_values.append(float(y_value))
-                    except (ValueError, TypeError):
-                        y_values.append(0)
-            
-            if len(x_values) == 0 or len(y_values) == 0:
-                return None
-            
-            plotly_obj = {
-                'x': x_values,
-                'y': y_values,
-                'type': 'scatter' if chart_type == 'line' else 'bar',
-                'name': title
-            }
-            
-            # Only add mode for line charts
-            if chart_type == 'line':
-                plotly_obj['mode'] = 'lines'
-            
-            return plotly_obj
-        
-        # Execute SQL queries and get data
-        queries_with_data = []
-        for q in result.queries:
-            try:
-                # Execute the SQL query
-                con = get_connection()
-                
-                # Execute query and get result
-                db_result = con.execute(q.sql)
-                query_result = db_result.fetchall()
-                
-                # Get column names from DuckDB result
-                # DuckDB result has .columns attribute
-                try:
-                    columns = db_result.columns if hasattr(db_result, 'columns') else []
-                except:
-                    columns = []
-                
-                # If columns not available, try to get from DataFrame
-                if not columns:
-                    try:
-                        df = con.execute(q.sql).df()
-                        columns = df.columns.tolist()
-                        query_result = df.to_dict('records')
-                    except:
-                        pass
-                
-                # Convert to list of dicts
-                data = []
-                if columns and query_result:
-                    if isinstance(query_result[0], dict):
-                        # Already in dict format (from DataFrame)
-                        data = query_result
-                    else:
-                        # Convert tuple rows to dicts
-                        for row in query_result:
-                            data.append(dict(zip(columns, row)))
-                elif query_result:
-                    # Fallback: use generic column names
-                    if isinstance(query_result[0], dict):
-                        data = query_result
-                    else:
-                        columns = [f"col_{i}" for i in range(len(query_result[0]))]
-                        for row in query_result:
-                            data.append(dict(zip(columns, row)))
-                
-                con.close()
-                
-                # Print data to terminal
-                print(f"\nQuery '{q.name}' executed successfully:")
-                print(f"  Rows returned: {len(data)}")
-                if data:
-                    print(f"  Sample row: {data[0]}")
-                
-                # Transform to Plotly format
-                plotly_data = None
-                if data and isinstance(q.suggested_chart.y, str):  # Only single y-axis supported
-                    plotly_data = transform_to_plotly(
-                        data,
-                        q.suggested_chart.x,
-                        q.suggested_chart.y,
-                        q.suggested_chart.type,
-                        q.suggested_chart.title
-                    )
-                
-                queries_with_data.append({
-                    'name': q.name,
-                    'sql': q.sql,
-                    'data': data,  # Keep raw data for reference
-                    'plotly_data': plotly_data,  # Add Plotly-ready data
-                    'suggested_chart': {
-                        'type': q.suggested_chart.type,
-                        'x': q.suggested_chart.x,
-                        'y': q.suggested_chart.y,
-                        'title': q.suggested_chart.title
-                    }
-                })
-            except Exception as e:
-                error_msg = f"Error executing query '{q.name}': {str(e)}"
-                print(f"\n{error_msg}\n")
-                queries_with_data.append({
-                    'name': q.name,
-                    'sql': q.sql,
-                    'data': [],
-                    'plotly_data': None,
-                    'error': error_msg,
-                    'suggested_chart': {
-                        'type': q.suggested_chart.type,
-                        'x': q.suggested_chart.x,
-                        'y': q.suggested_chart.y,
-                        'title': q.suggested_chart.title
-                    }
-                })
-        
-        # Return response to frontend
-        return jsonify({
-            'success': True,
-            'queries': queries_with_data
-        })
+        # Identical questions already being answered share that response
+        (body, status), shared = _chat_flight.do(
+            (normalize_question(user_input), max_points), _chat_response, user_input, max_points
+        )
+        if shared:
+            print(f"\nCoalesced with an in-flight identical request: {user_input}\n")
+        return jsonify(body), status
         
+    except Overloaded as e:
+        return _overloaded(e)
     except Exception as e:
         error_msg = str(e)
         print(f"\nError processing query: {error_msg}\n")
@@ -327,11 +367,122 @@ def chat():
             'error': error_msg
         }), 500
     
+def _sse(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {current_app.json.dumps(data)}\n\n"
+
+@api.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming chat over Server-Sent Events
+    Expected JSON body: same as /chat
+    Each generated query starts executing as soon as its JSON object is
+    complete, while Gemini is still generating the rest. Events:
+        query: {"index": 0, "name": ..., "sql": ..., "data": [...], "plotly_data": ..., "suggested_chart": ...}
+               (with "error" if the query or its chart failed; may arrive out of order)
+        error: {"error": "..."}  out-of-scope request or generation failure
+        done:  {"count": 2}
+    A question the intent router matches gets one query event, from its
+    canned query, without calling Gemini.
+    """
+    data = request.get_json() or {}
+    user_input = data.get('user_input')
+    
+    if not user_input:
+        return jsonify({
+            'success': False,
+            'error': 'user_input is required'
+        }), 400
+    
+    try:
+        max_points = parse_max_points(data.get('max_points'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        release_slot = scheduler.acquire('chat')
+    except Overloaded as e:
+        return _overloaded(e)
+    
+    events = queue.Queue()
+    
+    def start(index, q):
+        """Start running a streamed query; its event is sent when it finishes"""
+        error_msg = chart_error(q)
+        if error_msg:
+            future = Future()
+            future.set_result(shape_result(q, error=error_msg))
+        else:
+            future = submit_query(q, max_points)
+        future.add_done_callback(lambda f: events.put(('query', {'index': index, **f.result()})))
+        return future
+    
+    def produce():
+        futures = []
+        try:
+            entry = _routed_entry(user_input, max_points)
+            if entry is not None:
+                future = Future()
+                future.set_result(entry)
+                futures.append(future)
+                events.put(('query', {'index': 0, **entry}))
+                return
+            # Only questions the router can't answer need Gemini
+            wrapper = get_wrapper()
+            for item in wrapper.query_stream(user_input):
+                if isinstance(item, QueryResponse):
+                    # Its queries have all been yielded (and started) before it
+                    if item.error:
+                        events.put(('error', {'error': item.error}))
+                    continue
+                futures.append(start(len(futures), item))
+        except Exception as e:
+            print(f"\nError streaming query: {e}\n")
+            events.put(('error', {'error': str(e)}))
+        finally:
+            wait(futures)
+            release_slot()
+            events.put(('done', {'count': len(futures)}))
+            events.put(None)
+    
+    print(f"\nStreaming User Query: {user_input}")
+    threading.Thread(target=produce, name="chat-stream", daemon=True).start()
+    
+    def generate():
+        while True:
+            event = events.get()
+            if event is None:
+                return
+            yield _sse(*event)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _parse_approximate(value):
+    """true/false from a query string or JSON body; None if unrecognised"""
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ('true', '1'):
+        return True
+    if str(value).lower() in ('false', '0'):
+        return False
+    return None
+
 @api.route('/key-insights', methods=['GET'])
 def profile_report():
     try:
         # Get query from query parameter
         query = request.args.get('query')
+        # "auto" (default), "pushdown" (stats in DuckDB), "streaming" or "pandas"
+        mode = request.args.get('mode', 'auto')
+        # "true"/"false" forces sketches on or off; omitted decides by estimated row count
+        approximate = request.args.get('approximate')
         
         if not query:
             return jsonify({
@@ -339,20 +490,111 @@ def profile_report():
                 'error': 'query parameter is required'
             }), 400
         
-        # Call get_key_insights with the query
-        insights = get_key_insights(query)
+        if mode not in INSIGHT_MODES:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown mode: {mode}',
+                'available_modes': list(INSIGHT_MODES)
+            }), 400
+
+        if approximate is not None:
+            approximate = _parse_approximate(approximate)
+            if approximate is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'approximate must be true or false'
+                }), 400
+
+        # Profile in an insights worker process, as a job this request waits for;
+        # identical concurrent requests share one job
+        job = run_job(query, mode=mode, approximate=approximate)
+        if job.status != 'done':
+            return jsonify({
+                'success': False,
+                'error': job.error
+            }), 504 if job.status == 'timed_out' else 500
         
         return jsonify({
             'success': True,
-            'data': insights
+            'data': job.result
         })
         
+    except Overloaded as e:
+        return _overloaded(e)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@api.route('/key-insights/jobs', methods=['POST'])
+def submit_insights_job():
+    """
+    Profile a query in a background worker process
+    Expected JSON body:
+    {
+        "query": "SELECT ...",
+        "mode": "auto",          # Optional, as for /key-insights
+        "approximate": true      # Optional, as for /key-insights
+    }
+    Returns a job id to poll with GET /key-insights/jobs/<job_id>
+    """
+    try:
+        data = request.get_json() or {}
+        query = data.get('query')
+        mode = data.get('mode', 'auto')
+        approximate = data.get('approximate')
+
+        if not query:
+            return jsonify({
+                'success': False,
+                'error': 'query is required'
+            }), 400
+
+        if mode not in INSIGHT_MODES:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown mode: {mode}',
+                'available_modes': list(INSIGHT_MODES)
+            }), 400
+
+        if approximate is not None:
+            approximate = _parse_approximate(approximate)
+            if approximate is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'approximate must be true or false'
+                }), 400
+
+        job, deduplicated = submit_job(query, mode=mode, approximate=approximate)
+        return jsonify({
+            'success': True,
+            'deduplicated': deduplicated,
+            **job.to_dict(include_result=False)
+        }), 202
+
+    except Overloaded as e:
+        return _overloaded(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api.route('/key-insights/jobs/<job_id>', methods=['GET'])
+def insights_job_status(job_id):
+    """Status, current stage and (once done) result of a background insights job"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': f'Unknown or expired job: {job_id}'
+        }), 404
+    return jsonify({
+        'success': True,
+        **job.to_dict()
+    })
+
 @api.route('/generate-insights', methods=['POST'])
 def generate_nl_insights():
     """
@@ -0,0 +1,178 @@
+"""
+Admission control and priority scheduling of DuckDB work.
+
+Requests are split into workload classes: interactive dashboard charts
+(QUERY_FUNCTIONS), chat (Gemini-generated SQL) and insights (profiling).
+Each class has its own concurrency slots and its own bounded queue. Classes
+are strictly ordered: a class only starts new work while no higher-priority
+class has requests waiting, so a burst of chat or profiling can't hold up a
+dashboard chart. A request arriving at a full queue, or waiting longer than
+its class allows, is shed with Overloaded, which the routes turn into a 429.
+
+DuckDB's threads and memory_limit belong to the database instance, not to
+a cursor, so they can't differ between two queries in the web process.
+A class's threads/memory_limit are applied where it gets its own
+instance: the insights worker processes (insights_jobs). Inside the web
+process, classes are isolated by their slots and the priority order.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+def _setting(name: str, field: str, default):
+    value = os.getenv(f"SCHED_{name.upper()}_{field.upper()}")
+    if value is None:
+        return default
+    return type(default)(value) if default is not None else value
+
+
+def _workload(name: str, priority: int, slots: int, max_queue: int, max_wait: float,
+              threads: Optional[int] = None, memory_limit: Optional[str] = None) -> dict:
+    """A class's settings; each can be overridden with SCHED_<CLASS>_<FIELD>"""
+    return {
+        "priority": priority,
+        "slots": _setting(name, "slots", slots),
+        "max_queue": _setting(name, "max_queue", max_queue),
+        "max_wait": _setting(name, "max_wait", max_wait),
+        "threads": _setting(name, "threads", threads),
+        "memory_limit": _setting(name, "memory_limit", memory_limit),
+    }
+
+
+# Lower priority runs first. A slot is one request, not one cursor: a
+# dashboard /batch fans out over up to BATCH_WORKERS cursors and a chat
+# request over up to CHAT_QUERY_WORKERS plus the validator's, so the classes
+# can still use up db_pool's cursors together. A request that finds none
+# waits up to db_pool.CHECKOUT_TIMEOUT for one.
+WORKLOAD_CLASSES = {
+    "dashboard": _workload("dashboard", priority=0, slots=4, max_queue=32, max_wait=5.0),
+    "chat": _workload("chat", priority=1, slots=3, max_queue=8, max_wait=30.0),
+    # memory_limit defaults to half of the worker's INSIGHTS_JOB_MEMORY_MB
+    "insights": _workload("insights", priority=2, slots=1, max_queue=2, max_wait=60.0, threads=2),
+}
+
+
+class Overloaded(RuntimeError):
+    """A workload class's queue is full or its wait limit passed; retry later"""
+
+    def __init__(self, workload: str, reason: str, retry_after: float):
+        super().__init__(f"Server busy ({workload} {reason}); retry in {retry_after:g}s")
+        self.workload = workload
+        self.retry_after = retry_after
+
+
+class _Class:
+    __slots__ = ("name", "priority", "slots", "max_queue", "max_wait",
+                 "running", "waiting", "admitted", "shed", "wait_time", "longest_wait")
+
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.priority = config["priority"]
+        self.slots = config["slots"]
+        self.max_queue = config["max_queue"]
+        self.max_wait = config["max_wait"]
+        self.running = self.waiting = self.admitted = self.shed = 0
+        self.wait_time = self.longest_wait = 0.0
+
+
+class Scheduler:
+    """Per-class slots and queues, with strict priority between classes"""
+
+    def __init__(self, classes: Dict[str, dict] = WORKLOAD_CLASSES):
+        self.classes = {name: _Class(name, config) for name, config in classes.items()}
+        self._cond = threading.Condition()
+
+    def _can_start(self, cls: _Class) -> bool:
+        if cls.running >= cls.slots:
+            return False
+        return not any(other.waiting for other in self.classes.values() if other.priority < cls.priority)
+
+    def acquire(self, workload: str, shed: bool = True, max_wait: Optional[float] = None) -> Callable[[], None]:
+        """
+        Wait for a slot of the class and return the function releasing it.
+        Raises Overloaded if the queue is full (unless shed=False) or no slot
+        frees up within max_wait (default: the class's).
+        """
+        cls = self.classes[workload]
+        max_wait = cls.max_wait if max_wait is None else max_wait
+        start = time.monotonic()
+        with self._cond:
+            if shed and cls.waiting >= cls.max_queue and not self._can_start(cls):
+                cls.shed += 1
+                raise Overloaded(workload, "queue full", retry_after=max(1.0, cls.max_wait / 4))
+            cls.waiting += 1
+            try:
+                while not self._can_start(cls):
+                    remaining = start + max_wait - time.monotonic()
+                    if remaining <= 0:
+                        cls.shed += 1
+                        raise Overloaded(workload, "wait limit reached", retry_after=max(1.0, cls.max_wait / 4))
+                    self._cond.wait(remaining)
+            finally:
+                cls.waiting -= 1
+                # A class that stopped waiting may unblock lower priorities
+                self._cond.notify_all()
+            cls.running += 1
+            cls.admitted += 1
+            waited = time.monotonic() - start
+            cls.wait_time += waited
+            cls.longest_wait = max(cls.longest_wait, waited)
+
+        released = False
+
+        def release():
+            nonlocal released
+            with self._cond:
+                if released:
+                    return
+                released = True
+                cls.running -= 1
+                self._cond.notify_all()
+
+        return release
+
+    @contextmanager
+    def slot(self, workload: str, shed: bool = True, max_wait: Optional[float] = None):
+        """Hold a slot of the class for the duration of a ``with`` block"""
+        release = self.acquire(workload, shed=shed, max_wait=max_wait)
+        try:
+            yield
+        finally:
+            release()
+
+    def run(self, workload: str, fn: Callable, *args, **kwargs):
+        """fn(*args, **kwargs) in a slot of the class"""
+        with self.slot(workload):
+            return fn(*args, **kwargs)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                cls.name: {
+                    "priority": cls.priority,
+                    "slots": cls.slots,
+                    "max_queue": cls.max_queue,
+                    "running": cls.running,
+                    "waiting": cls.waiting,
+                    "admitted": cls.admitted,
+                    "shed": cls.shed,
+                    "avg_wait": cls.wait_time / cls.admitted if cls.admitted else 0.0,
+                    "longest_wait": cls.longest_wait,
+                }
+                for cls in self.classes.values()
+            }
+
+
+def apply_settings(con, workload: str):
+    """Set a class's DuckDB threads/memory_limit on a connection (affects its whole instance)"""
+    config = WORKLOAD_CLASSES[workload]
+    if config["threads"]:
+        con.execute(f"SET threads = {int(config['threads'])}")
+    if config["memory_limit"]:
+        con.execute("SET memory_limit = ?", [str(config["memory_limit"])])
+
+
+scheduler = Scheduler()
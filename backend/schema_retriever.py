@@ -0,0 +1,171 @@
+"""
+Offline table retrieval for the Gemini prompt.
+
+Instead of sending every table and column description with every question,
+GeminiSQLWrapper asks a SchemaRetriever for the tables relevant to it. Each
+table is indexed as one TF-IDF document built from its name, column names
+and descriptions; a question is scored against every table (cosine
+similarity plus a bonus for using the words of the table name), the top-k
+tables are kept and then expanded along FK-style joins (shared *_id columns)
+so the model can still join to the tables it needs. Everything runs in-process on
+the schema already loaded, with no model calls.
+"""
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, List
+
+# Most tables sent to Gemini per question before join expansion; 0 disables pruning
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "3"))
+# Tables scoring below this fraction of the best table are left out
+MIN_RELATIVE_SCORE = 0.35
+# Added to a table's score in proportion to how much of its name the question uses
+NAME_BONUS = 0.5
+
+# Field weights: how many times a token from each field counts in a document
+TABLE_NAME_WEIGHT = 3
+TABLE_DESCRIPTION_WEIGHT = 2
+COLUMN_NAME_WEIGHT = 2
+COLUMN_DESCRIPTION_WEIGHT = 1
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "each", "for", "from", "give", "how", "i",
+    "in", "is", "it", "me", "much", "my", "of", "on", "or", "over", "per", "plot", "show",
+    "the", "their", "to", "vs", "versus", "was", "what", "which", "with", "chart", "graph",
+    "id", "unique", "usd", "amount", "total", "date",
+}
+
+# Everyday words mapped to the vocabulary the schema uses
+_SYNONYMS = {
+    "sale": "revenue",
+    "income": "revenue",
+    "earning": "revenue",
+    "client": "customer",
+    "buyer": "customer",
+    "staff": "employee",
+    "worker": "employee",
+    "wage": "salary",
+    "pay": "payroll",
+    "spending": "expense",
+    "cost": "expense",
+    "item": "product",
+    "ad": "marketing",
+    "advertising": "marketing",
+}
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("ly"):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with snake_case split, light stemming and synonyms"""
+    words = re.findall(r"[a-z0-9]+", (text or "").lower().replace("_", " "))
+    tokens = []
+    for word in words:
+        word = _stem(word)
+        word = _SYNONYMS.get(word, word)
+        if word not in _STOPWORDS:
+            tokens.append(word)
+    return tokens
+
+
+def _table_tokens(table: dict) -> List[str]:
+    tokens = tokenize(table["table"]) * TABLE_NAME_WEIGHT
+    tokens += tokenize(table.get("description")) * TABLE_DESCRIPTION_WEIGHT
+    for col in table["columns"]:
+        tokens += tokenize(col["name"]) * COLUMN_NAME_WEIGHT
+        tokens += tokenize(col.get("description")) * COLUMN_DESCRIPTION_WEIGHT
+    return tokens
+
+
+def join_graph(schema: List[dict]) -> Dict[str, set]:
+    """
+    Tables linked by FK-style joins: a column named like another table's key
+    (its first column, when that ends in _id) links the two tables.
+    """
+    keys = {}
+    for table in schema:
+        first = table["columns"][0]["name"] if table["columns"] else ""
+        if first.endswith("_id"):
+            keys[first] = table["table"]
+    graph = {table["table"]: set() for table in schema}
+    for table in schema:
+        for col in table["columns"]:
+            parent = keys.get(col["name"])
+            if parent and parent != table["table"]:
+                graph[table["table"]].add(parent)
+                graph[parent].add(table["table"])
+    return graph
+
+
+class SchemaRetriever:
+    """TF-IDF + keyword index over the tables of a schema (as from db_utils)"""
+
+    def __init__(self, schema: List[dict], top_k: int = SCHEMA_TOP_K):
+        self.schema = schema
+        self.top_k = top_k
+        self.tables = [table["table"] for table in schema]
+        self.joins = join_graph(schema)
+
+        counts = [Counter(_table_tokens(table)) for table in schema]
+        df = Counter(token for c in counts for token in c)
+        n = len(schema)
+        self.idf = {token: math.log((1 + n) / (1 + d)) + 1 for token, d in df.items()}
+        self.vectors = [self._weigh(c) for c in counts]
+        self.name_tokens = [set(tokenize(name)) for name in self.tables]
+
+    def _weigh(self, counts: Counter) -> Dict[str, float]:
+        """L2-normalized TF-IDF vector; tokens not in the index are dropped"""
+        vector = {t: (1 + math.log(c)) * self.idf[t] for t, c in counts.items() if t in self.idf}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {t: w / norm for t, w in vector.items()}
+
+    def scores(self, question: str) -> Dict[str, float]:
+        tokens = tokenize(question)
+        query = self._weigh(Counter(tokens))
+        present = set(tokens)
+        scores = {}
+        for name, vector, name_tokens in zip(self.tables, self.vectors, self.name_tokens):
+            score = sum(w * vector.get(t, 0.0) for t, w in query.items())
+            if name_tokens:
+                score += NAME_BONUS * len(name_tokens & present) / len(name_tokens)
+            scores[name] = score
+        return scores
+
+    def retrieve(self, question: str) -> List[str]:
+        """
+        Names of the tables to show the model, in schema order. Falls back to
+        every table when pruning is off or nothing in the question matches.
+        """
+        scores = self.scores(question)
+        best = max(scores.values(), default=0.0)
+        if self.top_k <= 0 or best <= 0:
+            return list(self.tables)
+
+        ranked = sorted(self.tables, key=lambda name: -scores[name])
+        selected = {name for name in ranked[:self.top_k] if scores[name] >= best * MIN_RELATIVE_SCORE}
+
+        # Join expansion: neighbours that match the question at all, and
+        # tables bridging two selected tables (e.g. order_items between
+        # orders and products)
+        expanded = set(selected)
+        for name in self.tables:
+            if name in selected:
+                continue
+            linked = self.joins[name] & selected
+            if (linked and scores[name] > 0) or len(linked) >= 2:
+                expanded.add(name)
+        return [name for name in self.tables if name in expanded]
+
+    def prune(self, question: str) -> List[dict]:
+        """The schema entries for retrieve(question)"""
+        keep = set(self.retrieve(question))
+        return [table for table in self.schema if table["table"] in keep]
@@ -0,0 +1,368 @@
+"""
+Mergeable, fixed-memory accumulators for profiling data in batches.
+
+Every class takes numpy arrays through update() and can be combined with
+another instance of the same shape through merge(), so a result can be
+profiled batch by batch (or in parallel) without holding it in memory.
+"""
+import math
+from typing import Dict, Hashable, Iterable, Optional
+
+import numpy as np
+
+
+class Moments:
+    """Count, mean, variance (Welford/Chan), min and max of a numeric stream"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _combine(self, count, mean, m2, lo, hi):
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, lo)
+        self.max = max(self.max, hi)
+
+    def update(self, values: np.ndarray):
+        """values: float array without NaNs"""
+        if len(values):
+            mean = float(values.mean())
+            self._combine(len(values), mean, float(((values - mean) ** 2).sum()),
+                          float(values.min()), float(values.max()))
+
+    def merge(self, other: "Moments"):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def sum(self) -> float:
+        return self.mean * self.count
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation (ddof=1, as in pandas)"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+
+class StreamingHistogram:
+    """
+    Equal-width histogram over a range that is not known up front.
+
+    The bin count is fixed; when a value falls outside the covered range the
+    bin width doubles and neighbouring bins are merged, so memory stays
+    constant and bins stay aligned.
+    """
+
+    def __init__(self, bins: int = 256):
+        if bins % 2:
+            raise ValueError("bins must be even")
+        self.bins = bins
+        self.lo: Optional[float] = None
+        self.width: Optional[float] = None
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def _double(self, grow_down: bool):
+        merged = self.counts.reshape(-1, 2).sum(axis=1)
+        pad = np.zeros(self.bins // 2, dtype=np.int64)
+        if grow_down:
+            self.counts = np.concatenate([pad, merged])
+            self.lo -= self.bins * self.width
+        else:
+            self.counts = np.concatenate([merged, pad])
+        self.width *= 2
+
+    def _cover(self, lo: float, hi: float):
+        if self.lo is None:
+            span = hi - lo
+            self.lo = lo
+            self.width = span / self.bins * (1 + 1e-9) if span > 0 else max(abs(lo), 1.0) * 1e-9
+        while lo < self.lo:
+            self._double(grow_down=True)
+        while hi >= self.lo + self.bins * self.width:
+            self._double(grow_down=False)
+
+    def update(self, values: np.ndarray, weights: Optional[np.ndarray] = None):
+        """values: float array without NaNs"""
+        if not len(values):
+            return
+        self._cover(float(values.min()), float(values.max()))
+        idx = np.clip(((values - self.lo) / self.width).astype(np.int64), 0, self.bins - 1)
+        self.counts += np.bincount(idx, weights=weights, minlength=self.bins).astype(np.int64)
+
+    def merge(self, other: "StreamingHistogram"):
+        if other.lo is None:
+            return
+        centers = other.lo + (np.arange(other.bins) + 0.5) * other.width
+        nonzero = other.counts > 0
+        self.update(centers[nonzero], other.counts[nonzero])
+
+    def rebin(self, lo: float, hi: float, bins: int):
+        """
+        Counts and edges for `bins` equal-width bins over [lo, hi], assuming
+        values are spread evenly inside each internal bin.
+        """
+        if lo == hi:
+            lo, hi = lo - 0.5, hi + 0.5
+        edges = np.linspace(lo, hi, bins + 1)
+        if self.lo is None:
+            return np.zeros(bins, dtype=np.int64), edges
+        internal = self.lo + np.arange(self.bins + 1) * self.width
+        cumulative = np.concatenate([[0], np.cumsum(self.counts)])
+        at_edges = np.round(np.interp(edges, internal, cumulative)).astype(np.int64)
+        at_edges[-1] = cumulative[-1]
+        return np.diff(at_edges), edges
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty 2016).
+
+    Keeps O(k log(n/k)) items. rank_error is 2.3 / k: the worst rank error
+    measured over 20 seeds x 99 quantiles of 1M values was 0.19% at k=1000
+    (streaming_profiler.QUANTILE_SKETCH_K, reported as 0.23%) and 1.1% at
+    the default k=200.
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self) -> float:
+        return 2.3 / self.k
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            level = next(
+                (h for h in range(len(self.levels)) if len(self.levels[h]) > self._capacity(h)),
+                None,
+            )
+            if level is None:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            leftover = items[-1:] if len(items) % 2 else items[:0]
+            items = items[:len(items) - len(leftover)]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = leftover
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def update(self, values: np.ndarray):
+        """values: float array without NaNs"""
+        if len(values):
+            self.n += len(values)
+            self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64)])
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+
+    def quantiles(self, qs: Iterable[float]) -> list:
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return [math.nan for _ in qs]
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, weights = items[order], weights[order]
+        # Place each item at the middle of its weight and interpolate; with
+        # unit weights this is the same as quantile_cont / pandas' linear rule
+        total = weights.sum()
+        positions = (np.cumsum(weights) - weights / 2 - 0.5) / max(total - 1, 1)
+        return [float(np.interp(q, positions, items)) for q in qs]
+
+
+class HeavyHitters:
+    """
+    Frequent-items summary that keeps the `capacity` largest counters after
+    every update (a mergeable Space-Saving variant). Counts are exact while
+    the number of distinct values fits; otherwise a reported count may be
+    short by at most `error`.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.counts: Dict[Hashable, int] = {}
+        self.error = 0
+
+    def update(self, values: Iterable[Hashable], counts: Iterable[int]):
+        for value, count in zip(values, counts):
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+        self._trim()
+
+    def merge(self, other: "HeavyHitters"):
+        self.update(other.counts.keys(), other.counts.values())
+        self.error += other.error
+
+    def _trim(self):
+        if len(self.counts) <= self.capacity:
+            return
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        # A value dropped now may come back later without its earlier count
+        self.error += ranked[self.capacity][1]
+        self.counts = dict(ranked[:self.capacity])
+
+    def top(self, k: int) -> list:
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter over 64-bit hashes (Flajolet et al. 2007,
+    with linear counting for small cardinalities).
+    Relative standard error is 1.04 / sqrt(2**p), about 0.8% for p=14.
+    Like HLL++'s sparse mode, the distinct hashes themselves are kept until
+    there are more than 2**p of them, so small inputs are counted exactly.
+    """
+
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self.sparse: Optional[np.ndarray] = np.empty(0, dtype=np.uint64)
+
+    @property
+    def relative_error(self) -> float:
+        return 0.0 if self.exact else 1.04 / math.sqrt(self.m)
+
+    @property
+    def exact(self) -> bool:
+        return self.sparse is not None
+
+    def _add_sparse(self, hashes: np.ndarray):
+        if self.sparse is not None:
+            self.sparse = np.union1d(self.sparse, hashes)
+            if len(self.sparse) > self.m:
+                self.sparse = None
+
+    def update(self, hashes: np.ndarray):
+        """hashes: uint64 array of well-mixed hash values"""
+        if not len(hashes):
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        self._add_sparse(hashes)
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Position of the leftmost 1-bit in the remaining 64-p bits
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if other.sparse is None:
+            self.sparse = None
+        else:
+            self._add_sparse(other.sparse)
+
+    def count(self) -> int:
+        if self.sparse is not None:
+            return len(self.sparse)
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+
+class PairwiseMoments:
+    """
+    Co-moment sums for the correlation of every column pair, using only rows
+    where both columns are present (pandas' pairwise-complete convention).
+    Values are shifted by the first batch's means for numerical stability.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        self.shift: Optional[np.ndarray] = None
+        self.n = np.zeros((k, k))
+        self.s = np.zeros((k, k))   # s[i, j]: sum of x_i where x_i and x_j present
+        self.q = np.zeros((k, k))   # q[i, j]: sum of x_i**2 where both present
+        self.p = np.zeros((k, k))   # p[i, j]: sum of x_i * x_j
+
+    def update(self, block: np.ndarray):
+        """block: rows x k float array, NaN for missing values"""
+        if not len(block):
+            return
+        present = ~np.isnan(block)
+        if self.shift is None:
+            with np.errstate(invalid="ignore"):
+                counts = present.sum(axis=0)
+                self.shift = np.where(counts > 0, np.nansum(block, axis=0) / np.maximum(counts, 1), 0.0)
+        mask = present.astype(np.float64)
+        x = np.where(present, block - self.shift, 0.0)
+        self.n += mask.T @ mask
+        self.s += x.T @ mask
+        self.q += (x * x).T @ mask
+        self.p += x.T @ x
+
+    def merge(self, other: "PairwiseMoments"):
+        if other.shift is None:
+            return
+        if self.shift is None:
+            self.shift = other.shift
+        elif not np.array_equal(self.shift, other.shift):
+            raise ValueError("Cannot merge PairwiseMoments with different shifts")
+        self.n += other.n
+        self.s += other.s
+        self.q += other.q
+        self.p += other.p
+
+    def correlation(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = self.n * self.p - self.s * self.s.T
+            var = self.n * self.q - self.s ** 2
+            corr = cov / np.sqrt(var * var.T)
+        corr[self.n < 2] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+class Reservoir:
+    """
+    Uniform sample of up to `size` rows of a 2-D stream, kept as the rows with
+    the smallest random keys (bottom-k sampling), so batches and merges stay
+    vectorized.
+    """
+
+    def __init__(self, size: int, seed: Optional[int] = None):
+        self.size = size
+        self.keys = np.empty(0)
+        self.rows: Optional[np.ndarray] = None
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, block: np.ndarray):
+        if not len(block):
+            return
+        self._combine(self._rng.random(len(block)), block)
+
+    def merge(self, other: "Reservoir"):
+        if other.rows is not None:
+            self._combine(other.keys, other.rows)
+
+    def _combine(self, keys, rows):
+        keys = np.concatenate([self.keys, keys])
+        rows = rows if self.rows is None else np.concatenate([self.rows, rows])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, rows = keys[keep], rows[keep]
+        self.keys, self.rows = keys, rows
@@ -0,0 +1,362 @@
+"""
+Key insights computed inside DuckDB.
+
+The user's query runs once, into a TEMP table on the profiling cursor, and
+every per-column statistic is computed by a handful of aggregate queries
+over that table, so the query (joins, filters) isn't re-run by each pass
+and only the small summaries come back to Python. The payload matches
+profiler.profile_dataframe.
+"""
+import re
+import uuid
+from contextlib import contextmanager
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+import db_pool
+from profiler import (
+    HISTOGRAM_BINS, INTERACTION_SAMPLE, SAMPLE_SIZE, TOP_INTERACTIONS, TOP_VALUES,
+    correlation_pairs, mark_approximate, to_python_type,
+)
+
+# Error bounds reported for DuckDB's built-in sketches in approximate mode.
+# approx_count_distinct is a small HyperLogLog (measured standard error ~12%
+# on duckdb 1.4); approx_quantile is a T-Digest, measured well under 1%.
+APPROX_DISTINCT_ERROR = 0.13
+APPROX_QUANTILE_RANK_ERROR = 0.01
+
+# pandas dtype names DuckDB's fetchdf() produces, so "type" reads the same in both modes
+_PANDAS_DTYPES = {
+    "TINYINT": "int8", "SMALLINT": "int16", "INTEGER": "int32", "BIGINT": "int64",
+    "UTINYINT": "uint8", "USMALLINT": "uint16", "UINTEGER": "uint32", "UBIGINT": "uint64",
+    "HUGEINT": "float64", "UHUGEINT": "float64", "FLOAT": "float32", "DOUBLE": "float64",
+    "BOOLEAN": "bool", "DATE": "datetime64[us]", "TIMESTAMP": "datetime64[us]",
+    "TIMESTAMP_S": "datetime64[s]", "TIMESTAMP_MS": "datetime64[ms]",
+    "TIMESTAMP_NS": "datetime64[ns]", "INTERVAL": "timedelta64[ns]",
+}
+
+_NUMERIC = {
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+    "UINTEGER", "UBIGINT", "UHUGEINT", "FLOAT", "DOUBLE",
+}
+_TEMPORAL = {"DATE", "TIMESTAMP", "TIMESTAMP_S", "TIMESTAMP_MS", "TIMESTAMP_NS", "TIMESTAMP WITH TIME ZONE"}
+_CATEGORICAL = {"VARCHAR", "TIME", "UUID", "BLOB", "BIT"}
+
+
+def strip_query(query: str) -> str:
+    """Remove trailing semicolons so the query can be used as a subquery"""
+    return query.strip().rstrip(";").strip()
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_kind(duck_type: str) -> str:
+    """Classify a DuckDB type as numeric, bool, temporal, categorical or other"""
+    base = re.sub(r"\(.*\)$", "", duck_type.upper())
+    if base in _NUMERIC or base == "DECIMAL":
+        return "numeric"
+    if base == "BOOLEAN":
+        return "bool"
+    if base in _TEMPORAL:
+        return "temporal"
+    if base in _CATEGORICAL or base.startswith("ENUM"):
+        return "categorical"
+    return "other"
+
+
+def pandas_dtype(duck_type: str) -> str:
+    base = re.sub(r"\(.*\)$", "", duck_type.upper())
+    if base == "DECIMAL":
+        return "float64"
+    if base == "TIMESTAMP WITH TIME ZONE":
+        return "datetime64[us, UTC]"
+    return _PANDAS_DTYPES.get(base, "object")
+
+
+def _timestamp_str(value) -> str:
+    # pandas prints dates as midnight timestamps; keep the same rendering
+    return str(pd.Timestamp(value))
+
+
+def _sample_strs(values, kind):
+    if kind == "temporal":
+        return [_timestamp_str(v) for v in values]
+    return [str(v) for v in values]
+
+
+@contextmanager
+def _materialized(con, sql: str):
+    """The query's result as a TEMP table (its quoted name), dropped afterwards"""
+    table = quote_ident(f"_profile_{uuid.uuid4().hex}")
+    con.execute(f"CREATE TEMP TABLE {table} AS SELECT * FROM ({sql})")
+    try:
+        yield table
+    finally:
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class _Aggregates:
+    """Collects aggregate expressions for one SELECT and reads them back by key"""
+
+    def __init__(self):
+        self.keys = []
+        self.exprs = []
+
+    def add(self, key, expr):
+        self.keys.append(key)
+        self.exprs.append(expr)
+
+    def run(self, con, source):
+        if not self.exprs:
+            return {}
+        row = con.execute(f"SELECT {', '.join(self.exprs)} FROM {source}").fetchone()
+        return dict(zip(self.keys, row))
+
+
+def profile_query(
+    query: str,
+    approximate: bool = False,
+    db_path: str = db_pool.DEFAULT_DB_PATH,
+    progress: Callable[[str], None] = None,
+) -> dict:
+    """
+    Build the key-insights payload for a query without materializing it in Python.
+    With approximate=True, per-column distinct counts and quantiles come from
+    DuckDB's approx_count_distinct / approx_quantile sketches. progress, if
+    given, is called with the name of each pass as it starts.
+    """
+    sql = strip_query(query)
+    progress = progress or (lambda stage: None)
+
+    with db_pool.cursor(db_path) as con, _materialized(con, sql) as source:
+        schema = [(row[0], row[1]) for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+        kinds = {name: column_kind(t) for name, t in schema}
+
+        # -----------------------------
+        # PASS 1: counts, moments, quantiles, samples
+        # -----------------------------
+        progress("statistics")
+        agg = _Aggregates()
+        agg.add("rows", "count(*)")
+        agg.add("distinct_rows", f"(SELECT count(*) FROM (SELECT DISTINCT * FROM {source}))")
+        for name, _ in schema:
+            c, kind = quote_ident(name), kinds[name]
+            agg.add((name, "count"), f"count({c})")
+            agg.add((name, "unique"), f"approx_count_distinct({c})" if approximate else f"count(DISTINCT {c})")
+            if kind in ("numeric", "bool"):
+                x = f"CAST({c} AS DOUBLE)"
+                agg.add((name, "mean"), f"avg({x})")
+                agg.add((name, "std"), f"stddev_samp({x})")
+                agg.add((name, "min"), f"min({x})")
+                agg.add((name, "max"), f"max({x})")
+                if approximate:
+                    agg.add((name, "median"), f"approx_quantile({x}, 0.5)")
+                    agg.add((name, "quartiles"), f"approx_quantile({x}, [0.25, 0.75])")
+                else:
+                    agg.add((name, "median"), f"median({x})")
+                    agg.add((name, "quartiles"), f"quantile_cont({x}, [0.25, 0.75])")
+            if kind in ("numeric", "bool", "temporal"):
+                agg.add((name, "min_samples"), f"min({c}, {SAMPLE_SIZE})")
+                agg.add((name, "max_samples"), f"max({c}, {SAMPLE_SIZE})")
+            if kind == "temporal":
+                agg.add((name, "first"), f"min({c})")
+                agg.add((name, "last"), f"max({c})")
+            if kind == "categorical":
+                agg.add((name, "chars"), f"sum(strlen({c}::VARCHAR))")
+        stats = agg.run(con, source)
+        row_count = stats["rows"]
+
+        # -----------------------------
+        # PASS 2: histograms (bucketed counts)
+        # -----------------------------
+        progress("histograms")
+        hist_agg = _Aggregates()
+        edges = {}
+        for name, _ in schema:
+            if kinds[name] not in ("numeric", "bool") or not stats[(name, "count")]:
+                continue
+            lo, hi = stats[(name, "min")], stats[(name, "max")]
+            if lo == hi:
+                # Same convention as np.histogram for a constant column
+                lo, hi = lo - 0.5, hi + 0.5
+            edges[name] = np.linspace(lo, hi, HISTOGRAM_BINS + 1)
+            x = f"CAST({quote_ident(name)} AS DOUBLE)"
+            scale = HISTOGRAM_BINS / (hi - lo)
+            hist_agg.add(name, (
+                f"histogram(least(floor(({x} - {lo!r}) * {scale!r})::INTEGER, {HISTOGRAM_BINS - 1})) "
+                f"FILTER (WHERE NOT isnan({x}))"
+            ))
+        histograms = hist_agg.run(con, source)
+
+        # -----------------------------
+        # PASS 3: top values for categorical columns
+        # -----------------------------
+        progress("top_values")
+        categorical = [name for name, _ in schema if kinds[name] == "categorical"]
+        top_values = {name: [] for name in categorical}
+        if categorical:
+            cols = ", ".join(quote_ident(n) for n in categorical)
+            sets = ", ".join(f"({quote_ident(n)})" for n in categorical)
+            values = ", ".join(f"{quote_ident(n)}::VARCHAR" for n in categorical)
+            rows = con.execute(f"""
+                SELECT GROUPING_ID({cols}) AS _gid, {values}, count(*) AS _n
+                FROM {source}
+                GROUP BY GROUPING SETS ({sets})
+                QUALIFY row_number() OVER (PARTITION BY _gid ORDER BY _n DESC) <= {TOP_VALUES + 1}
+                ORDER BY _gid, _n DESC
+            """).fetchall()
+            for row in rows:
+                # GROUPING_ID sets a bit for every column *not* in the grouping set
+                gid = row[0]
+                idx = next(i for i in range(len(categorical))
+                           if not gid & (1 << (len(categorical) - 1 - i)))
+                name, value = categorical[idx], row[1 + idx]
+                if value is not None and len(top_values[name]) < TOP_VALUES:
+                    top_values[name].append({"value": value, "count": row[-1]})
+
+        # -----------------------------
+        # PASS 4: correlations between numeric columns
+        # -----------------------------
+        progress("correlations")
+        numeric_cols = [name for name, _ in schema if kinds[name] == "numeric"]
+        corr_agg = _Aggregates()
+        for i, a in enumerate(numeric_cols):
+            for b in numeric_cols[i + 1:]:
+                corr_agg.add((a, b), f"corr(CAST({quote_ident(a)} AS DOUBLE), CAST({quote_ident(b)} AS DOUBLE))")
+        pair_corr = corr_agg.run(con, source) if len(numeric_cols) > 1 else {}
+
+        insights = {
+            "overview": {
+                "row_count": row_count,
+                "column_count": len(schema),
+                "memory_usage": estimate_memory(
+                    schema, kinds, row_count,
+                    {name: stats[(name, "count")] for name, _ in schema},
+                    {name: stats.get((name, "chars")) for name, _ in schema},
+                ) / 1024**2,  # MB
+                "duplicate_rows": row_count - stats["distinct_rows"],
+            },
+            "columns": [],
+        }
+
+        for name, duck_type in schema:
+            kind = kinds[name]
+            count = stats[(name, "count")]
+            missing = row_count - count
+            col_data = {
+                "name": name,
+                "type": pandas_dtype(duck_type),
+                "missing": missing,
+                "missing_percent": float(missing / row_count * 100) if row_count > 0 else 0,
+                "unique": min(stats[(name, "unique")], count),
+            }
+            if approximate:
+                col_data["approximate"] = {
+                    "unique": {"method": "approx_count_distinct", "relative_error": APPROX_DISTINCT_ERROR},
+                }
+                if kind in ("numeric", "bool") and count:
+                    for field in ("median", "q25", "q75"):
+                        col_data["approximate"][field] = {
+                            "method": "approx_quantile", "rank_error": APPROX_QUANTILE_RANK_ERROR,
+                        }
+
+            if (name, "min_samples") in stats:
+                col_data["min_samples"] = _sample_strs(stats[(name, "min_samples")] or [], kind)
+                col_data["max_samples"] = _sample_strs(stats[(name, "max_samples")] or [], kind)
+
+            if kind in ("numeric", "bool"):
+                if count:
+                    q25, q75 = stats[(name, "quartiles")]
+                    col_data["stats"] = {
+                        "mean": stats[(name, "mean")],
+                        "median": stats[(name, "median")],
+                        "std": stats[(name, "std")] if stats[(name, "std")] is not None else float("nan"),
+                        "min": stats[(name, "min")],
+                        "max": stats[(name, "max")],
+                        "q25": q25,
+                        "q75": q75,
+                    }
+                    hist = histograms.get(name) or {}
+                    col_data["histogram"] = {
+                        "counts": [int(hist.get(i, 0)) for i in range(HISTOGRAM_BINS)],
+                        "bins": edges[name].tolist(),
+                    }
+                else:
+                    col_data["stats"] = None
+            elif kind == "categorical":
+                col_data["top_values"] = top_values[name]
+            elif kind == "temporal" and count:
+                col_data["stats"] = {
+                    "min": _timestamp_str(stats[(name, "first")]),
+                    "max": _timestamp_str(stats[(name, "last")]),
+                }
+
+            insights["columns"].append(col_data)
+
+        # -----------------------------
+        # CORRELATION MATRIX
+        # -----------------------------
+        if len(numeric_cols) > 1:
+            def corr(a, b):
+                if a == b:
+                    std = stats[(a, "std")]
+                    return 1.0 if std else float("nan")
+                value = pair_corr[(a, b)] if (a, b) in pair_corr else pair_corr[(b, a)]
+                return float("nan") if value is None else value
+
+            matrix = [[corr(a, b) for b in numeric_cols] for a in numeric_cols]
+            insights["correlation_matrix"] = {
+                "columns": numeric_cols,
+                "data": matrix,
+            }
+            insights["correlations"] = correlation_pairs(numeric_cols, matrix)
+        else:
+            insights["correlation_matrix"] = None
+            insights["correlations"] = []
+
+        # -----------------------------
+        # TOP INTERACTIONS (sampled inside DuckDB)
+        # -----------------------------
+        if len(numeric_cols) >= 2:
+            progress("interactions")
+            insights["interactions"] = []
+            for pair in insights["correlations"][:TOP_INTERACTIONS]:
+                a, b = quote_ident(pair["col1"]), quote_ident(pair["col2"])
+                points = con.execute(f"""
+                    SELECT * FROM (
+                        SELECT CAST({a} AS DOUBLE) AS x, CAST({b} AS DOUBLE) AS y
+                        FROM {source}
+                        WHERE {a} IS NOT NULL AND {b} IS NOT NULL
+                    ) USING SAMPLE reservoir({INTERACTION_SAMPLE} ROWS)
+                """).fetchall()
+                insights["interactions"].append({
+                    "col1": pair["col1"],
+                    "col2": pair["col2"],
+                    "correlation": pair["correlation"],
+                    "data": [{"x": x, "y": y} for x, y in points],
+                })
+
+    return to_python_type(mark_approximate(insights))
+
+
+def estimate_memory(schema, kinds, rows, counts, chars) -> float:
+    """
+    Approximate what DataFrame.memory_usage(deep=True) would report, in bytes.
+    counts and chars map column names to non-null counts and string lengths.
+    """
+    total = 128  # RangeIndex
+    for name, duck_type in schema:
+        if kinds[name] == "categorical":
+            count = counts[name]
+            # 8-byte pointer per row, ~49 bytes per str object plus its characters
+            total += rows * 8 + count * 49 + (chars.get(name) or 0) + (rows - count) * 16
+            continue
+        try:
+            total += rows * np.dtype(pandas_dtype(duck_type)).itemsize
+        except TypeError:
+            total += rows * 8
+    return total
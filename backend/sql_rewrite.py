@@ -0,0 +1,112 @@
+"""
+Projection pruning for generated chart queries.
+
+The chat prompt asks Gemini for SELECT * queries, but a chart only reads its
+x and y columns. prune_projection parses the statement with DuckDB's
+json_serialize_sql, replaces a bare outer * with just the columns the chart
+uses and turns the tree back into SQL with json_deserialize_sql. DuckDB then
+scans, and Python then converts and serializes, only those columns.
+
+Whenever the rewrite could change the result, the original SQL is used:
+anything other than one plain SELECT, DISTINCT (fewer columns would merge
+rows), grouping, ORDER BY a position, a * with EXCLUDE/REPLACE/COLUMNS, a
+chart column that the * doesn't produce exactly once, or a rewritten
+statement that fails to bind.
+"""
+import json
+from typing import Iterable, List, Optional, Tuple
+
+import duckdb
+
+
+class _Unsafe(Exception):
+    """The statement can't be narrowed without changing its result"""
+
+
+def _star_select(tree: dict) -> dict:
+    """The bare * of a plain SELECT, or raise _Unsafe"""
+    if tree.get("error"):
+        raise _Unsafe(tree.get("error_message", "parse error"))
+    statements = tree.get("statements") or []
+    if len(statements) != 1:
+        raise _Unsafe("not a single statement")
+    node = statements[0]["node"]
+    if node.get("type") != "SELECT_NODE":
+        raise _Unsafe(f"{node.get('type')} is not a plain SELECT")
+    if any(m.get("type") == "DISTINCT_MODIFIER" for m in node.get("modifiers", [])):
+        raise _Unsafe("DISTINCT")
+    for modifier in node.get("modifiers", []):
+        for order in modifier.get("orders", []):
+            # ORDER BY 2 / #2 / ALL refer to select-list positions, which the rewrite changes
+            if order["expression"].get("class") in ("CONSTANT", "POSITIONAL_REFERENCE", "STAR"):
+                raise _Unsafe("ORDER BY position")
+    if node.get("group_expressions") or node.get("group_sets") or node.get("aggregate_handling") != "STANDARD_HANDLING":
+        raise _Unsafe("grouping")
+    select_list = node.get("select_list") or []
+    if len(select_list) != 1 or select_list[0].get("class") != "STAR":
+        raise _Unsafe("no bare *")
+    star = select_list[0]
+    if (star.get("exclude_list") or star.get("replace_list") or star.get("columns")
+            or star.get("qualified_exclude_list") or star.get("rename_list") or star.get("expr")):
+        raise _Unsafe("* with modifiers")
+    return star
+
+
+def resolve_columns(available: List[str], wanted: Iterable[str]) -> List[str]:
+    """
+    Actual names of the wanted columns, matched exactly and then
+    case-insensitively; raises _Unsafe if one is missing or ambiguous
+    """
+    resolved = []
+    for name in wanted:
+        if available.count(name) == 1:
+            match = name
+        else:
+            matches = [col for col in available if col.lower() == str(name).lower()]
+            if len(matches) != 1:
+                raise _Unsafe(f"column {name!r} is missing or ambiguous")
+            match = matches[0]
+        if match not in resolved:
+            resolved.append(match)
+    return resolved
+
+
+def prune_projection(
+    sql: str,
+    columns: Iterable[str],
+    con: duckdb.DuckDBPyConnection,
+) -> Tuple[str, Optional[dict]]:
+    """
+    Narrow SELECT * to the given columns. Returns (sql to run, report); the
+    report says which columns were dropped, or is None when the original
+    SQL is kept (with the reason printed).
+    """
+    try:
+        tree = json.loads(con.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0])
+        star = _star_select(tree)
+        schema = con.execute(f"DESCRIBE {sql.strip().rstrip(';')}").fetchall()
+        available = [row[0] for row in schema]
+        keep = resolve_columns(available, columns)
+        if len(keep) == len(available):
+            raise _Unsafe("every column is used")
+
+        # A qualified star (o.*) keeps its qualifier so names can't bind to another table
+        qualifier = [star["relation_name"]] if star.get("relation_name") else []
+        tree["statements"][0]["node"]["select_list"] = [
+            {"class": "COLUMN_REF", "type": "COLUMN_REF", "alias": "", "query_location": 0,
+             "column_names": qualifier + [name]}
+            for name in keep
+        ]
+        rewritten = con.execute("SELECT json_deserialize_sql(?)", [json.dumps(tree)]).fetchone()[0]
+        # Must still bind, to the columns asked for
+        bound = [row[0] for row in con.execute(f"DESCRIBE {rewritten}").fetchall()]
+        if bound != keep:
+            raise _Unsafe(f"rewrite returned {bound}")
+    except duckdb.InterruptException:
+        raise
+    except (_Unsafe, duckdb.Error) as e:
+        print(f"Projection pruning skipped: {e}")
+        return sql, None
+
+    dropped = [name for name in available if name not in keep]
+    return rewritten, {"columns": keep, "dropped": dropped, "original_columns": len(available)}
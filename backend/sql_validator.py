@@ -0,0 +1,181 @@
+"""
+Validation and repair of generated SQL before it runs.
+
+Despite the prompt rules, Gemini sometimes writes MySQL functions
+(DATE_SUB, DATEDIFF) or columns that don't exist, and the query used to
+fail only at execution, leaving the user to ask again. SQLValidator binds
+every generated query against the live catalog with EXPLAIN, which parses,
+binds and plans without reading a row, and applies the cost screen's
+reject rule (cost_estimator.check) to the estimated plan. For the queries
+that fail it makes one repair call to the model, quoting each query's
+exact DuckDB error or cost rejection; a repair that fails either check is
+dropped and the query keeps its error. A query is never repaired twice.
+
+Repairs that pass are cached on the failing SQL (whitespace-normalized) and
+the schema, so the next time the model writes the same broken query it is
+fixed without another call.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import duckdb
+
+import cost_estimator
+import db_pool
+from cache import LRUCache
+
+# 0 runs generated SQL without validating it
+SQL_VALIDATION = os.getenv("SQL_VALIDATION", "1") != "0"
+REPAIR_CACHE_MAX_BYTES = int(os.getenv("REPAIR_CACHE_MAX_BYTES", str(1024**2)))
+REPAIR_CACHE_TTL = float(os.getenv("REPAIR_CACHE_TTL", "86400"))
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL with whitespace runs collapsed and no trailing semicolon"""
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+def build_repair_prompt(failures: Sequence[tuple], schema: str) -> str:
+    """Prompt asking for fixed SQL for (index, query, error) failures"""
+    listed = "\n\n".join(
+        f"""        Query {index}:
+        SQL: {q.sql}
+        Error: {error}
+        Chart columns: x = "{q.suggested_chart.x}", y = "{q.suggested_chart.y}\""""
+        for index, q, error in failures
+    )
+    return f"""You are fixing DuckDB SQL queries that failed to bind against this database,
+        or were rejected before running as too expensive.
+
+        {schema}
+
+        Each query below failed with the error shown:
+
+{listed}
+
+        Rules:
+        - Fix what the error points at and keep the query's meaning
+        - For a query rejected as too expensive, follow the advice in its error
+        - Only use tables and columns from the schema
+        - Use DuckDB syntax, NEVER MySQL functions (DATE_SUB, DATE_ADD, DATEDIFF)
+        - Keep the chart columns in the result, under the same names
+        - Include semicolon at end of SQL
+
+        Return ONLY a JSON object with this EXACT structure:
+        {{"queries": [{{"index": 0, "sql": "SELECT ...;"}}]}}
+        """
+
+
+class SQLValidator:
+    """
+    Binds generated queries with EXPLAIN and repairs the ones that fail.
+    ask sends a prompt to the model and returns its reply parsed as JSON.
+    """
+
+    def __init__(self, ask: Callable[[str], dict], cache: LRUCache = None,
+                 db_path: str = db_pool.DEFAULT_DB_PATH):
+        self.ask = ask
+        self.cache = cache if cache is not None else LRUCache(REPAIR_CACHE_MAX_BYTES, ttl=REPAIR_CACHE_TTL)
+        self.db_path = db_path
+        # Repairs made against another schema are stale
+        self.schema_version = None
+        self._lock = threading.Lock()
+        self._stats = {"validated": 0, "invalid": 0, "cache_repairs": 0, "llm_repairs": 0,
+                       "unrepaired": 0, "repair_calls": 0, "repair_time": 0.0, "validate_time": 0.0}
+
+    def set_schema(self, schema: str):
+        self.schema_version = hashlib.sha256(schema.encode("utf-8")).hexdigest()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def check(self, sql: str) -> Optional[str]:
+        """The parser/binder error or cost rejection of a statement, or None if it can run"""
+        start = time.perf_counter()
+        try:
+            with db_pool.cursor(self.db_path) as con:
+                return cost_estimator.check(sql, con)
+        except duckdb.Error as e:
+            return str(e)
+        finally:
+            self._count(validated=1, validate_time=time.perf_counter() - start)
+
+    def _request_repairs(self, failures: List[tuple], schema: str) -> Dict[int, str]:
+        """One repair call for every failure: {index: fixed sql}"""
+        prompt = build_repair_prompt(failures, schema)
+        start = time.perf_counter()
+        try:
+            reply = self.ask(prompt)
+            repairs = {int(item["index"]): str(item["sql"]) for item in reply.get("queries", [])}
+        except Exception as e:
+            print(f"SQL repair call failed: {e}")
+            repairs = {}
+        self._count(repair_calls=1, repair_time=time.perf_counter() - start)
+        return repairs
+
+    def validate(self, queries: Sequence, schema: str) -> List:
+        """
+        The queries with each one that fails to bind, or is rejected on cost,
+        replaced by its repair (carrying 'repaired': the error, original SQL
+        and where the fix came from), or left as it is when no repair passes. schema is the schema
+        section to show the model.
+        """
+        if not SQL_VALIDATION:
+            return list(queries)
+        validated = list(queries)
+        failures = []
+        for index, q in enumerate(queries):
+            error = self.check(q.sql)
+            if error is None:
+                continue
+            self._count(invalid=1)
+            print(f"Generated query '{q.name}' can't run: {error}")
+            cached = self.cache.get(normalize_sql(q.sql), version=self.schema_version)
+            if cached is not None:
+                validated[index] = self._repaired(q, cached, error, "cache")
+                self._count(cache_repairs=1)
+            else:
+                failures.append((index, q, error))
+        if not failures:
+            return validated
+
+        repairs = self._request_repairs(failures, schema)
+        for index, q, error in failures:
+            sql = repairs.get(index)
+            repair_error = self.check(sql) if sql else "no repair returned"
+            if repair_error is not None:
+                print(f"  Repair of '{q.name}' failed: {repair_error}")
+                self._count(unrepaired=1)
+                continue
+            print(f"  Repaired '{q.name}': {sql}")
+            self.cache.set(normalize_sql(q.sql), sql, version=self.schema_version)
+            validated[index] = self._repaired(q, sql, error, "llm")
+            self._count(llm_repairs=1)
+        return validated
+
+    @staticmethod
+    def _repaired(q, sql: str, error: str, source: str):
+        return q.model_copy(update={
+            "sql": sql,
+            "repaired": {"error": error, "original_sql": q.sql, "source": source},
+        })
+
+    def stats(self) -> dict:
+        """Queries validated, how many failed to bind or were rejected on cost, and how they were repaired"""
+        with self._lock:
+            stats = dict(self._stats)
+        validated, calls = stats.pop("validated"), stats["repair_calls"]
+        stats.update(
+            enabled=SQL_VALIDATION,
+            validated=validated,
+            avg_validate_ms=stats.pop("validate_time") / validated * 1000 if validated else None,
+            avg_repair_latency=stats.pop("repair_time") / calls if calls else None,
+            repair_cache=self.cache.stats(),
+        )
+        return stats
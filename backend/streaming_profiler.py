@@ -0,0 +1,294 @@
+"""
+Key insights computed over a stream of Arrow record batches.
+
+Used when the statistics can't be pushed down into a single DuckDB
+aggregate. The result is read with fetch_record_batch() and folded into the
+fixed-size accumulators from sketches.py, so peak memory depends on the batch
+size and column count, not on how many rows the query returns. Counts, means,
+standard deviations, min/max and samples are exact; distinct counts, median,
+quartiles, histograms, duplicate rows and (for very high-cardinality columns)
+top values are sketched once a column outgrows its exact buffers, and are
+then listed with their error bounds under "approximate". The payload matches
+profiler.profile_dataframe.
+"""
+import os
+from typing import Callable
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import db_pool
+from profiler import (
+    HISTOGRAM_BINS, INTERACTION_SAMPLE, SAMPLE_SIZE, TOP_INTERACTIONS, TOP_VALUES,
+    correlation_pairs, interaction_points, mark_approximate, to_python_type,
+)
+from sketches import HeavyHitters, HyperLogLog, KLLSketch, Moments, PairwiseMoments, Reservoir, StreamingHistogram
+from sql_profiler import _sample_strs, _timestamp_str, column_kind, estimate_memory, pandas_dtype, quote_ident, strip_query
+
+# Rows per record batch; peak memory grows linearly with this
+BATCH_SIZE = int(os.getenv("INSIGHTS_BATCH_SIZE", "65536"))
+# Sketch sizes: larger is more accurate and uses more (constant) memory
+QUANTILE_SKETCH_K = 1000
+HEAVY_HITTERS_CAPACITY = 1024
+HLL_PRECISION = 14
+ROW_HLL_PRECISION = 16
+
+
+def _as_float(arr: pa.Array) -> np.ndarray:
+    """Column values as float64, NaN where the value is NULL"""
+    return pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def _weighted_quantiles(values: np.ndarray, counts: np.ndarray, qs) -> list:
+    """Linear-interpolation quantiles (as in pandas) of values repeated counts times"""
+    order = np.argsort(values)
+    values, cumulative = values[order], np.cumsum(counts[order])
+    result = []
+    for q in qs:
+        h = (cumulative[-1] - 1) * q
+        lo, hi = np.searchsorted(cumulative, [np.floor(h), np.ceil(h)], side="right")
+        result.append(float(values[lo] + (h - np.floor(h)) * (values[hi] - values[lo])))
+    return result
+
+
+def _extremes(arr: pa.Array, order: str) -> pa.Array:
+    """The SAMPLE_SIZE smallest ("ascending") or largest ("descending") values"""
+    idx = pc.select_k_unstable(arr, k=min(SAMPLE_SIZE, len(arr)), sort_keys=[("values", order)])
+    return pc.take(arr, idx)
+
+
+class _ColumnAccumulator:
+    """Per-column state for one profile; every field has a fixed size"""
+
+    def __init__(self, name: str, duck_type: str):
+        self.name = name
+        self.duck_type = duck_type
+        self.kind = column_kind(duck_type)
+        self.count = 0
+        self.distinct = HyperLogLog(HLL_PRECISION)
+        if self.kind in ("numeric", "bool"):
+            self.moments = Moments()
+            self.quantiles = KLLSketch(QUANTILE_SKETCH_K)
+            self.histogram = StreamingHistogram()
+            # Exact value counts while the column has few distinct values,
+            # so discrete columns get exact quantiles and histograms
+            self.values = HeavyHitters(HEAVY_HITTERS_CAPACITY)
+        self.low = self.high = None
+        self.top = HeavyHitters(HEAVY_HITTERS_CAPACITY) if self.kind == "categorical" else None
+        self.chars = 0
+
+    def update(self, arr: pa.Array, hashes: np.ndarray, values: np.ndarray = None):
+        """arr: the column batch, hashes: DuckDB hash() per row, values: _as_float(arr) if numeric"""
+        self.count += len(arr) - arr.null_count
+        if arr.null_count:
+            hashes = hashes[arr.is_valid().to_numpy(zero_copy_only=False)]
+        self.distinct.update(hashes)
+
+        if self.kind in ("numeric", "bool"):
+            values = values[~np.isnan(values)]
+            self.moments.update(values)
+            self.quantiles.update(values)
+            self.histogram.update(values)
+            if self.values is not None:
+                distinct, counts = np.unique(values, return_counts=True)
+                self.values.update(distinct.tolist(), counts)
+                if self.values.error:
+                    self.values = None
+
+        if self.kind in ("numeric", "bool", "temporal"):
+            present = pc.drop_null(arr)
+            if len(present):
+                low, high = _extremes(present, "ascending"), _extremes(present, "descending")
+                if self.low is not None:
+                    low = _extremes(pa.concat_arrays([self.low, low]), "ascending")
+                    high = _extremes(pa.concat_arrays([self.high, high]), "descending")
+                self.low, self.high = low, high
+
+        if self.top is not None:
+            strings = arr if pa.types.is_string(arr.type) else pc.cast(arr, pa.string())
+            counts = pc.value_counts(pc.drop_null(strings))
+            self.top.update(counts.field("values").to_pylist(), counts.field("counts").to_numpy())
+            self.chars += pc.sum(pc.utf8_length(strings)).as_py() or 0
+
+    def _exact_values(self):
+        """The value -> count map if it never overflowed, else None"""
+        exact = self.top if self.kind == "categorical" else getattr(self, "values", None)
+        return exact if exact is not None and not exact.error else None
+
+    def _unique(self) -> int:
+        exact = self._exact_values()
+        if exact is not None:
+            return len(exact.counts)
+        return min(self.distinct.count(), self.count)
+
+    def _error_bounds(self) -> dict:
+        """Which figures of this column are sketched, with their error bounds"""
+        bounds = {}
+        if self._exact_values() is None and not self.distinct.exact:
+            bounds["unique"] = {"method": "hyperloglog", "relative_error": self.distinct.relative_error}
+        if self.kind in ("numeric", "bool") and self.count and self.values is None:
+            for field in ("median", "q25", "q75"):
+                bounds[field] = {"method": "kll", "rank_error": self.quantiles.rank_error}
+            # Counts may move to a neighbouring bin by up to one internal bin width
+            bounds["histogram"] = {"method": "streaming_histogram", "bin_width": self.histogram.width}
+        if self.top is not None and self.top.error:
+            bounds["top_values"] = {"method": "heavy_hitters", "absolute_error": self.top.error}
+        return bounds
+
+    def result(self, row_count: int) -> dict:
+        missing = row_count - self.count
+        col_data = {
+            "name": self.name,
+            "type": pandas_dtype(self.duck_type),
+            "missing": missing,
+            "missing_percent": float(missing / row_count * 100) if row_count > 0 else 0,
+            "unique": self._unique(),
+        }
+        bounds = self._error_bounds()
+        if bounds:
+            col_data["approximate"] = bounds
+
+        if self.kind in ("numeric", "bool", "temporal"):
+            col_data["min_samples"] = _sample_strs(self.low.to_pylist() if self.low is not None else [], self.kind)
+            col_data["max_samples"] = _sample_strs(self.high.to_pylist() if self.high is not None else [], self.kind)
+
+        if self.kind in ("numeric", "bool"):
+            if self.count:
+                m = self.moments
+                if self.values is not None:
+                    values = np.fromiter(self.values.counts.keys(), dtype=np.float64)
+                    counts = np.fromiter(self.values.counts.values(), dtype=np.int64)
+                    median, q25, q75 = _weighted_quantiles(values, counts, [0.5, 0.25, 0.75])
+                    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS, weights=counts)
+                    counts = counts.astype(np.int64)
+                else:
+                    median, q25, q75 = self.quantiles.quantiles([0.5, 0.25, 0.75])
+                    counts, edges = self.histogram.rebin(m.min, m.max, HISTOGRAM_BINS)
+                col_data["stats"] = {
+                    "mean": m.mean,
+                    "median": median,
+                    "std": m.std,
+                    "min": m.min,
+                    "max": m.max,
+                    "q25": q25,
+                    "q75": q75,
+                }
+                col_data["histogram"] = {"counts": counts.tolist(), "bins": edges.tolist()}
+            else:
+                col_data["stats"] = None
+        elif self.kind == "categorical":
+            col_data["top_values"] = [
+                {"value": value, "count": count} for value, count in self.top.top(TOP_VALUES)
+            ]
+        elif self.kind == "temporal" and self.count:
+            col_data["stats"] = {
+                "min": _timestamp_str(self.low[0].as_py()),
+                "max": _timestamp_str(self.high[0].as_py()),
+            }
+
+        return col_data
+
+
+def profile_stream(
+    query: str,
+    batch_size: int = None,
+    db_path: str = db_pool.DEFAULT_DB_PATH,
+    progress: Callable[[str], None] = None,
+) -> dict:
+    """
+    Build the key-insights payload for a query, reading it batch by batch.
+    progress, if given, is called with "reading" and then "correlations".
+    """
+    batch_size = batch_size or BATCH_SIZE
+    sql = strip_query(query)
+    source = f"({sql}) AS _q"
+    progress = progress or (lambda stage: None)
+
+    with db_pool.cursor(db_path) as con:
+        schema = [(row[0], row[1]) for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+        columns = [_ColumnAccumulator(name, duck_type) for name, duck_type in schema]
+        numeric = [i for i, col in enumerate(columns) if col.kind == "numeric"]
+        width = len(columns)
+
+        # DuckDB hashes every value (and every whole row, for duplicates) in
+        # the same scan, so the distinct sketches never see Python objects
+        hashes = ", ".join(f"hash({quote_ident(name)})" for name, _ in schema)
+        row_hash = f"hash({', '.join(quote_ident(name) for name, _ in schema)})"
+        reader = con.execute(f"SELECT _q.*, {hashes}, {row_hash} FROM {source}").fetch_record_batch(batch_size)
+
+        progress("reading")
+        row_count = 0
+        rows_distinct = HyperLogLog(ROW_HLL_PRECISION)
+        comoments = PairwiseMoments(len(numeric))
+        reservoir = Reservoir(INTERACTION_SAMPLE)
+        for batch in reader:
+            row_count += batch.num_rows
+            rows_distinct.update(batch.column(2 * width).to_numpy())
+            block = []
+            for i, col in enumerate(columns):
+                arr = batch.column(i)
+                values = _as_float(arr) if col.kind in ("numeric", "bool") else None
+                col.update(arr, batch.column(width + i).to_numpy(), values)
+                if col.kind == "numeric":
+                    block.append(values)
+            if len(numeric) > 1:
+                block = np.column_stack(block)
+                comoments.update(block)
+                reservoir.update(block)
+
+    insights = {
+        "overview": {
+            "row_count": row_count,
+            "column_count": len(schema),
+            "memory_usage": estimate_memory(
+                schema, {col.name: col.kind for col in columns}, row_count,
+                {col.name: col.count for col in columns},
+                {col.name: col.chars for col in columns},
+            ) / 1024**2,  # MB
+            "duplicate_rows": max(row_count - rows_distinct.count(), 0),
+        },
+        "columns": [col.result(row_count) for col in columns],
+    }
+    if not rows_distinct.exact:
+        insights["overview"]["approximate"] = {
+            "duplicate_rows": {
+                "method": "hyperloglog",
+                "absolute_error": round(rows_distinct.relative_error * rows_distinct.count()),
+            },
+        }
+
+    # -----------------------------
+    # CORRELATION MATRIX
+    # -----------------------------
+    progress("correlations")
+    numeric_cols = [columns[i].name for i in numeric]
+    if len(numeric_cols) > 1:
+        matrix = comoments.correlation()
+        insights["correlation_matrix"] = {
+            "columns": numeric_cols,
+            "data": matrix.tolist(),
+        }
+        insights["correlations"] = correlation_pairs(numeric_cols, matrix)
+    else:
+        insights["correlation_matrix"] = None
+        insights["correlations"] = []
+
+    # -----------------------------
+    # TOP INTERACTIONS (from the row reservoir)
+    # -----------------------------
+    if len(numeric_cols) >= 2:
+        insights["interactions"] = []
+        sample = reservoir.rows if reservoir.rows is not None else np.empty((0, len(numeric_cols)))
+        for pair in insights["correlations"][:TOP_INTERACTIONS]:
+            insights["interactions"].append({
+                "col1": pair["col1"],
+                "col2": pair["col2"],
+                "correlation": pair["correlation"],
+                "data": interaction_points(
+                    sample[:, numeric_cols.index(pair["col1"])],
+                    sample[:, numeric_cols.index(pair["col2"])],
+                ),
+            })
+
+    return to_python_type(mark_approximate(insights))
@@ -0,0 +1,12 @@
+"""
+Backend modules are imported flat from backend/ and open codejam_15.db by a
+relative path, so tests run from there. chat.py needs an API key to import;
+no test calls Gemini.
+"""
+import os
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.chdir(BACKEND)
+os.environ.setdefault("API_KEY", "test")
@@ -0,0 +1,77 @@
+"""plan_buckets / finish_buckets: the bucket is chosen inside the one rewritten statement"""
+import duckdb
+import pytest
+
+from aggregation_planner import finish_buckets, plan_buckets
+
+
+@pytest.fixture
+def con():
+    with duckdb.connect() as con:
+        yield con
+
+
+def run(con, sql, target_points, estimated_rows=None):
+    rewritten, plan = plan_buckets(sql, "x", "amount", con, target_points, estimated_rows)
+    table = con.execute(rewritten).fetch_arrow_table()
+    if plan:
+        table, plan = finish_buckets(table, plan)
+    return table, plan
+
+
+def test_buckets_when_distinct_values_exceed_budget(con):
+    sql = "SELECT TIMESTAMP '2024-01-01' + to_seconds(i * 60) AS x, 1 AS amount FROM range(10000) t(i)"
+    table, plan = run(con, sql, target_points=50)
+    assert plan["bucket"] == "day" and plan["original_rows"] == 10000
+    assert table.column_names == ["x", "amount"]
+    assert table.num_rows == 7 and sum(table["amount"].to_pylist()) == 10000
+
+
+def test_few_distinct_values_return_the_rows_unchanged(con):
+    # 5,000 rows over 10 dates with a series column: nothing may be merged or dropped
+    sql = ("SELECT DATE '2024-01-01' + (i % 10)::INTEGER AS x, (i * 7 % 1000)::INTEGER AS amount, "
+           "'cat' || (i % 3) AS cat FROM range(5000) t(i) ORDER BY amount DESC, i")
+    table, plan = run(con, sql, target_points=50)
+    assert plan is None
+    expected = con.execute(sql).fetch_arrow_table()
+    assert table.schema == expected.schema
+    assert table.to_pylist() == expected.to_pylist()
+
+
+def test_sparse_timestamps_are_not_bucketed(con):
+    # Many rows, but only 20 timestamps spread over years: no coarse bucket needed
+    sql = "SELECT TIMESTAMP '2020-01-01' + to_days((i % 20) * 90) AS x, 2 AS amount FROM range(1000) t(i)"
+    table, plan = run(con, sql, target_points=50)
+    assert plan is None and table.num_rows == 1000
+
+
+def test_bucketed_result_is_in_x_order(con):
+    sql = ("SELECT DATE '2020-01-01' + (i * 37 % 2000)::INTEGER AS x, i AS amount, 'a' AS cat "
+           "FROM range(20000) t(i) ORDER BY i DESC")
+    table, plan = run(con, sql, target_points=50)
+    assert plan["bucket"] == "quarter" and plan["original_rows"] == 20000
+    assert table.column_names == ["x", "amount"]
+    assert table["x"].to_pylist() == sorted(table["x"].to_pylist())
+
+
+def test_empty_result(con):
+    table, plan = run(con, "SELECT DATE '2024-01-01' AS x, 1 AS amount WHERE false", target_points=50)
+    assert plan is None and table.num_rows == 0 and table.column_names == ["x", "amount"]
+
+
+def test_small_estimate_leaves_sql_unchanged(con):
+    sql = "SELECT DATE '2024-01-01' + i::INTEGER AS x, i AS amount FROM range(30) t(i)"
+    assert plan_buckets(sql, "x", "amount", con, 50, estimated_rows=30) == (sql, None)
+
+
+def test_non_temporal_x_is_not_rewritten(con):
+    sql = "SELECT i AS x, i AS amount FROM range(1000) t(i)"
+    assert plan_buckets(sql, "x", "amount", con, 50) == (sql, None)
+
+
+def test_averages_per_unit_measures(con):
+    sql = "SELECT DATE '2024-01-01' + (i // 10)::INTEGER AS x, i % 2 AS conversion_rate FROM range(1000) t(i)"
+    rewritten, plan = plan_buckets(sql, "x", "conversion_rate", con, 50)
+    table, plan = finish_buckets(con.execute(rewritten).fetch_arrow_table(), plan)
+    assert plan["aggregate"] == "avg" and plan["bucket"] == "week"
+    assert all(value == pytest.approx(0.5) for value in table["conversion_rate"].to_pylist())
@@ -0,0 +1,70 @@
+"""LTTB downsampling: endpoints, point budget, peaks and NaN handling"""
+import numpy as np
+import pytest
+
+from charts import downsample_trace, lttb_indices
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64), rng.normal(size=n).cumsum()
+
+
+@pytest.mark.parametrize("n, max_points", [(10, 3), (1000, 50), (1001, 100), (5000, 4999)])
+def test_keeps_endpoints_and_budget(n, max_points):
+    x, y = series(n)
+    keep = lttb_indices(x, y, max_points)
+    assert len(keep) == max_points
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert np.all(np.diff(keep) > 0)
+
+
+@pytest.mark.parametrize("max_points", [2, 1, 0, 100, 150])
+def test_short_series_or_tiny_budget_keeps_every_point(max_points):
+    x, y = series(100)
+    assert lttb_indices(x, y, max_points).tolist() == list(range(100))
+
+
+def test_keeps_a_spike():
+    x, y = np.arange(1000, dtype=np.float64), np.zeros(1000)
+    y[437] = 50.0
+    assert 437 in lttb_indices(x, y, 20)
+
+
+def test_never_picks_nan_when_a_bucket_has_values():
+    x, y = series(1000)
+    y[1:-1:3] = np.nan
+    keep = lttb_indices(x, y, 60)
+    assert not np.isnan(y[keep[1:-1]]).any()
+
+
+@pytest.mark.parametrize("gap_end", [400, 410, 437])
+def test_all_nan_bucket_still_gets_a_point(gap_end):
+    x, y = series(1000)
+    y[200:gap_end] = np.nan
+    keep = lttb_indices(x, y, 20)
+    assert len(keep) == 20 and keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    # Only the buckets wholly inside the gap, with nothing else, pick a NaN
+    edges = np.linspace(1, 999, 19).astype(np.int64)
+    for start, end, pick in zip(edges[:-1], edges[1:], keep[1:-1]):
+        assert start <= pick < end
+        assert np.isnan(y[pick]) == np.isnan(y[start:end]).all()
+
+
+def test_nan_endpoints_are_kept():
+    x, y = series(500)
+    y[0] = y[-1] = np.nan
+    keep = lttb_indices(x, y, 25)
+    assert keep[0] == 0 and keep[-1] == 499
+    assert not np.isnan(y[keep[1:-1]]).any()
+
+
+def test_downsample_trace_maps_none_to_nan_and_keeps_input():
+    trace = {"x": list(range(300)), "y": [None if i % 5 == 0 else float(i % 17) for i in range(300)],
+             "type": "scatter"}
+    reduced = downsample_trace(trace, 30)
+    assert len(reduced["x"]) == 30 and reduced["original_points"] == 300
+    assert reduced["x"][0] == 0 and reduced["x"][-1] == 299
+    assert None not in reduced["y"][1:-1]
+    assert len(trace["x"]) == 300 and "original_points" not in trace
@@ -0,0 +1,57 @@
+"""query_stream: every query of the final response is yielded once, streamed or not"""
+import json
+import types
+
+import pytest
+
+import chat
+from chat import GeminiSQLWrapper, Query, QueryResponse
+from chat_cache import ResponseCache
+
+
+def query(name):
+    return {"name": name, "sql": f"SELECT 1 AS {name}",
+            "suggested_chart": {"type": "bar", "x": name, "y": name, "title": name}}
+
+
+class PassThroughValidator:
+    def validate(self, queries, schema):
+        return list(queries)
+
+
+class SkippingParser(chat.QueryStreamParser):
+    """Stream parser that misses the object named "b", as a malformed stream would"""
+
+    def feed(self, text):
+        return [obj for obj in super().feed(text) if obj.get("name") != "b"]
+
+
+@pytest.fixture
+def wrapper():
+    wrapper = GeminiSQLWrapper(api_key="test", cache=ResponseCache(path=None))
+    wrapper.input_schema = "DATABASE SCHEMA:\n"
+    wrapper.validator = PassThroughValidator()
+    return wrapper
+
+
+def reply(wrapper, *names):
+    text = json.dumps({"queries": [query(name) for name in names]})
+    chunks = [types.SimpleNamespace(text=text[i:i + 40]) for i in range(0, len(text), 40)]
+    wrapper.client = types.SimpleNamespace(
+        models=types.SimpleNamespace(generate_content_stream=lambda model, contents: iter(chunks)))
+
+
+def test_streams_each_query_once(wrapper):
+    reply(wrapper, "a", "b", "c")
+    items = list(wrapper.query_stream("question"))
+    assert [q.name for q in items[:-1]] == ["a", "b", "c"]
+    assert isinstance(items[-1], QueryResponse)
+
+
+def test_queries_the_stream_missed_are_yielded_before_the_response(wrapper, monkeypatch):
+    monkeypatch.setattr(chat, "QueryStreamParser", SkippingParser)
+    reply(wrapper, "a", "b", "c", "b")
+    items = list(wrapper.query_stream("question"))
+    assert all(isinstance(q, Query) for q in items[:-1])
+    assert sorted(q.name for q in items[:-1]) == ["a", "b", "b", "c"]
+    assert [q.name for q in items[-1].queries] == ["a", "b", "c", "b"]
@@ -0,0 +1,74 @@
+"""Cost screening: reject/run decisions, check() for the validator, and what estimate_ms measures"""
+import time
+
+import duckdb
+import pytest
+
+import cost_estimator
+from cost_estimator import CostRejected, check, screen
+
+CROSS_JOIN = "SELECT a.id, b.id FROM a, b"
+
+
+@pytest.fixture
+def con():
+    with duckdb.connect() as con:
+        con.execute("CREATE TABLE a AS SELECT range AS id, range % 7 AS v FROM range(20000)")
+        con.execute("CREATE TABLE b AS SELECT range AS id FROM range(20000)")
+        yield con
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(cost_estimator, "COST_MAX_WORK", 1e6)
+    monkeypatch.setattr(cost_estimator, "COST_MAX_ROWS", 100000)
+
+
+def test_check_returns_the_rejection_screen_raises(con, limits):
+    message = check(CROSS_JOIN, con)
+    assert message.startswith("Query rejected before running") and "cross join" in message
+    with pytest.raises(CostRejected) as rejected:
+        screen(CROSS_JOIN, con)
+    assert str(rejected.value) == message
+
+
+def test_check_passes_queries_that_run(con, limits):
+    assert check("SELECT a.id, b.id FROM a JOIN b USING (id)", con) is None
+    assert check("SELECT v, count(*) FROM a GROUP BY v", con) is None
+
+
+def test_check_raises_binder_errors(con, limits):
+    with pytest.raises(duckdb.BinderException):
+        check("SELECT missing_column FROM a", con)
+
+
+def test_estimate_time_excludes_the_aggregate_rewrite(con, limits):
+    def aggregate(sql, estimated_rows):
+        time.sleep(0.05)
+        return sql, None
+
+    _, decision, _ = screen("SELECT id, v FROM a", con, aggregate)
+    assert decision["decision"] == "run"
+    assert decision["estimate_ms"] < 50
+
+
+@pytest.mark.parametrize("max_work", [1e6, 0])
+@pytest.mark.parametrize("sql", [
+    "SET threads = 1",
+    "PRAGMA threads = 1",
+    "CREATE TEMP TABLE x AS SELECT 1",
+    "ATTACH ':memory:' AS other",
+    "SELECT 1; SET threads = 1",
+])
+def test_check_rejects_anything_but_one_select(con, monkeypatch, sql, max_work):
+    monkeypatch.setattr(cost_estimator, "COST_MAX_WORK", max_work)
+    threads = con.execute("SELECT current_setting('threads')").fetchone()[0]
+    assert check(sql, con)
+    assert con.execute("SELECT current_setting('threads')").fetchone()[0] == threads
+    assert con.execute("SELECT count(*) FROM duckdb_tables() WHERE table_name = 'x'").fetchone()[0] == 0
+    assert con.execute("SELECT count(*) FROM duckdb_databases() WHERE database_name = 'other'").fetchone()[0] == 0
+
+
+@pytest.mark.parametrize("sql", ["WITH t AS (SELECT v FROM a) SELECT v FROM t;", "FROM a LIMIT 3", "VALUES (1)"])
+def test_check_passes_select_forms(con, limits, sql):
+    assert check(sql, con) is None
@@ -0,0 +1,72 @@
+"""_supervise: relaying worker messages, including ones read after the worker exited"""
+import queue
+import types
+
+import pytest
+
+import insights_jobs
+from insights_jobs import Job
+
+
+class FakeQueue:
+    """Queue whose get() times out once per None in its script, then returns the next message"""
+
+    def __init__(self, script):
+        self.script = list(script)
+
+    def get(self, timeout=None):
+        if not self.script:
+            raise queue.Empty
+        message = self.script.pop(0)
+        if message is None:
+            raise queue.Empty
+        return message
+
+    def close(self):
+        pass
+
+
+class ExitedWorker:
+    """A worker that has already exited by the time it is first checked"""
+
+    exitcode = 0
+
+    def __init__(self, **kwargs):
+        pass
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return False
+
+    def join(self, timeout=None):
+        pass
+
+
+@pytest.fixture
+def supervise(monkeypatch):
+    def run(script):
+        context = types.SimpleNamespace(Queue=lambda: FakeQueue(script), Process=ExitedWorker)
+        monkeypatch.setattr(insights_jobs, "_context", context)
+        job = Job("SELECT 1", "auto", None, key=())
+        insights_jobs._supervise(job, "unused.parquet")
+        return job
+    return run
+
+
+def test_result_flushed_before_exit_is_not_lost(supervise):
+    # The first read times out, then the worker is seen dead with its result still in the pipe
+    job = supervise([None, ("stage", "profiling"), ("done", {"rows": 1})])
+    assert job.status == "done" and job.result == {"rows": 1}
+    assert "profiling" in [s["stage"] for s in job.stages]
+
+
+def test_error_flushed_before_exit_is_reported(supervise):
+    job = supervise([None, ("error", "bad column")])
+    assert job.status == "failed" and job.error == "bad column"
+
+
+def test_exit_without_a_result_fails(supervise):
+    job = supervise([None])
+    assert job.status == "failed" and job.error == "Worker exited with code 0"
@@ -0,0 +1,63 @@
+"""IntentRouter: which questions a canned query answers, and which go to Gemini"""
+import pytest
+
+from intent_router import IntentRouter, extract_slots
+
+
+@pytest.fixture
+def router():
+    return IntentRouter(min_confidence=0.75)
+
+
+@pytest.mark.parametrize("question, query_type", [
+    ("daily revenue", "daily_revenue"),
+    ("show me revenue over time", "daily_revenue"),
+    ("top 5 products", "top_products"),
+    ("best selling products", "top_products"),
+    ("top 10 customers by revenue", "revenue_by_customer"),
+    ("revenue by product", "revenue_by_product"),
+    ("expenses over time", "expenses_over_time"),
+    ("payroll by department", "payroll_by_department"),
+    ("compare revenue and expenses", "revenue_vs_expenses"),
+])
+def test_routes_canned_questions(router, question, query_type):
+    match = router.route(question)
+    assert match is not None and match["query_type"] == query_type
+
+
+def test_keeps_accepted_filters(router):
+    match = router.route("top 3 customers by revenue")
+    assert match["filters"] == {"top_n": 3}
+    match = router.route("daily revenue in March 2024")
+    assert match["filters"] == {"start_date": "2024-03-01", "end_date": "2024-03-31"}
+
+
+@pytest.mark.parametrize("question", [
+    "which customers have no revenue",
+    "customers without revenue",
+    "products that never sold",
+    "products that didn't sell",
+    "revenue not by product",
+    "least selling products",
+    "lowest revenue customers",
+    "bottom 5 products",
+    "worst customers by revenue",
+    "revenue by product except hardware",
+])
+def test_negated_questions_go_to_gemini(router, question):
+    assert router.route(question) is None
+
+
+@pytest.mark.parametrize("question", ["top 0 customers", "top 0 products by quantity"])
+def test_empty_top_n_goes_to_gemini(router, question):
+    assert extract_slots(question)[0]["top_n"] == 0
+    assert router.route(question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "revenue by region",
+    "average order value per segment",
+    "daily revenue for customers in the west",
+])
+def test_unexplained_questions_go_to_gemini(router, question):
+    assert router.route(question) is None
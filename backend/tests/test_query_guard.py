@@ -0,0 +1,60 @@
+"""Watchdog: interrupting a running query, and never interrupting after the block exits"""
+import threading
+
+import duckdb
+import pytest
+
+from query_guard import QueryTimeoutError, Watchdog
+
+SLOW = "SELECT count(*) FROM range(1000000000) a, range(1000) b"
+
+
+class RecordingCursor:
+    """Stands in for a pooled cursor; interrupt() can be made to block mid-fire"""
+
+    def __init__(self, release=None):
+        self.interrupts = 0
+        self.entered = threading.Event()
+        self.release = release
+
+    def interrupt(self):
+        self.entered.set()
+        if self.release is not None:
+            self.release.wait(5)
+        self.interrupts += 1
+
+
+def test_interrupts_a_query_past_its_timeout():
+    with duckdb.connect() as con:
+        with pytest.raises(QueryTimeoutError):
+            with Watchdog(con, timeout=0.2):
+                con.execute(SLOW).fetchall()
+        assert con.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_timer_firing_after_exit_does_not_interrupt():
+    cursor = RecordingCursor()
+    with Watchdog(cursor, timeout=60) as watchdog:
+        pass
+    watchdog._fire()
+    assert cursor.interrupts == 0 and not watchdog.fired
+
+
+def test_exit_waits_for_an_interrupt_in_progress():
+    release = threading.Event()
+    cursor = RecordingCursor(release)
+    watchdog = Watchdog(cursor, timeout=60)
+    watchdog.__enter__()
+    firing = threading.Thread(target=watchdog._fire)
+    firing.start()
+    assert cursor.entered.wait(5)
+
+    exited = threading.Event()
+    closer = threading.Thread(target=lambda: (watchdog.__exit__(None, None, None), exited.set()))
+    closer.start()
+    assert not exited.wait(0.2)
+    release.set()
+    firing.join(5)
+    closer.join(5)
+    # The interrupt finished before __exit__ returned the cursor
+    assert exited.is_set() and cursor.interrupts == 1
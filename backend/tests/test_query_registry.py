@@ -0,0 +1,83 @@
+"""sql_literal escaping/rejection and QueryRegistry's checks before EXECUTE"""
+import datetime
+
+import duckdb
+import pytest
+
+import db_pool
+from query_registry import QueryRegistry, RegistryError, sql_literal
+
+
+@pytest.mark.parametrize("value, sql_type, literal", [
+    (None, "DATE", "NULL"),
+    (None, "INTEGER", "NULL"),
+    ("2024-01-31", "DATE", "DATE '2024-01-31'"),
+    (datetime.date(2024, 2, 29), "DATE", "DATE '2024-02-29'"),
+    (datetime.datetime(2024, 3, 1, 23, 59), "DATE", "DATE '2024-03-01'"),
+    (5, "INTEGER", "5"),
+    ("10", "INTEGER", "10"),
+    ("-3", "BIGINT", "-3"),
+    ("007", "INTEGER", "7"),
+])
+def test_literals(value, sql_type, literal):
+    assert sql_literal(value, sql_type) == literal
+
+
+@pytest.mark.parametrize("value, sql_type", [
+    ("2024-01-31'; DROP TABLE orders; --", "DATE"),
+    ("2024-02-30", "DATE"),
+    ("yesterday", "DATE"),
+    ("1; DROP TABLE orders", "INTEGER"),
+    ("1 OR 1=1", "INTEGER"),
+    ("1e3", "INTEGER"),
+    (" 7", "INTEGER"),
+    (2.5, "INTEGER"),
+    ("", "INTEGER"),
+    (True, "INTEGER"),
+    ("x", "VARCHAR"),
+])
+def test_rejects_values_that_are_not_of_the_type(value, sql_type):
+    with pytest.raises(ValueError):
+        sql_literal(value, sql_type)
+
+
+STATEMENTS = {
+    "since": {
+        "sql": "SELECT count(*) AS n FROM orders WHERE $1 IS NULL OR order_date >= $1",
+        "params": [("start_date", "DATE")],
+    },
+    "top": {"sql": "SELECT order_date FROM orders ORDER BY order_date LIMIT $1", "params": [("top_n", "INTEGER")]},
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "registry.db")
+    with duckdb.connect(path) as con:
+        con.execute("CREATE TABLE orders AS SELECT DATE '2024-01-01' + range::INTEGER AS order_date FROM range(10)")
+    yield path
+    db_pool.get_manager(path).close()
+
+
+def test_executes_with_typed_literals(db_path):
+    registry = QueryRegistry(STATEMENTS, db_path)
+    registry.validate()
+    assert registry.execute("since", "2024-01-08").to_pylist() == [{"n": 3}]
+    assert registry.execute("since", None).to_pylist() == [{"n": 10}]
+    assert registry.execute("top", 2).num_rows == 2
+    assert registry.stats()["executions"] == 3
+
+
+def test_bad_arguments_never_reach_the_database(db_path):
+    registry = QueryRegistry(STATEMENTS, db_path)
+    with pytest.raises(ValueError, match="start_date"):
+        registry.execute("since", "2024-01-01' OR 1=1 --")
+    with pytest.raises(TypeError):
+        registry.execute("top")
+    assert registry.stats()["executions"] == 0
+
+
+def test_validate_lists_statements_that_do_not_bind(db_path):
+    registry = QueryRegistry({**STATEMENTS, "broken": {"sql": "SELECT missing FROM orders", "params": []}}, db_path)
+    with pytest.raises(RegistryError, match="broken"):
+        registry.validate()
@@ -0,0 +1,59 @@
+"""prune_projection: SELECT * narrowed to the chart's columns, or left alone when that isn't safe"""
+import duckdb
+import pytest
+
+from sql_rewrite import prune_projection
+
+
+@pytest.fixture
+def con():
+    with duckdb.connect() as con:
+        con.execute("CREATE TABLE orders AS SELECT range AS id, range % 4 AS region, range * 1.5 AS amount, "
+                    "'note' AS note FROM range(100)")
+        con.execute("CREATE TABLE regions AS SELECT range AS region, 'r' || range AS name FROM range(4)")
+        yield con
+
+
+def test_narrows_star_to_chart_columns(con):
+    sql, report = prune_projection("SELECT * FROM orders WHERE amount > 10;", ["region", "amount"], con)
+    assert report == {"columns": ["region", "amount"], "dropped": ["id", "note"], "original_columns": 4}
+    assert [row[0] for row in con.execute(f"DESCRIBE {sql}").fetchall()] == ["region", "amount"]
+    original = con.execute("SELECT region, amount FROM orders WHERE amount > 10").fetchall()
+    assert con.execute(sql).fetchall() == original
+
+
+def test_matches_columns_case_insensitively(con):
+    sql, report = prune_projection("SELECT * FROM orders", ["REGION", "Amount"], con)
+    assert report["columns"] == ["region", "amount"]
+
+
+def test_keeps_qualifier_of_qualified_star(con):
+    sql, report = prune_projection(
+        "SELECT o.* FROM orders o JOIN regions r USING (region)", ["region", "amount"], con)
+    assert report["columns"] == ["region", "amount"]
+    assert "o.region" in sql.replace('"', "")
+
+
+@pytest.mark.parametrize("sql, columns, reason", [
+    ("SELECT * FROM orders; SELECT * FROM orders", ["region", "amount"], "not a single statement"),
+    ("SELECT * FROM orders UNION ALL SELECT * FROM orders", ["region", "amount"], "not a plain SELECT"),
+    ("INSERT INTO orders SELECT * FROM orders", ["region", "amount"], "Only SELECT"),
+    ("SELECT DISTINCT * FROM orders", ["region", "amount"], "DISTINCT"),
+    ("SELECT * FROM orders ORDER BY 3", ["region", "amount"], "ORDER BY position"),
+    ("SELECT * FROM orders ORDER BY ALL", ["region", "amount"], "ORDER BY position"),
+    ("SELECT * FROM orders GROUP BY ALL", ["region", "amount"], "grouping"),
+    ("SELECT region, amount FROM orders", ["region", "amount"], "no bare *"),
+    ("SELECT *, id + 1 AS next FROM orders", ["region", "amount"], "no bare *"),
+    ("SELECT * EXCLUDE (note) FROM orders", ["region", "amount"], "* with modifiers"),
+    ("SELECT * REPLACE (amount * 2 AS amount) FROM orders", ["region", "amount"], "* with modifiers"),
+    ("SELECT COLUMNS('a.*') FROM orders", ["amount"], "* with modifiers"),
+    ("SELECT * FROM orders", ["region", "missing"], "'missing' is missing or ambiguous"),
+    ("SELECT * FROM orders o JOIN regions r ON o.region = r.region", ["region", "amount"],
+     "'region' is missing or ambiguous"),
+    ("SELECT * FROM regions", ["region", "name"], "every column is used"),
+    ("SELECT * FROM orders JOIN regions USING (id)", ["region", "amount"], "Binder Error"),
+    ("SELECT * FROM", ["region", "amount"], "syntax error"),
+])
+def test_unsafe_statements_are_left_alone(con, capsys, sql, columns, reason):
+    assert prune_projection(sql, columns, con) == (sql, None)
+    assert reason in capsys.readouterr().out
@@ -0,0 +1,95 @@
+"""SQLValidator: one repair call for the queries that don't bind, and the repair cache"""
+import duckdb
+import pytest
+
+import db_pool
+from chat import Query
+from sql_validator import SQLValidator
+
+GOOD = "SELECT order_date, total_amount FROM orders;"
+BROKEN = "SELECT order_date, DATE_SUB(order_date, 1) AS total FROM orders;"
+FIXED = "SELECT order_date, order_date - 1 AS total FROM orders;"
+
+
+class FakeModel:
+    """ask() that answers repair prompts from a {broken sql: fixed sql} table and records them"""
+
+    def __init__(self, fixes):
+        self.fixes = fixes
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return {"queries": [{"index": i, "sql": fixed} for i, (broken, fixed) in enumerate(self.fixes.items())
+                            if broken in prompt]}
+
+
+def query(sql, name="q"):
+    return Query(name=name, sql=sql,
+                 suggested_chart={"type": "line", "x": "order_date", "y": "total", "title": name})
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "validator.db")
+    with duckdb.connect(path) as con:
+        con.execute("CREATE TABLE orders AS SELECT DATE '2024-01-01' + range::INTEGER AS order_date, "
+                    "range * 2.5 AS total_amount FROM range(10)")
+    yield path
+    db_pool.get_manager(path).close()
+
+
+def validator(db_path, model):
+    v = SQLValidator(model, db_path=db_path)
+    v.set_schema("orders(order_date DATE, total_amount DOUBLE)")
+    return v
+
+
+def test_valid_queries_make_no_call(db_path):
+    model = FakeModel({})
+    v = validator(db_path, model)
+    assert v.validate([query(GOOD)], "schema")[0].sql == GOOD
+    assert model.prompts == []
+
+
+def test_repairs_in_one_call_and_caches(db_path):
+    model = FakeModel({BROKEN: FIXED})
+    v = validator(db_path, model)
+    first = v.validate([query(BROKEN, "a"), query(GOOD, "b"), query(BROKEN, "c")], "schema")
+    assert len(model.prompts) == 1 and "DATE_SUB" in model.prompts[0]
+    assert first[0].sql == FIXED and first[0].repaired["source"] == "llm"
+    assert first[0].repaired["original_sql"] == BROKEN and first[0].repaired["error"]
+    assert first[1].sql == GOOD and first[1].repaired is None
+
+    # The same broken SQL, whitespace aside, is fixed from the cache
+    again = v.validate([query("SELECT order_date,  DATE_SUB(order_date, 1) AS total\nFROM orders")], "schema")
+    assert len(model.prompts) == 1
+    assert again[0].sql == FIXED and again[0].repaired["source"] == "cache"
+    assert v.stats()["cache_repairs"] == 1
+
+
+def test_repair_that_does_not_bind_is_dropped_and_not_cached(db_path):
+    model = FakeModel({BROKEN: "SELECT missing FROM orders;"})
+    v = validator(db_path, model)
+    assert v.validate([query(BROKEN)], "schema")[0].sql == BROKEN
+    v.validate([query(BROKEN)], "schema")
+    assert len(model.prompts) == 2
+    assert v.stats()["unrepaired"] == 2
+
+
+def test_cached_repairs_expire_with_the_schema(db_path):
+    model = FakeModel({BROKEN: FIXED})
+    v = validator(db_path, model)
+    v.validate([query(BROKEN)], "schema")
+    v.set_schema("orders(order_date DATE, total_amount DOUBLE, region VARCHAR)")
+    assert v.validate([query(BROKEN)], "schema")[0].repaired["source"] == "llm"
+    assert len(model.prompts) == 2
+
+
+def test_failed_repair_call_keeps_the_query(db_path):
+    def ask(prompt):
+        raise RuntimeError("model unavailable")
+
+    v = validator(db_path, ask)
+    result = v.validate([query(BROKEN)], "schema")[0]
+    assert result.sql == BROKEN and result.repaired is None
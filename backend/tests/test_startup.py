@@ -0,0 +1,85 @@
+"""Smoke test: `python main.py` starts under the debug reloader and serves requests"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from conftest import BACKEND
+
+PORT = 5001
+BASE = f"http://127.0.0.1:{PORT}"
+
+
+def _get(path, data=None, timeout=10):
+    request = urllib.request.Request(
+        BASE + path,
+        data=json.dumps(data).encode() if data is not None else None,
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, json.loads(response.read())
+
+
+@pytest.fixture(scope="module")
+def server():
+    with socket.socket() as probe:
+        if probe.connect_ex(("127.0.0.1", PORT)) == 0:
+            pytest.skip(f"port {PORT} is already in use")
+    process = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=BACKEND,
+        env={**os.environ, "API_KEY": os.environ.get("API_KEY", "test")},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                _get("/")
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    output = process.stdout.read().decode(errors="replace") if process.poll() is not None else ""
+                    pytest.fail(f"server did not start:\n{output}")
+                time.sleep(0.5)
+        yield process
+    finally:
+        # The reloader's parent and the serving child share the session
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+
+
+def test_serves_database_requests(server):
+    status, body = _get("/api/test-db")
+    assert status == 200 and body["success"]
+    status, body = _get("/api/query-data", {"query_type": "payroll_by_department"})
+    assert status == 200 and len(body["data"]["x"]) > 0
+
+
+def test_insights_job_completes_in_worker(server):
+    _, body = _get("/api/key-insights/jobs", {"query": "SELECT * FROM expenses", "mode": "pushdown"})
+    job_id = body["job_id"]
+    deadline = time.monotonic() + 120
+    while body["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.5)
+        _, body = _get(f"/api/key-insights/jobs/{job_id}")
+    assert body["status"] == "done", body.get("error")
+
+
+def test_sync_insights_run_as_a_job(server):
+    _, metrics = _get("/api/metrics")
+    done = metrics["insights_jobs"]["jobs"].get("done", 0)
+    query = urllib.parse.quote("SELECT * FROM payroll")
+    status, body = _get(f"/api/key-insights?query={query}&mode=pushdown", timeout=120)
+    assert status == 200 and body["success"], body.get("error")
+    _, metrics = _get("/api/metrics")
+    assert metrics["insights_jobs"]["jobs"]["done"] == done + 1